@@ -0,0 +1,196 @@
+# Lets the benchmarks run on host CPython, on MicroPython this does nothing.
+import sys
+
+if sys.implementation.name != 'micropython':
+    import builtins
+    import os
+    import time
+    import binascii
+    import json
+    import socket
+    import types
+
+    _root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for _p in (_root, os.path.join(_root, 'lib')):
+        if _p not in sys.path:
+            sys.path.insert(0, _p)
+
+    builtins.const = lambda x: x
+
+    _TICKS_PERIOD = 1 << 30
+    _t0 = time.perf_counter_ns()
+
+    def ticks_us():
+        return ((time.perf_counter_ns() - _t0) // 1000) & (_TICKS_PERIOD - 1)
+
+    def ticks_ms():
+        return ((time.perf_counter_ns() - _t0) // 1000000) & (_TICKS_PERIOD - 1)
+
+    def ticks_diff(a, b):
+        return ((a - b + _TICKS_PERIOD // 2) & (_TICKS_PERIOD - 1)) - _TICKS_PERIOD // 2
+
+    def ticks_add(a, b):
+        return (a + b) & (_TICKS_PERIOD - 1)
+
+    time.ticks_us = ticks_us
+    time.ticks_ms = ticks_ms
+    time.ticks_cpu = ticks_us
+    time.ticks_diff = ticks_diff
+    time.ticks_add = ticks_add
+    time.sleep_ms = lambda ms: time.sleep(ms / 1000)
+    #the driver's few us waits are below what the host can time, skipping them keeps the
+    #shim from building a float the port's sleep_us doesn't
+    time.sleep_us = lambda us: us < 100 or time.sleep(us / 1000000)
+
+    sys.modules.setdefault('utime', time)
+    sys.modules.setdefault('uos', os)
+    sys.modules.setdefault('ubinascii', binascii)
+    sys.modules.setdefault('usocket', socket)
+
+    #pins are shared by id so an emulated device can drive and watch them
+    class Pin:
+        IN = 0
+        OUT = 1
+        IRQ_RISING = 8
+
+        readers = {}
+        writers = {}
+        handlers = {}
+        levels = {}
+
+        def __init__(self, id, mode=IN, *args, **kwargs):
+            self.id = id
+
+        def value(self, v=None):
+            if v is None:
+                reader = Pin.readers.get(self.id)
+                if reader:
+                    return reader()
+                return Pin.levels.get(self.id, 0)
+            Pin.levels[self.id] = v
+            writer = Pin.writers.get(self.id)
+            if writer:
+                writer(v)
+
+        def on(self):
+            self.value(1)
+
+        def off(self):
+            self.value(0)
+
+        def irq(self, trigger=None, handler=None):
+            Pin.handlers[self.id] = handler
+
+    #SPI buses are routed to the device registered for the bus id
+    class SPI:
+        devices = {}
+
+        def __init__(self, id, baudrate=1000000, **kwargs):
+            self.device = SPI.devices[id]
+
+        def write(self, buf):
+            for b in buf:
+                self.device.exchange(b)
+
+        #like the port, only the low byte of write is sent
+        def read(self, n, write=0x00):
+            write &= 0xFF
+            return bytes(self.device.exchange(write) for _ in range(n))
+
+        def readinto(self, buf, write=0x00):
+            write &= 0xFF
+            for i in range(len(buf)):
+                buf[i] = self.device.exchange(write)
+
+        def write_readinto(self, out, into):
+            for i in range(len(out)):
+                into[i] = self.device.exchange(out[i])
+
+    class RTC:
+        def datetime(self, dt=None):
+            if dt is None:
+                t = time.gmtime()
+                return (t[0], t[1], t[2], t[6], t[3], t[4], t[5], 0)
+
+    #timers never fire on the host, benchmarks call the callbacks themselves
+    class Timer:
+        ONE_SHOT = 0
+        PERIODIC = 1
+
+        def __init__(self, id=-1, **kwargs):
+            self.init(**kwargs)
+
+        def init(self, mode=ONE_SHOT, period=0, callback=None, **kwargs):
+            self.mode = mode
+            self.period = period
+            self.callback = callback
+
+        def deinit(self):
+            self.callback = None
+
+    machine = types.ModuleType('machine')
+    machine.Pin = Pin
+    machine.RTC = RTC
+    machine.Timer = Timer
+    machine.SPI = SPI
+    machine.reset = lambda: None
+    machine.freq = lambda: 125000000
+    machine.disable_irq = lambda: 0
+    machine.enable_irq = lambda state: None
+    sys.modules.setdefault('machine', machine)
+
+    #scheduled callbacks run on the spot, the host has no interrupts to serialize with
+    micropython = types.ModuleType('micropython')
+    micropython.schedule = lambda func, arg: func(arg)
+    micropython.const = builtins.const
+    sys.modules.setdefault('micropython', micropython)
+
+    class WLAN:
+        def __init__(self, *args):
+            pass
+
+        def active(self, *args):
+            return True
+
+        def connect(self, *args):
+            pass
+
+        def isconnected(self):
+            return True
+
+        def disconnect(self):
+            pass
+
+        def deinit(self):
+            pass
+
+    network = types.ModuleType('network')
+    network.STA_IF = 0
+    network.WLAN = WLAN
+    sys.modules.setdefault('network', network)
+
+    config = types.ModuleType('config')
+    config.GATEWAY_ID = '0011223344556677'
+    config.NTP_DELTA = 2208988800
+    sys.modules.setdefault('config', config)
+
+    #MicroPython serializes bytes as JSON strings and lets str be concatenated
+    #to bytes, returning bytes from dumps gives the same behaviour here
+    ujson = types.ModuleType('ujson')
+    ujson.dumps = lambda obj: json.dumps(obj, separators=(', ', ': '), default=lambda o: o.decode()).encode()
+    ujson.loads = json.loads
+    sys.modules.setdefault('ujson', ujson)
+
+    #the driver picks its SPI and pin code paths from sys.implementation when
+    #imported, modules passed here are imported as if running on MicroPython
+    def micropython_import(*names):
+        real = sys.implementation
+        sys.implementation = types.SimpleNamespace(**vars(real))
+        sys.implementation.name = 'micropython'
+        try:
+            for name in names:
+                __import__(name)
+        finally:
+            sys.implementation = real
+
+    micropython_import('_sx126x', 'sx126x')
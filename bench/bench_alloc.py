@@ -0,0 +1,85 @@
+# Heap allocations of the driver's steady state RX re-arm, IRQ service and a command
+# through the generic SPIwriteCommand path. After begin() on the emulator the bus is
+# swapped for one that allocates nothing itself, so tracemalloc's peak only moves if the
+# driver allocates. Exits non zero when any of them allocates at all. On a board
+# gc.mem_alloc() around the same calls with gc.disable() gives the same answer.
+# run with: python bench/bench_alloc.py
+import _host
+import gc
+import sys
+import tracemalloc
+from sx126x_emu import SX126XEmulator
+from sx1262 import SX1262
+from _sx126x import SX126X_CMD_SET_RX, SX126X_CMD_GET_PACKET_TYPE, SX126X_CMD_GET_IRQ_STATUS, SX126X_PACKET_TYPE_LORA
+
+N = 1000
+
+class NullPin:
+    def value(self, v=None):
+        return 0
+
+#answers a good status on every byte, LoRa to GET_PACKET_TYPE and no IRQ pending.
+#IRQ flags of 0x5252 would be a heap int on CPython, MicroPython keeps it in the pointer
+class NullBus:
+    def write_readinto(self, out, into):
+        n = len(out)
+        i = 0
+        while i < n:
+            into[i] = 0x52
+            i += 1
+        if out[0] == SX126X_CMD_GET_PACKET_TYPE:
+            into[2] = SX126X_PACKET_TYPE_LORA
+        elif out[0] == SX126X_CMD_GET_IRQ_STATUS:
+            into[2] = into[3] = 0
+
+emu = SX126XEmulator()
+lora = SX1262(spi_bus=1, clk=10, mosi=11, miso=12, cs=3, irq=20, rst=15, gpio=2)
+lora.begin(freq=868.1, bw=125.0, sf=9, cr=5, syncWord=0x34,
+           power=-5, currentLimit=60.0, preambleLength=8,
+           implicit=False, implicitLen=0xFF,
+           crcOn=True, txIq=True, rxIq=False,
+           tcxoVoltage=1.7, useRegulatorLDO=False, blocking=True)
+lora.spi = NullBus()
+lora.cs = NullPin()
+lora.gpio = NullPin()
+
+def rearm():
+    lora.startReceive()
+
+def irq_service():
+    lora.getIrqStatus()
+    lora.clearIrqStatus()
+
+#built once, what the caller allocates isn't the driver's
+SET_RX = bytearray([SX126X_CMD_SET_RX])
+RX_INF = bytearray([0xFF, 0xFF, 0xFF])
+
+def generic_set_rx():
+    lora.SPIwriteCommand(SET_RX, 1, RX_INF, 3)
+
+#peak heap over the calls past what looping over an empty call costs. The calls come from a
+#prebuilt list, a range() would box its ints above 256 inside the measurement
+def peak_bytes(fn):
+    calls = [fn] * N
+    for f in calls:
+        f()
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    for f in calls:
+        f()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak - before
+
+base = peak_bytes(lambda: None)
+results = [(name, peak_bytes(fn) - base) for name, fn in (
+    ('RX re-arm (startReceive)', rearm),
+    ('IRQ status read + clear', irq_service),
+    ('SET_RX through SPIwriteCommand', generic_set_rx))]
+print('sequence                          peak heap over {} calls'.format(N))
+for name, peak in results:
+    print('{:32s} {:8d} B'.format(name, peak))
+if any(peak for name, peak in results):
+    sys.exit('steady state RX path allocates')
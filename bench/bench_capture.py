@@ -0,0 +1,134 @@
+# Capture and replay. The gateway runs on the emulator capturing to a file: uplinks,
+# CRC errors, a stat packet and a class A downlink answering the last uplink. Reports
+# what capturing costs on the RX path and in the UDP loop and the bytes per record,
+# checks the serial console form reads back the same records, then replays the file
+# with bench/replay.py at the original pace and ten times faster.
+# run with: python bench/bench_capture.py
+import _host
+import io
+import os
+import sys
+import time
+import tempfile
+import ubinascii
+from capture import Capture, read_capture, parse_rx, REC_CONFIG, REC_RX, REC_UDP_OUT, REC_UDP_IN
+from gwconfig import GatewayConfig
+from replay import Rig, replay
+
+FRAMES = 40
+TIMED = 300
+
+def frame(i):
+    return bytes([0x40, 0x34, 0x12, 0x01, 0x26, 0x00, i & 0xFF, i >> 8, 0x01]) + bytes(range(10))
+
+def uplinks(rig, n, gap_us, first=0):
+    for i in range(first, first + n):
+        rig.rx(frame(i), -60 - (i % 80) / 2, (i % 40 - 20) / 4, i % 10 != 9)
+        rig.run(gap_us)
+
+tmp = tempfile.mkdtemp()
+path = os.path.join(tmp, 'capture.bin')
+radio = GatewayConfig(sf=9).settings()
+
+#the session captured
+cap = Capture(path)
+rig = Rig(radio, capture=cap)
+gw = rig.gw
+cap.config(rig.radio.settings(), gw.settings())
+gw._pull_data()
+rig.run(20000)
+gw._push_data(gw._make_stat_packet())
+uplinks(rig, FRAMES, 30000)
+tmst = rig.server.rxpk[-1]['tmst']
+rig.server.pull_resp(b'\x12\x34', {'txpk': {
+    'imme': False, 'tmst': (tmst + 1000000) & 0xFFFFFFFF, 'freq': 869.525, 'rfch': 0, 'powe': 14, 'modu': 'LORA',
+    'datr': 'SF9BW125', 'codr': '4/5', 'ipol': True, 'size': 12, 'data': ubinascii.b2a_base64(bytes(12))[:-1].decode()}})
+rig.settle()
+assert gw.txnb == 1 and rig.server.tx_acks == ['NONE']
+cap.close()
+rig.close()
+size = os.path.getsize(path)
+with open(path, 'rb') as f:
+    records = read_capture(f.read())
+kinds = {}
+for kind, t, body in records:
+    kinds[kind] = kinds.get(kind, 0) + 1
+rx_bytes = sum(7 + len(body) for kind, t, body in records if kind == REC_RX) / kinds[REC_RX]
+print('captured {} records in {} bytes: config {}, rx {}, udp out {}, udp in {}, dropped {}'.format(
+    len(records), size, kinds.get(REC_CONFIG), kinds.get(REC_RX), kinds.get(REC_UDP_OUT), kinds.get(REC_UDP_IN), cap.dropped))
+print('rx record {:.1f} bytes for a {} byte frame'.format(rx_bytes, len(frame(0))))
+assert kinds[REC_RX] == FRAMES and cap.dropped == 0
+tmst, err, rssi, snr, data = parse_rx([body for kind, t, body in records if kind == REC_RX][3])
+assert data == frame(3) and rssi == -61.5 and snr == -4.25
+
+#cost of capturing: the RX path from DIO1 through the push, and the write out per record
+def rx_path(capture):
+    rig = Rig(radio, capture=capture)
+    times = []
+    flush = []
+    for i in range(TIMED):
+        t = time.ticks_us()
+        rig.rx(frame(i), -80, 5.0)
+        times.append(time.ticks_diff(time.ticks_us(), t))
+        if capture is not None:
+            t = time.ticks_us()
+            capture.flush()
+            #the frame and the PUSH_DATA
+            flush.append(time.ticks_diff(time.ticks_us(), t) / 2)
+        rig.server.poll()
+        rig.gw.udp_cycle()
+    rig.close()
+    times.sort()
+    flush.sort()
+    return times[TIMED // 2], flush[TIMED // 2] if flush else 0
+
+off, _ = rx_path(None)
+on, flush = rx_path(Capture(os.path.join(tmp, 'timed.bin')))
+#what rx_done adds, alone: the record queued at the interrupt
+c = Capture(os.path.join(tmp, 'queue.bin'), max_pending=TIMED)
+msg = frame(0)
+t = time.ticks_us()
+for i in range(TIMED):
+    c.rx(i, 0, -80, 5.0, msg)
+queue = time.ticks_diff(time.ticks_us(), t) / TIMED
+c.close()
+print('rx path median {} us without capture, {} us with; rx record queued in {:.1f} us, written in {:.0f} us'.format(
+    off, on, queue, flush))
+
+#serial console: base64 lines tagged PGWC: among the rest of the output read back the same
+out = io.StringIO()
+stdout = sys.stdout
+sys.stdout = out
+try:
+    serial = Capture()
+    binary = Capture(os.path.join(tmp, 'pair.bin'))
+    for c in (serial, binary):
+        c.config(radio, {})
+        c.rx(12345, 0, -80.5, 7.25, frame(1))
+        c.rx(12399, 0, -100, None, frame(2))
+        c.udp(REC_UDP_OUT, 1, b'\x02\x00\x01\x00' + bytes(8) + b'{}')
+        c.flush()
+        print('[    12.345] some log line')
+        c.close()
+finally:
+    sys.stdout = stdout
+with open(os.path.join(tmp, 'pair.bin'), 'rb') as f:
+    want = [(k, b) for k, t, b in read_capture(f.read())]
+got = [(k, b) for k, t, b in read_capture(out.getvalue().encode())]
+print('serial console: {} records, {} bytes of output for {} bytes of capture'.format(
+    len(got), len(out.getvalue()), binary.written))
+assert got == want and parse_rx(got[2][1])[3] is None
+
+#replay
+print()
+print('speed  rx  rxpk     stat  tx_ack      txnb  wall_ms  irq_fwd_us p50/p95  ok')
+for speed in (1, 10):
+    report = replay(records, speed)
+    fwd = report['metrics'].get('irq_fwd_us', {})
+    print('{:5d} {:3d} {:8s} {:5s} {:11s} {:4d} {:8d} {:>10}/{:<8} {}'.format(
+        speed, report['rx'], '{}/{}'.format(*report['rxpk']), '{}/{}'.format(*report['stat']),
+        '{}/{}'.format(len(report['tx_ack'][0]), len(report['tx_ack'][1])), report['txnb'], report['wall_ms'],
+        fwd.get('p50', '-'), fwd.get('p95', '-'), report['ok']))
+    for diff in report['rxpk_diffs']:
+        print('  rxpk {} {}: captured {!r}, replayed {!r}'.format(*diff))
+    assert report['ok'] and report['rx'] == FRAMES and report['txnb'] == 1
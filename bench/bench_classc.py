@@ -0,0 +1,129 @@
+# Class C downlink queue through the gateway, driver and emulator on a virtual
+# clock. Downlinks are queued like PULL_RESP without tmst, uplinks arrive at
+# random and keep the radio in RX for their airtime. Reports the queue wait,
+# the duty cycle reached, and the uplinks heard, deferred for or lost to TX.
+# A burst has to go out back to back, and the EU868 sub-bands keep separate budgets.
+# run with: python bench/bench_classc.py
+import _host
+import time
+import random
+import usocket
+from sx126x_emu import SX126XEmulator
+from sx1262 import SX1262
+from picogateway import PicoGateway
+from gwconfig import GatewayConfig
+from downlink import DownlinkQueue, DUTY_BURST_US
+
+STEP_US = 1000
+
+clock = [0]
+time.ticks_us = lambda: clock[0]
+time.ticks_cpu = time.ticks_us
+
+emu = SX126XEmulator()
+sink = usocket.socket(usocket.AF_INET, usocket.SOCK_DGRAM)
+sink.bind(usocket.getaddrinfo('127.0.0.1', 0)[0][-1])
+lora = SX1262(spi_bus=1, clk=10, mosi=11, miso=12, cs=3, irq=20, rst=15, gpio=2)
+
+def _cb(events, obj):
+    if events & SX1262.RX_DONE:
+        msg, err = lora.recv()
+        obj.rxok += 1
+    if events & SX1262.TX_DONE:
+        obj.txnb += 1
+        obj._tx_done()
+
+def run(name, duty, burst, rate, up_rate, seconds, txpk):
+    clock[0] = 0
+    radio = GatewayConfig(sf=9, duty=duty)
+    gw = PicoGateway('0011223344556677', radio.freq, radio.sf, radio.bw, radio.cr, '', '', '127.0.0.1',
+                     sink.getsockname()[1], radio=radio)
+    gw._log = lambda *args: None
+    radio.configure(lora)
+    gw.lora = lora
+    lora.setBlockingCallback(False, _cb, gw)
+    waits = []
+    gw.h_dlq_wait.record = waits.append
+    err, profile = gw._tx_profile(txpk)
+    payload = bytes(range(20))
+    airtime = lora.profileTimeOnAir(profile, len(payload))
+    up_air = lora.getTimeOnAir(len(payload))
+
+    tx_end = [None]
+    send = gw._send_down_link_c
+    def _send(data, profile):
+        tx_end[0] = clock[0] + airtime
+        send(data, profile)
+    gw._send_down_link_c = _send
+
+    random.seed(7)
+    end = seconds * 1000000
+    next_dl = 0 if rate else end
+    next_up = int(random.expovariate(up_rate) * 1000000)
+    up = None
+    heard = lost = 0
+    on_air = 0
+    alarm = None
+    for _ in range(burst):
+        gw._queue_down_link_c(payload, profile)
+    while clock[0] < end:
+        now = clock[0]
+        if tx_end[0] is not None and now >= tx_end[0]:
+            on_air += airtime
+            tx_end[0] = None
+            emu.service()
+            alarm = (gw.dl_alarm, now + gw.dl_alarm.period * 1000) if len(gw.dl_queue) else None
+        if alarm and now >= alarm[1]:
+            alarm[0].callback(alarm[0])
+            alarm = None
+        if now >= next_dl:
+            gw._queue_down_link_c(payload, profile)
+            next_dl += int(1000000 / rate)
+        if up is None and now >= next_up:
+            if tx_end[0] is not None:
+                lost += 1
+            else:
+                emu.rx_start()
+                up = now + up_air
+            next_up = now + int(random.expovariate(up_rate) * 1000000)
+        if up is not None and now >= up:
+            emu.receive(payload)
+            emu.service()
+            heard += 1
+            up = None
+        if now % (20 * STEP_US) == 0:
+            gw._pump_downlinks(None)
+        clock[0] += STEP_US
+    if tx_end[0] is not None:
+        on_air += airtime
+        emu.service()
+    waits.sort()
+    n = len(waits)
+    pct = lambda p: waits[min(n - 1, n * p // 100)] // 1000 if n else 0
+    print('{:34s} {:5d} {:5d} {:7d} {:7d} {:8d} {:6.2%} {:6d} {:5d} {:5d}'.format(
+        name, n, gw.c_dlq_drop.value(), pct(50), pct(95), waits[-1] // 1000 if n else 0,
+        on_air / end, heard, lost, gw.c_dlq_defer.value()))
+    #a burst goes out back to back on the full bucket, uplinks coming in between aside,
+    #the duty cycle holds past it
+    assert n >= burst and (not burst or waits[burst - 1] < 2 * burst * airtime)
+    assert on_air <= duty * (end + DUTY_BURST_US) + airtime
+
+print('downlink {} bytes at SF9BW125 RX2, uplinks at SF9BW125'.format(20))
+print('case                                  sent  drop  p50_ms  p95_ms   max_ms   duty  heard  lost defer')
+rx2 = {'freq': 869.525, 'datr': 'SF9BW125', 'powe': 14, 'ipol': True}
+run('multicast burst of 16, 10% duty', 0.1, 16, 0, 1.0, 10, rx2)
+run('multicast burst of 16, 1% duty', 0.01, 16, 0, 1.0, 10, rx2)
+run('1 downlink/s for 10 min, 1% duty', 0.01, 0, 1, 1.0, 600, rx2)
+run('1 downlink/s for 10 min, 10% duty', 0.1, 0, 1, 1.0, 600, rx2)
+
+#EU868 sub-bands keep their own budgets: class A replies in RX1 at 868.1 MHz (1%)
+#leave the RX2 budget at 869.525 MHz (10%) alone
+q = DownlinkQueue(16, GatewayConfig().subbands)
+rx1, rx2_band = q.band(868.1), q.band(869.525)
+full = q.budget[rx2_band]
+for _ in range(10):
+    q.start(200000, time.ticks_us(), rx1)
+    q.done(time.ticks_us())
+print()
+print('EU868 sub-band budgets after 2 s of RX1 airtime: RX1 {} ms, RX2 {} ms'.format(q.budget[rx1] // 1000, q.budget[rx2_band] // 1000))
+assert rx1 != rx2_band and q.budget[rx2_band] == full and q.budget[rx1] < q.budget_max[rx1]
@@ -0,0 +1,61 @@
+# Cold start of the radio: SX1262.__init__ to RX armed, LoRa through begin() and
+# GFSK through beginFSK(), with the register writes held back and merged as the
+# driver does now, and written through one by one as before. With busy_us the
+# emulator keeps BUSY high after every command past the driver's 1 us settle, as a
+# board does, so each SPI transaction costs a 1 ms yield in _waitBusy.
+# run with: python bench/bench_coldstart.py
+import _host
+import time
+from sx126x_emu import SX126XEmulator, STATUS_MODE_RX
+from sx126x import SX126X
+from sx1262 import SX1262
+from _sx126x import ERR_NONE
+
+RUNS = 5
+REG_OPS = (0x0D, 0x1D)
+
+emu = SX126XEmulator()
+batched = (SX126X.beginRegisters, SX126X.flushRegisters)
+
+def write_through(on):
+    if on:
+        SX126X.beginRegisters = lambda self: None
+        SX126X.flushRegisters = lambda self: ERR_NONE
+    else:
+        SX126X.beginRegisters, SX126X.flushRegisters = batched
+
+def lora():
+    radio = SX1262(spi_bus=1, clk=10, mosi=11, miso=12, cs=3, irq=20, rst=15, gpio=2)
+    radio.begin(freq=868.1, bw=125.0, sf=9, cr=5, syncWord=0x34,
+                power=14, currentLimit=60.0, preambleLength=8,
+                implicit=False, implicitLen=0xFF,
+                crcOn=True, txIq=False, rxIq=False,
+                tcxoVoltage=1.7, useRegulatorLDO=False, blocking=False)
+
+def gfsk():
+    radio = SX1262(spi_bus=1, clk=10, mosi=11, miso=12, cs=3, irq=20, rst=15, gpio=2)
+    radio.beginFSK(freq=868.3, br=50.0, freqDev=25.0, rxBw=117.3, power=14,
+                   tcxoVoltage=1.7, blocking=False)
+
+def measure(start):
+    times = []
+    for _ in range(RUNS):
+        emu.reset_counters()
+        t = time.ticks_us()
+        start()
+        times.append(time.ticks_diff(time.ticks_us(), t))
+        assert emu.mode == STATUS_MODE_RX
+    times.sort()
+    regs = sum(n for op, n in emu.commands.items() if op in REG_OPS)
+    return times[RUNS // 2], emu.transactions, regs, emu.bytes
+
+print('modem  busy_us  registers      spi_txn  reg_txn  spi_bytes  init_to_rx_ms')
+for name, start in (('LoRa', lora), ('GFSK', gfsk)):
+    for busy in (0, 200):
+        emu.busy_us = busy
+        for through in (True, False):
+            write_through(through)
+            t, txn, regs, nbytes = measure(start)
+            print('{:6s} {:7d}  {:13s} {:8d} {:8d} {:10d} {:14.1f}'.format(
+                name, busy, 'write through' if through else 'merged', txn, regs, nbytes, t / 1000))
+write_through(False)
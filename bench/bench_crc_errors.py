@@ -0,0 +1,63 @@
+# Non-blocking RX through the SX1262 driver and the emulator with a rising share of
+# CRC errors. Bad frames come back as a status code, no exception is raised on the way.
+# run with: python bench/bench_crc_errors.py
+import _host
+import time
+import random
+from sx126x_emu import SX126XEmulator
+from sx1262 import SX1262
+from _sx126x import ERR_NONE, ERR_CRC_MISMATCH, SX126XError
+from sx126x_errors import ERROR
+
+FRAMES = 2000
+
+emu = SX126XEmulator()
+lora = SX1262(spi_bus=1, clk=10, mosi=11, miso=12, cs=3, irq=20, rst=15, gpio=2)
+lora.begin(freq=868.1, bw=125.0, sf=12, cr=5, syncWord=0x34,
+           power=-5, currentLimit=60.0, preambleLength=8,
+           implicit=False, implicitLen=0xFF,
+           crcOn=True, txIq=True, rxIq=False,
+           tcxoVoltage=1.7, useRegulatorLDO=False, blocking=True)
+
+cost = {ERR_NONE: [0, 0], ERR_CRC_MISMATCH: [0, 0]}
+
+def _cb(events, obj):
+    t = time.ticks_us()
+    msg, err = lora.recv()
+    c = cost[err]
+    c[0] += 1
+    c[1] += time.ticks_diff(time.ticks_us(), t)
+
+lora.setBlockingCallback(False, _cb, None)
+
+random.seed(3)
+payload = bytes(random.getrandbits(8) for _ in range(23))
+print('crc_err  frames  us/good  us/bad  spi_bytes/frame')
+for rate in (0.0, 0.25, 0.5, 0.9):
+    for c in cost.values():
+        c[0] = c[1] = 0
+    emu.reset_counters()
+    for _ in range(FRAMES):
+        emu.receive(payload, crc_ok=random.random() >= rate)
+        emu.service()
+    good, bad = cost[ERR_NONE], cost[ERR_CRC_MISMATCH]
+    print('{:6.0%}  {:6d}  {:7.1f}  {:6.1f}  {:15.1f}'.format(
+        rate, good[0] + bad[0], good[1] / max(good[0], 1), bad[1] / max(bad[0], 1), emu.bytes / FRAMES))
+
+#status recovery alone, the old code mapped the assertion message back to the code
+N = 20000
+t = time.ticks_us()
+for _ in range(N):
+    try:
+        assert False, ERROR[ERR_CRC_MISMATCH]
+    except AssertionError as e:
+        state = list(ERROR.keys())[list(ERROR.values()).index(str(e))]
+old = time.ticks_diff(time.ticks_us(), t) / N
+t = time.ticks_us()
+for _ in range(N):
+    try:
+        raise SX126XError(ERR_CRC_MISMATCH)
+    except SX126XError as e:
+        state = e.state
+new = time.ticks_diff(time.ticks_us(), t) / N
+print('status lookup: reverse scan {:.2f} us, error code {:.2f} us'.format(old, new))
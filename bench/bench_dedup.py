@@ -0,0 +1,53 @@
+# Dedup cache hit rate and lookup cost on a synthetic uplink trace.
+# run with: python bench/bench_dedup.py
+import _host
+import time
+import random
+from dedup import DedupCache, DEDUP_WINDOW_MS
+
+NODES = 300
+FRAMES = 20000
+RATE_PER_S = 20         #aggregate uplinks per second
+DOUBLE_RX = 0.08        #same frame received twice, a few ms apart
+RETRANSMIT = 0.05       #confirmed uplink repeated after RX2 + ACK_TIMEOUT
+
+def uplink(addr, fcnt):
+    mic = random.getrandbits(32)
+    return bytes([0x80, addr & 0xFF, (addr >> 8) & 0xFF, (addr >> 16) & 0xFF, addr >> 24, 0x80,
+                  fcnt & 0xFF, fcnt >> 8, 0x01, 0x10, 0x20, 0x30, 0x40,
+                  mic & 0xFF, (mic >> 8) & 0xFF, (mic >> 16) & 0xFF, mic >> 24])
+
+def trace():
+    random.seed(1)
+    fcnt = [0] * NODES
+    events = []
+    t = 0.0
+    for _ in range(FRAMES):
+        t += random.expovariate(RATE_PER_S) * 1000
+        node = random.randrange(NODES)
+        fcnt[node] += 1
+        f = uplink(0x26000000 + node, fcnt[node] & 0xFFFF)
+        events.append((int(t), f, False))
+        if random.random() < DOUBLE_RX:
+            events.append((int(t) + random.randint(1, 60), f, True))
+        if random.random() < RETRANSMIT:
+            events.append((int(t) + random.randint(3000, 6000), f, False))
+    events.sort(key=lambda e: e[0])
+    return events
+
+events = trace()
+print('window {} ms, {} frames, {} expected duplicates'.format(DEDUP_WINDOW_MS, len(events), sum(1 for e in events if e[2])))
+print('capacity  hit_rate  missed_dups  false_drops  us/lookup')
+for capacity in (16, 32, 64, 128):
+    cache = DedupCache(capacity)
+    missed = 0
+    false = 0
+    start = time.ticks_us()
+    for now, f, dup in events:
+        hit = cache.seen(f, now)
+        if dup and not hit:
+            missed += 1
+        elif hit and not dup:
+            false += 1
+    us = time.ticks_diff(time.ticks_us(), start) / len(events)
+    print('{:>8}  {:>8.4f}  {:>11}  {:>11}  {:>9.2f}'.format(capacity, cache.hit_rate(), missed, false, us))
@@ -0,0 +1,235 @@
+# One SX1262 listening to LoRa and FSK in time slices. First the gateway in DUAL
+# mode on the emulator: what a slice switch costs (SPI, host time and the radio blind
+# meanwhile, with and without the BUSY model of bench_coldstart), that no switch
+# calibrates, and the preamble hold. Then a simulation of the slice scheduler over a
+# traffic trace: share of the frames captured per modem against the slice lengths,
+# with and without holding a slice for a frame in flight.
+# A trace is a text file, one uplink per line: start_ms modem datr length, e.g.
+#   1520.5 LORA SF9BW125 23
+#   1533.0 FSK 50000 17
+# Without one a seeded Poisson trace is made up.
+# run with: python bench/bench_dual.py [trace]
+import _host
+import sys
+import time
+import json
+import random
+import usocket
+import network
+from sx126x_emu import SX126XEmulator, STATUS_MODE_RX
+from sx1262 import SX1262
+from sx126x import loraTimeOnAir, fskTimeOnAir
+from picogateway import PicoGateway
+from gwconfig import GatewayConfig, parse_datr, FSK_PREAMBLE_BITS, FSK_SYNC_WORD, FSK_CRC_BYTES
+from slices import SliceScheduler
+from _sx126x import SX126X_LORA_CRC_ON, SX126X_LORA_HEADER_EXPLICIT
+
+SWITCHES = 40
+
+emu = SX126XEmulator()
+radio = GatewayConfig(modem='DUAL', sf=7, freq=868.1, fsk_freq=868.8, lora_slice_ms=15, fsk_slice_ms=5)
+sink = usocket.socket(usocket.AF_INET, usocket.SOCK_DGRAM)
+sink.bind(usocket.getaddrinfo('127.0.0.1', 0)[0][-1])
+sink.setblocking(False)
+gw = PicoGateway('0011223344556677', radio.freq, radio.sf, radio.bw, radio.cr, '', '', '127.0.0.1',
+                 sink.getsockname()[1], radio=radio)
+gw.wlan = network.WLAN(network.STA_IF)
+gw.forwarder.open()
+gw._log = lambda *args: None
+gw.dedup = None
+lora = SX1262(spi_bus=1, clk=10, mosi=11, miso=12, cs=3, irq=20, rst=15, gpio=2)
+radio.configure(lora)
+gw.lora = lora
+lora.setBlockingCallback(False, lambda events, obj: obj.rx_done() if events & SX1262.RX_DONE else None, gw)
+slicer = gw.slicer
+
+def wait_slice():
+    while slicer.left(time.ticks_us()):
+        pass
+
+#frames come from the RX ring, FSK ones are too short to push from the interrupt
+def sink_rxpk():
+    gw._drain_rx()
+    last = None
+    try:
+        while True:
+            last = sink.recv(1024)
+    except OSError:
+        pass
+    return json.loads(last[12:])['rxpk'][0]
+
+#what the chip listens with on each modem, as configure() left it
+#the SetRfFrequency word, 32 MHz crystal and 2^25 steps
+WANT = {'LORA': (0x01, int(radio.freq * (1 << 25) / 32)), 'FSK': (0x00, int(radio.fsk_freq * (1 << 25) / 32))}
+
+print('slice switch, busy_us   spi_txn  spi_bytes  calibrations  switch_us (median)')
+blind = {}
+for busy in (0, 200):
+    emu.busy_us = busy
+    txn = nbytes = cal = 0
+    times = []
+    for _ in range(SWITCHES):
+        wait_slice()
+        emu.reset_counters()
+        t = time.ticks_us()
+        gw._slice_tick(None)
+        times.append(time.ticks_diff(time.ticks_us(), t))
+        txn += emu.transactions
+        nbytes += emu.bytes
+        cal += emu.commands.get(0x98, 0)
+        assert (emu.packet_type, emu.frequency) == WANT[slicer.current()] and emu.mode == STATUS_MODE_RX
+    times.sort()
+    blind[busy] = times[SWITCHES // 2]
+    print('{:20d} {:9.1f} {:10.1f} {:13d} {:10d}'.format(busy, txn / SWITCHES, nbytes / SWITCHES, cal, blind[busy]))
+    assert cal == 0
+emu.busy_us = 0
+
+#a preamble at the end of the FSK slice holds it until the frame is in, then LoRa comes next
+while slicer.current() != 'FSK':
+    wait_slice()
+    gw._slice_tick(None)
+frame = bytes([0x40, 0x34, 0x12, 0x01, 0x26, 0x00, 0x01, 0x00, 0x01]) + bytes(range(8))
+emu.rx_start()
+wait_slice()
+gw._slice_tick(None)
+assert slicer.current() == 'FSK' and slicer.holding()
+emu.receive(frame, rssi=-95)
+emu.service()
+rxpk = sink_rxpk()
+assert slicer.current() == 'LORA' and rxpk['modu'] == 'FSK' and rxpk['datr'] == radio.fsk_datr and 'lsnr' not in rxpk
+#and a LoRa frame after it goes out as LoRa again
+emu.receive(frame, rssi=-95)
+emu.service()
+rxpk = sink_rxpk()
+assert rxpk['modu'] == 'LORA' and rxpk['datr'] == radio.datr and 'lsnr' in rxpk
+#a preamble that never turns into a frame holds the slice for the longest uplink only
+while slicer.current() != 'FSK':
+    wait_slice()
+    gw._slice_tick(None)
+emu.rx_start()
+wait_slice()
+gw._slice_tick(None)
+t = time.ticks_us()
+while slicer.current() == 'FSK':
+    gw._slice_tick(None)
+held = time.ticks_diff(time.ticks_us(), t)
+print('preamble hold: frame forwarded as FSK, stale hold given up after {} us (fsk_hold_us {}), holds {}, stale {}'.format(
+    held, radio.fsk_hold_us, slicer.holds, slicer.stale_holds))
+assert slicer.stale_holds == 1 and held >= radio.fsk_hold_us
+gw.forwarder.close()
+sink.close()
+
+#simulation: the receiver joins a preamble at most late_us after it started and has
+#detected it lock_us after joining. LoRa locks on 5 preamble symbols of 8, FSK on the
+#16 bit preamble detector plus a byte
+LORA_LOCK_SYMBOLS = 5
+FSK_LOCK_BITS = 24
+SIM = GatewayConfig(modem='DUAL', sf=9)
+
+def frame_times(start, modem, datr, n):
+    if modem == 'FSK':
+        br = datr / 1000
+        air = fskTimeOnAir(n, br, FSK_PREAMBLE_BITS, 8 * len(FSK_SYNC_WORD), FSK_CRC_BYTES)
+        lock = int(FSK_LOCK_BITS * 1000 / br)
+        late = int(FSK_PREAMBLE_BITS * 1000 / br) - lock
+    else:
+        sf, bw = parse_datr(datr)
+        air = loraTimeOnAir(n, sf, bw, SIM.cr, SIM.preamble, SX126X_LORA_CRC_ON, SX126X_LORA_HEADER_EXPLICIT)
+        symbol = ((1 << sf) * 1000) // bw
+        lock = LORA_LOCK_SYMBOLS * symbol
+        late = (SIM.preamble - LORA_LOCK_SYMBOLS) * symbol
+    return (start, late, lock, start + air)
+
+def load_trace(path):
+    trace = []
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) == 4 and not line.startswith('#'):
+                datr = int(fields[2]) if fields[1] == 'FSK' else fields[2]
+                trace.append((int(float(fields[0]) * 1000), fields[1], datr, int(fields[3])))
+    return trace
+
+#LoRa and FSK nodes sending Poisson uplinks of 13 to 51 bytes
+def make_trace(seconds=600, lora_per_s=0.5, fsk_per_s=2.0, seed=1):
+    rnd = random.Random(seed)
+    trace = []
+    for modem, datr, rate in (('LORA', SIM.datr, lora_per_s), ('FSK', SIM.fsk_datr, fsk_per_s)):
+        t = 0.0
+        while True:
+            t += rnd.expovariate(rate)
+            if t >= seconds:
+                break
+            trace.append((int(t * 1000000), modem, datr, rnd.randint(13, 51)))
+    trace.sort()
+    return trace
+
+trace = load_trace(sys.argv[1]) if len(sys.argv) > 1 else make_trace()
+frames = {'LORA': [], 'FSK': []}
+other = 0
+for start, modem, datr, n in trace:
+    #one SF and one bit rate are listened to, the rest is never received
+    if datr != (SIM.datr if modem == 'LORA' else SIM.fsk_datr):
+        other += 1
+        continue
+    frames[modem].append(frame_times(start, modem, datr, n))
+end = max(f[3] for fs in frames.values() for f in fs)
+
+def simulate(lora_ms, fsk_ms, blind_us, hold):
+    slicer = SliceScheduler((('LORA', lora_ms * 1000, SIM.rx_hold_us), ('FSK', fsk_ms * 1000, SIM.fsk_hold_us)), 0)
+    caught = {'LORA': 0, 'FSK': 0}
+    first = {'LORA': 0, 'FSK': 0}
+    t = 0
+    listen_from = 0
+    while t < end:
+        modem = slicer.current()
+        fs = frames[modem]
+        slice_end = t + slicer.left(t)
+        t_switch = slice_end
+        busy_until = listen_from
+        i = first[modem]
+        while i < len(fs) and fs[i][0] < t_switch:
+            start, late, lock, stop = fs[i]
+            i += 1
+            if start + late < listen_from or max(start, listen_from) < busy_until:
+                continue
+            if stop > t_switch and hold and t_switch == slice_end and max(start, listen_from) + lock <= slice_end:
+                t_switch = min(stop, slice_end + slicer.hold(slice_end))
+            if stop <= t_switch:
+                caught[modem] += 1
+                busy_until = stop
+        #frames starting before this slice can't be caught by a later one of the same modem
+        while first[modem] < len(fs) and fs[first[modem]][0] < t_switch:
+            first[modem] += 1
+        slicer.next(t_switch)
+        t = t_switch
+        listen_from = t + blind_us
+    return caught['LORA'] / max(1, len(frames['LORA'])), caught['FSK'] / max(1, len(frames['FSK'])), slicer
+
+#capture of a radio listening to one modem only, frames on air together collide
+def single(modem):
+    caught = busy_until = 0
+    for start, late, lock, stop in frames[modem]:
+        if start >= busy_until:
+            caught += 1
+            busy_until = stop
+    return caught / max(1, len(frames[modem]))
+
+n_lora, n_fsk = len(frames['LORA']), len(frames['FSK'])
+print()
+print('trace: {} LoRa {} frames, {} FSK {} bit/s frames, {} on other data rates, {:.0f} s'.format(
+    n_lora, SIM.datr, n_fsk, SIM.fsk_datr, other, end / 1000000))
+blind_us = blind[200]
+print('one radio per modem: lora_capture {:.3f}, fsk_capture {:.3f}'.format(single('LORA'), single('FSK')))
+print('blind window per switch {} us (emulated BUSY), capture per modem, without -> with preamble hold'.format(blind_us))
+print('lora_ms  fsk_ms  lora_share      lora_capture       fsk_capture               all  holds')
+for lora_ms in (250, 500, 1000, 2000):
+    for fsk_ms in (50, 100, 250, 500):
+        pl0, pf0, _ = simulate(lora_ms, fsk_ms, blind_us, False)
+        pl, pf, s = simulate(lora_ms, fsk_ms, blind_us, True)
+        both0 = (pl0 * n_lora + pf0 * n_fsk) / max(1, n_lora + n_fsk)
+        both = (pl * n_lora + pf * n_fsk) / max(1, n_lora + n_fsk)
+        print('{:7d} {:7d} {:11.2f} {:8.3f} -> {:5.3f} {:8.3f} -> {:5.3f} {:8.3f} -> {:5.3f} {:6d}'.format(
+            lora_ms, fsk_ms, lora_ms / (lora_ms + fsk_ms), pl0, pl, pf0, pf, both0, both, s.holds))
+        #a held slice is time the other modem doesn't get, overall the hold has to pay off
+        assert both >= both0
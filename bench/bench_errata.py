@@ -0,0 +1,66 @@
+# SPI traffic of the errata fix-ups (inverted IQ, sensitivity) per RX re-arm and per
+# downlink TX through the SX1262 driver and the emulator. A read-modify-write fix-up
+# costs a READ_REGISTER and a WRITE_REGISTER, 9 bytes, the driver now only writes
+# when the bit changes and never reads back after the first time.
+# run with: python bench/bench_errata.py
+import _host
+from sx126x_emu import SX126XEmulator
+from sx1262 import SX1262
+
+CYCLES = 200
+RMW_BYTES = 9
+REGS = (0x0736, 0x0889)
+
+emu = SX126XEmulator()
+lora = SX1262(spi_bus=1, clk=10, mosi=11, miso=12, cs=3, irq=20, rst=15, gpio=2)
+lora.begin(freq=868.1, bw=125.0, sf=9, cr=5, syncWord=0x34,
+           power=-5, currentLimit=60.0, preambleLength=8,
+           implicit=False, implicitLen=0xFF,
+           crcOn=True, txIq=True, rxIq=False,
+           tcxoVoltage=1.7, useRegulatorLDO=False, blocking=True)
+
+calls = [0]
+for name in ('fixInvertedIQ', 'fixSensitivity'):
+    def _counted(*args, _fix=getattr(lora, name)):
+        calls[0] += 1
+        return _fix(*args)
+    setattr(lora, name, _counted)
+
+lora.setBlockingCallback(False, lambda events, obj: lora.recv() if events & SX1262.RX_DONE else None, None)
+payload = bytes(range(23))
+
+def errata_bytes(trace):
+    n = 0
+    for frame in trace:
+        if frame[0] in (0x0D, 0x1D) and ((frame[1] << 8) | frame[2]) in REGS:
+            n += len(frame)
+    return n
+
+def measure(cycle):
+    calls[0] = 0
+    emu.reset_counters()
+    emu.trace = []
+    for _ in range(CYCLES):
+        cycle()
+    trace, emu.trace = emu.trace, None
+    return calls[0] / CYCLES, errata_bytes(trace) / CYCLES, emu.bytes / CYCLES
+
+def rx_cycle():
+    emu.receive(payload)
+    emu.service()
+
+def tx_cycle():
+    lora.send(payload)
+    emu.service()
+
+def tx_same_iq_cycle():
+    lora.setTxIq(False)
+    lora.send(payload)
+    emu.service()
+    lora.setTxIq(True)
+
+print('cycle                    fixups  errata_bytes  rmw_bytes  saved  spi_bytes')
+for name, cycle in (('RX re-arm', rx_cycle), ('TX, inverted IQ', tx_cycle), ('TX, same IQ as RX', tx_same_iq_cycle)):
+    fixups, errata, total = measure(cycle)
+    rmw = fixups * RMW_BYTES
+    print('{:24s} {:6.1f} {:13.1f} {:10.1f} {:6.1f} {:10.1f}'.format(name, fixups, errata, rmw, rmw - errata, total))
@@ -0,0 +1,47 @@
+# Per packet cost of Forwarder.push as the number of upstream servers grows.
+# Every upstream points to a local UDP sink, run with: python bench/bench_fanout.py
+import _host
+import time
+import usocket
+from forwarder import Forwarder, Upstream
+
+PACKETS = 2000
+PAYLOAD = b'{"rxpk":[{"time":"2024-01-01T00:00:00.0Z","tmst":12345678,"chan":0,"rfch":0,"freq":868.1,"stat":1,"modu":"LORA","datr":"SF12BW125","codr":"4/5","rssi":-97,"lsnr":7,"size":23,"data":"QAEAAAGAAQABpUaBxt5GSdIJuQ=="}]}'
+
+def sink():
+    s = usocket.socket(usocket.AF_INET, usocket.SOCK_DGRAM)
+    s.bind(usocket.getaddrinfo('127.0.0.1', 0)[0][-1])
+    s.setblocking(False)
+    return s
+
+def run(n, filtered=0):
+    sinks = [sink() for _ in range(n)]
+    ups = []
+    for i, s in enumerate(sinks):
+        prefixes = [(0x26000000, 7)] if i < filtered else None
+        u = Upstream('127.0.0.1', s.getsockname()[1], prefixes=prefixes)
+        u.open(s.getsockname())
+        ups.append(u)
+    fwd = Forwarder('0011223344556677', ups)
+    start = time.ticks_us()
+    for i in range(PACKETS):
+        fwd.push(PAYLOAD, 0x01020304)
+        if i % 32 == 0:
+            for s in sinks:
+                try:
+                    while s.recv(512):
+                        pass
+                except OSError:
+                    pass
+    elapsed = time.ticks_diff(time.ticks_us(), start)
+    fwd.close()
+    for s in sinks:
+        s.close()
+    return elapsed / PACKETS
+
+print('servers  us/packet  us/server')
+for n in (1, 2, 3, 4, 6, 8):
+    us = run(n)
+    print('{:>7}  {:>9.1f}  {:>9.1f}'.format(n, us, us / n))
+us = run(4, filtered=3)
+print('4 servers, 3 filtered out by DevAddr prefix: {:.1f} us/packet'.format(us))
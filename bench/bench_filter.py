@@ -0,0 +1,53 @@
+# Cost of the LoRaWAN frame filter against the full encode and forward path.
+# run with: python bench/bench_filter.py
+import _host
+import time
+import usocket
+import network
+from lorawan import FrameFilter, FRAME_FORWARD
+from forwarder import Upstream
+from picogateway import PicoGateway
+
+N = 2000
+
+def frame(addr):
+    #unconfirmed uplink, FCtrl 0, FCnt 1, FPort 1, 4 byte payload, MIC
+    return bytes([0x40, addr & 0xFF, (addr >> 8) & 0xFF, (addr >> 16) & 0xFF, addr >> 24,
+                  0x00, 0x01, 0x00, 0x01, 0xDE, 0xAD, 0xBE, 0xEF, 0x11, 0x22, 0x33, 0x44])
+
+def per_frame(fn, frames):
+    start = time.ticks_us()
+    for f in frames:
+        fn(f)
+    return time.ticks_diff(time.ticks_us(), start) / len(frames)
+
+sink = usocket.socket(usocket.AF_INET, usocket.SOCK_DGRAM)
+sink.bind(usocket.getaddrinfo('127.0.0.1', 0)[0][-1])
+sink.setblocking(False)
+gw = PicoGateway('0011223344556677', 868.1, 12, 125, 5, '', '', '127.0.0.1', sink.getsockname()[1],
+                 net_ids=[0x000013], devaddr_prefixes=[(0x01020000, 16), (0xFC00AC00, 23)])
+gw.wlan = network.WLAN(network.STA_IF)
+gw.forwarder.open()
+gw._log = lambda *args: None
+
+ours = [frame(0x26011234 + i) for i in range(N)]
+foreign = [frame(0x00AB0000 + i) for i in range(N)]
+
+def forward(f):
+    gw._push_data(gw._make_node_packet(f, gw.rtc.datetime(), -97, 7.5), 0, -1)
+    try:
+        while sink.recv(512):
+            pass
+    except OSError:
+        pass
+
+filt = gw.frame_filter
+print('ranges in filter      {}'.format(len(filt._start)))
+print('filter, accepted      {:>8.2f} us/frame'.format(per_frame(filt.check, ours)))
+print('filter, foreign       {:>8.2f} us/frame'.format(per_frame(filt.check, foreign)))
+print('encode and forward    {:>8.2f} us/frame'.format(per_frame(forward, ours)))
+big = FrameFilter(prefixes=[(i << 20, 12) for i in range(0, 4096, 2)])
+print('filter, 2048 ranges   {:>8.2f} us/frame'.format(per_frame(big.check, foreign)))
+assert filt.check(ours[0]) == FRAME_FORWARD and filt.check(foreign[0]) != FRAME_FORWARD
+gw.forwarder.close()
+sink.close()
@@ -0,0 +1,107 @@
+# FSK uplinks at 50 kbps through the SX1262 driver, the emulator and the gateway.
+# Frames arrive back to back, one per airtime of the virtual clock, and the UDP loop
+# drains the RX ring once per cycle. Reported: the interrupt side cost per frame
+# against the frame airtime, the push cost from the loop, and how many frames the
+# ring drops when the loop falls behind. The rxpk on the wire is checked for
+# modu FSK, a numeric datr and no lsnr.
+# run with: python bench/bench_fsk.py
+import _host
+import time
+import json
+import binascii
+import usocket
+import network
+from sx126x_emu import SX126XEmulator, STATUS_MODE_RX
+from sx1262 import SX1262
+from picogateway import PicoGateway, UDP_THREAD_CYCLE_MS
+from gwconfig import GatewayConfig
+
+N = 500
+LEN = 23
+
+emu = SX126XEmulator()
+radio = GatewayConfig(freq=868.8, modem='FSK', br=50.0)
+sink = usocket.socket(usocket.AF_INET, usocket.SOCK_DGRAM)
+sink.bind(usocket.getaddrinfo('127.0.0.1', 0)[0][-1])
+sink.setblocking(False)
+gw = PicoGateway('0011223344556677', radio.freq, radio.sf, radio.bw, radio.cr, '', '', '127.0.0.1',
+                 sink.getsockname()[1], radio=radio)
+gw.wlan = network.WLAN(network.STA_IF)
+gw.forwarder.open()
+gw._log = lambda *args: None
+#the runs send the same frames again
+gw.dedup = None
+lora = SX1262(spi_bus=1, clk=10, mosi=11, miso=12, cs=3, irq=20, rst=15, gpio=2)
+radio.configure(lora)
+gw.lora = lora
+lora.setBlockingCallback(False, lambda events, obj: obj.rx_done() if events & SX1262.RX_DONE else None, gw)
+assert emu.mode == STATUS_MODE_RX
+
+def frame(fcnt):
+    #unconfirmed uplink, FCtrl 0, FCnt, FPort 1, payload and MIC up to LEN bytes
+    head = bytes([0x40, 0x34, 0x12, 0x01, 0x26, 0x00, fcnt & 0xFF, (fcnt >> 8) & 0xFF, 0x01])
+    return head + bytes(range(LEN - len(head)))
+
+def sink_packets():
+    got = []
+    try:
+        while True:
+            got.append(sink.recv(1024))
+    except OSError:
+        pass
+    return got
+
+airtime = lora.getTimeOnAir(LEN)
+assert airtime == radio.uplink_air_us(LEN)
+frames = [frame(i) for i in range(N)]
+print('br {} kbps, {} byte frames, {} us on air, {:.0f} frames/s offered, ring {} frames'.format(
+    radio.br, LEN, airtime, 1e6 / airtime, len(gw._rx_ring)))
+
+#frames back to back on the virtual clock, the loop drains every drain_cycles UDP cycles
+def run(drain_cycles):
+    sink_packets()
+    rxfw = gw.rxfw
+    overrun = gw.c_rx_overrun.value()
+    irq_us = push_us = 0
+    virtual = next_drain = 0
+    cycle_us = drain_cycles * UDP_THREAD_CYCLE_MS * 1000
+    for f in frames:
+        virtual += airtime
+        if virtual >= next_drain:
+            t = time.ticks_us()
+            gw._drain_rx()
+            push_us += time.ticks_diff(time.ticks_us(), t)
+            next_drain += cycle_us
+        emu.receive(f, rssi=-90)
+        t = time.ticks_us()
+        emu.service()
+        irq_us += time.ticks_diff(time.ticks_us(), t)
+    t = time.ticks_us()
+    gw._drain_rx()
+    push_us += time.ticks_diff(time.ticks_us(), t)
+    forwarded = gw.rxfw - rxfw
+    dropped = gw.c_rx_overrun.value() - overrun
+    assert forwarded + dropped == N
+    return forwarded, dropped, irq_us / N, push_us / max(1, forwarded)
+
+print()
+print('loop drains every   forwarded  overrun  irq_us/frame  push_us/frame  airtime_us')
+for cycles in (1, 2, 4):
+    forwarded, dropped, irq, push = run(cycles)
+    print('{:2d} x {:2d} ms {:15d} {:8d} {:13.0f} {:14.0f} {:11d}'.format(
+        cycles, UDP_THREAD_CYCLE_MS, forwarded, dropped, irq, push, airtime))
+    if cycles <= 2:
+        assert dropped == 0
+
+sink_packets()
+emu.receive(frames[0], rssi=-90)
+emu.service()
+gw._drain_rx()
+rxpk = json.loads(sink_packets()[-1][12:])['rxpk'][0]
+print()
+print('rxpk: {}'.format({k: v for k, v in rxpk.items() if k not in ('time', 'data')}))
+assert rxpk['modu'] == 'FSK' and rxpk['datr'] == 50000 and 'lsnr' not in rxpk and 'codr' not in rxpk
+assert rxpk['rssi'] == -90 and binascii.a2b_base64(rxpk['data']) == frames[0]
+assert emu.mode == STATUS_MODE_RX
+gw.forwarder.close()
+sink.close()
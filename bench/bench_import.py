@@ -0,0 +1,48 @@
+# Import time and heap taken by the radio driver modules, each measured in a fresh
+# interpreter so nothing is cached. tracemalloc slows imports down a lot, so time
+# and heap come from separate runs. On a board run the body of _measure() from the
+# REPL after a soft reset, gc.mem_free() stands in for tracemalloc there.
+# run with: python bench/bench_import.py
+import _host
+import os
+import sys
+import subprocess
+
+CASES = (('sx1262',), ('sx1261',), ('sx1268',), ('sx1261', 'sx1262', 'sx1268'))
+RUNS = 5
+
+def _measure(mods, trace):
+    import _host
+    import gc
+    import time
+    import tracemalloc
+    #start from an unloaded driver, the shim imports the shared part eagerly
+    for m in ('_sx126x', 'sx126x'):
+        del sys.modules[m]
+    gc.collect()
+    if trace:
+        tracemalloc.start()
+    t = time.ticks_us()
+    _host.micropython_import(*mods)
+    dt = time.ticks_diff(time.ticks_us(), t)
+    gc.collect()
+    mem = 0
+    if trace:
+        mem = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    print(dt, mem)
+
+def _run(mods, trace):
+    code = 'import sys; sys.path.insert(0, {!r}); import bench_import; bench_import._measure({!r}, {})'.format(
+        os.path.dirname(os.path.abspath(__file__)), mods, trace)
+    return [int(v) for v in subprocess.check_output([sys.executable, '-c', code]).split()]
+
+def run(mods):
+    times = sorted(_run(mods, False)[0] for _ in range(RUNS))
+    return times[len(times) // 2], _run(mods, True)[1]
+
+if __name__ == '__main__':
+    print('modules                    import_us     heap_kB')
+    for mods in CASES:
+        t, mem = run(mods)
+        print('{:26s} {:9d} {:11.1f}'.format(' + '.join(mods), t, mem / 1024))
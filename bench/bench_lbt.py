@@ -0,0 +1,98 @@
+# Listen before talk: CAD cost per SF through the SX1262 driver and the emulator,
+# which finishes a CAD after the modelled duration on the host clock. Then timed
+# downlinks through the gateway with LBT on a free and a busy channel, one CAD per
+# timer step, with a class C downlink queued that must not get the radio in between.
+# run with: python bench/bench_lbt.py
+import _host
+import time
+import usocket
+import picogateway
+from sx126x_emu import SX126XEmulator, STATUS_MODE_RX
+from sx1262 import SX1262
+from picogateway import PicoGateway, LBT_SCAN_SETUP_US
+from gwconfig import GatewayConfig
+from _sx126x import CHANNEL_FREE
+from replay import ReplayTimer
+
+N = 20
+
+emu = SX126XEmulator()
+radio = GatewayConfig(lbt=True)
+sink = usocket.socket(usocket.AF_INET, usocket.SOCK_DGRAM)
+sink.bind(usocket.getaddrinfo('127.0.0.1', 0)[0][-1])
+gw = PicoGateway('0011223344556677', radio.freq, radio.sf, radio.bw, radio.cr, '', '', '127.0.0.1',
+                 sink.getsockname()[1], radio=radio)
+gw._log = lambda *args: None
+lora = SX1262(spi_bus=1, clk=10, mosi=11, miso=12, cs=3, irq=20, rst=15, gpio=2)
+radio.configure(lora)
+gw.lora = lora
+
+def _cb(events, obj):
+    if events & SX1262.TX_DONE:
+        obj.txnb += 1
+        obj._tx_done()
+
+lora.setBlockingCallback(False, _cb, gw)
+
+print('sf  cad_model_us  cad_measured_us  overshoot_us  lbt_budget_ms  spi_bytes first/next  restore_us')
+for sf in range(7, 13):
+    err, profile = gw._tx_profile({'freq': 869.525, 'datr': 'SF{}BW125'.format(sf), 'powe': 14, 'ipol': True})
+    lora.retune(profile)
+    emu.reset_counters()
+    lora.lbtScan()
+    first = emu.bytes
+    total = 0
+    for _ in range(N):
+        emu.reset_counters()
+        t = time.ticks_us()
+        assert lora.lbtScan() == CHANNEL_FREE
+        total += time.ticks_diff(time.ticks_us(), t)
+    cached = emu.bytes
+    emu_cad = emu.cad_time_us()
+    t = time.ticks_us()
+    lora.restoreRx()
+    restore = time.ticks_diff(time.ticks_us(), t)
+    emu.service()
+    model = lora.cadTime(profile)
+    print('{:2d} {:13d} {:16.0f} {:13.0f} {:14.1f} {:11d}/{:<8d} {:10d}'.format(
+        sf, model, total / N, total / N - emu_cad, radio.lbt_attempts * (model + LBT_SCAN_SETUP_US) / 1000,
+        first, cached, restore))
+
+picogateway.Timer = ReplayTimer
+acks = []
+gw._ack_pull_rsp = lambda u, token, error: acks.append(error)
+print()
+print('timed downlink      channel  ack               cads  sent_after_us  sent  rx_rearmed')
+payload = bytes(range(17))
+for datr in ('SF7BW125', 'SF9BW125', 'SF12BW125'):
+    for busy in (False, True):
+        err, profile = gw._tx_profile({'freq': 869.525, 'datr': datr, 'powe': 14, 'ipol': True})
+        airtime = lora.profileTimeOnAir(profile, len(payload))
+        #the timer fires the budget ahead of the send time, as armed by the PULL_RESP handler
+        tmst = time.ticks_cpu() + radio.tx_lead_us + radio.lbt_attempts * (lora.cadTime(profile) + LBT_SCAN_SETUP_US)
+        emu.cad_busy = busy
+        emu.cads = 0
+        txnb = gw.txnb
+        band = gw.dl_queue.band(869.525)
+        gw._queue_down_link_c(payload, profile, band)
+        gw.g_dl_pending.add(1)
+        gw._send_down_link_lbt(payload, tmst, profile, airtime, gw.forwarder.primary, b'\x00\x01', band)
+        #the loop and DIO1 run between the steps, the class C downlink waits for the radio
+        while gw._lbt is not None:
+            assert len(gw.dl_queue) == 1
+            emu.service()
+            gw._pump_downlinks(None)
+            ReplayTimer.fire()
+        #time past the send point when the TX command returned, or when LBT gave up
+        late = time.ticks_diff(time.ticks_cpu(), tmst - radio.tx_lead_us)
+        cads = emu.cads
+        gw.dl_queue.pop()
+        gw.g_dlq_depth.add(-1)
+        emu.service()
+        gw._flush_acks()
+        print('{:18s} {:8s} {:17s} {:5d} {:14d} {:5s} {}'.format(
+            datr, 'busy' if busy else 'free', acks[-1], cads, late, str(gw.txnb > txnb),
+            emu.mode == STATUS_MODE_RX))
+        #host scheduling can cost a CAD of the budget, not the ack
+        assert 1 <= cads <= radio.lbt_attempts and acks[-1] == ('COLLISION_PACKET' if busy else 'NONE')
+print('lbt_busy {}, lbt_fail {}'.format(gw.c_lbt_busy.value(), gw.c_lbt_fail.value()))
@@ -0,0 +1,124 @@
+# Hot path probes. Off, the modules hold no probe code: MicroPython drops the
+# `if _PROBES:` blocks of a const(0) when compiling, shown here by compiling them the
+# same way with CPython, and on the host the RX path is timed with the probes off and
+# on. On, uplinks and a class A downlink go through the gateway, driver and emulator
+# of bench/replay.py with the real _log, then the flame table comes back in reply to
+# a PROBE_DUMP datagram. Every probe point has to show up, nested where it runs.
+# run with: python bench/bench_probes.py
+import _host
+import io
+import dis
+import os
+import re
+import sys
+import time
+import ubinascii
+import probes
+import picogateway
+import forwarder
+import sx126x
+import sx126x_chip
+from gwconfig import GatewayConfig
+from picogateway import PROBE_DUMP
+from replay import Rig
+
+FRAMES = 50
+TIMED = 300
+PAIRS = 10000
+MODULES = (picogateway, forwarder, sx126x, sx126x_chip)
+
+def frame(i):
+    return bytes([0x40, 0x34, 0x12, 0x01, 0x26, 0x00, i & 0xFF, i >> 8, 0x01]) + bytes(range(10))
+
+#names the bytecode of a module loads or imports, nested functions and class bodies included.
+#co_names can keep the names of dropped code, the instructions don't
+def code_names(code):
+    names = set(i.argval for i in dis.get_instructions(code) if isinstance(i.argval, str))
+    for c in code.co_consts:
+        if hasattr(c, 'co_code'):
+            names |= code_names(c)
+    return names
+
+#the modules compiled like MicroPython does with _PROBES = const(0): the name is replaced
+#by its value and the compiler drops the dead blocks
+print('module            probe names with _PROBES 0   with 1')
+for m in MODULES:
+    with open(m.__file__.replace('.pyc', '.py')) as f:
+        source = f.read()
+    counts = []
+    for value in ('0', '1'):
+        folded = re.sub(r'\b_PROBES\b', value, source.replace('_PROBES = const(0)', ''))
+        names = code_names(compile(folded, m.__file__, 'exec'))
+        counts.append(len([n for n in names if n == 'PROBES' or n.startswith('P_')]))
+    print('{:17s} {:27d} {:8d}'.format(m.__name__, counts[0], counts[1]))
+    assert counts[0] == 0 and counts[1] > 0
+
+radio = GatewayConfig(sf=9).settings()
+
+def rx_path(rig):
+    times = []
+    for i in range(TIMED):
+        t = time.ticks_us()
+        rig.rx(frame(i), -80, 5.0)
+        times.append(time.ticks_diff(time.ticks_us(), t))
+        rig.step()
+    times.sort()
+    return times[TIMED // 2]
+
+rig = Rig(radio)
+off = rx_path(rig)
+rig.close()
+probes.enable(*MODULES)
+rig = Rig(radio)
+on = rx_path(rig)
+rig.close()
+p = probes.Probes()
+t = time.ticks_us()
+for _ in range(PAIRS):
+    p.enter(0)
+    p.exit(0)
+pair = time.ticks_diff(time.ticks_us(), t) / PAIRS
+print()
+print('rx path median {} us with the probes off, {} us on; enter and exit {:.2f} us'.format(off, on, pair))
+
+#a session with the probes on, the log is written to a buffer
+probes.PROBES.reset()
+rig = Rig(radio)
+gw = rig.gw
+del gw._log
+stdout = sys.stdout
+sys.stdout = io.StringIO()
+try:
+    gw._pull_data()
+    rig.run(20000)
+    for i in range(FRAMES):
+        rig.rx(frame(i), -80, 5.0)
+        rig.run(5000)
+    tmst = rig.server.rxpk[-1]['tmst']
+    rig.server.pull_resp(b'\x12\x34', {'txpk': {
+        'imme': False, 'tmst': (tmst + 1000000) & 0xFFFFFFFF, 'freq': 869.525, 'rfch': 0, 'powe': 14, 'modu': 'LORA',
+        'datr': 'SF9BW125', 'codr': '4/5', 'ipol': True, 'size': 12, 'data': ubinascii.b2a_base64(bytes(12))[:-1].decode()}})
+    rig.settle()
+    rig.server.sock.sendto(bytes([2, 0xAB, 0xCD, PROBE_DUMP]), rig.server.gw_addr)
+    rig.run(50000)
+finally:
+    sys.stdout = stdout
+rig.close()
+assert gw.txnb == 1
+replies = [d for d in rig.server.other if d[3] == PROBE_DUMP]
+assert len(replies) == 1 and replies[0][1:3] == b'\xab\xcd'
+table = replies[0][12:].decode()
+print()
+print('PROBE_DUMP reply, {} bytes'.format(len(replies[0])))
+print(table)
+rows = {}
+for line in table.split('\n')[1:]:
+    name = line[:26].strip()
+    rows.setdefault(name, []).append(len(line) - len(line.lstrip()))
+for name in probes.NAMES:
+    assert name in rows, name
+#SPI under the buffer read and the packet status, the datagram built and sent inside
+#the push, both under rx_done
+assert rows['rx_done'][0] == 0 and 2 in rows['_readData'] and 4 in rows['SPItransfer']
+assert 2 in rows['getRSSI/getSNR'] and 2 in rows['_push_data'] and 4 in rows['sendto']
+assert 4 in rows['frame_build']
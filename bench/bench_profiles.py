@@ -0,0 +1,93 @@
+# Radio profile switches through the SX1262 driver and the emulator: LoRa <-> GFSK
+# by begin()/beginFSK() against loadProfile() of a saved snapshot, and the uplink
+# listen profile against downlink profiles. Each switch ends with RX armed, the
+# chip state after a profile switch is checked against the one begin() leaves.
+# run with: python bench/bench_profiles.py
+import _host
+import time
+from sx126x_emu import SX126XEmulator
+from sx1262 import SX1262
+
+N = 20
+
+emu = SX126XEmulator()
+lora = SX1262(spi_bus=1, clk=10, mosi=11, miso=12, cs=3, irq=20, rst=15, gpio=2)
+
+def begin_lora():
+    lora.begin(freq=868.1, bw=125.0, sf=9, cr=5, syncWord=0x34, power=14, currentLimit=60.0,
+               preambleLength=8, implicit=False, implicitLen=0xFF, crcOn=True, txIq=False, rxIq=False,
+               tcxoVoltage=1.7, useRegulatorLDO=False, blocking=False)
+
+def begin_gfsk():
+    lora.beginFSK(freq=868.3, br=50.0, freqDev=25.0, rxBw=117.3, power=14, syncWord=[0xC1, 0x94, 0xC1],
+                  syncBitsLength=24, crcInitial=0x1D0F, crcPolynomial=0x1021, tcxoVoltage=1.7, blocking=False)
+
+#registers the active modem uses: sync word, CRC, whitening, addresses, then OCP and TX clamp.
+#The emulator keeps registers over a reset, the other modem's ones are left out
+REGS = {0x01: ((0x0740, 2), (0x0736, 1), (0x08E7, 1), (0x08D8, 1)),
+        0x00: ((0x06B8, 2), (0x06BC, 12), (0x06CD, 2), (0x08E7, 1), (0x08D8, 1))}
+
+def chip_state():
+    regs = tuple(bytes(emu.registers[a:a + n]) for a, n in REGS[emu.packet_type])
+    return (emu.packet_type, emu.frequency, bytes(emu.modulation), bytes(emu.packet_params), regs, emu.mode)
+
+def load(name):
+    def _load():
+        lora.loadProfile(name)
+        lora.startReceive()
+    return _load
+
+begin_gfsk()
+lora.saveProfile('gfsk')
+want_gfsk = chip_state()
+begin_lora()
+lora.saveProfile('lora')
+want_lora = chip_state()
+
+def measure(first, then):
+    txn = nbytes = total = 0
+    for _ in range(N):
+        first()
+        emu.reset_counters()
+        t = time.ticks_us()
+        then()
+        total += time.ticks_diff(time.ticks_us(), t)
+        txn += emu.transactions
+        nbytes += emu.bytes
+    return txn / N, nbytes / N, total / N
+
+print('switch, RX armed after                  spi_txn  spi_bytes   host_us  state')
+for name, first, then, want in (
+        ('LoRa -> GFSK, beginFSK()', begin_lora, begin_gfsk, want_gfsk),
+        ('LoRa -> GFSK, loadProfile()', load('lora'), load('gfsk'), want_gfsk),
+        ('GFSK -> LoRa, begin()', begin_gfsk, begin_lora, want_lora),
+        ('GFSK -> LoRa, loadProfile()', load('gfsk'), load('lora'), want_lora),
+        ('LoRa -> LoRa, same profile', load('lora'), load('lora'), want_lora)):
+    txn, nbytes, us = measure(first, then)
+    print('{:38s} {:8.1f} {:10.1f} {:9.0f}  {}'.format(name, txn, nbytes, us, 'same' if chip_state() == want else 'DIFFERS'))
+    assert chip_state() == want
+
+print()
+print('uplink listen <-> downlink                spi_txn  spi_bytes   host_us')
+load('lora')()
+for datr, freq in (('SF9 RX1', 868.1), ('SF12 RX2', 869.525), ('SF7 other channel', 868.5)):
+    sf = int(datr.split()[0][2:])
+    err, profile = lora.txProfile(freq, sf, 125, 14, True)
+    def _retune():
+        lora.retune(profile)
+    for name, step in (('listen -> ' + datr, _retune), (datr + ' -> listen', lora.restoreRx)):
+        txn = nbytes = total = 0
+        for _ in range(N):
+            if step == _retune:
+                lora.restoreRx()
+            else:
+                lora.retune(profile)
+            emu.reset_counters()
+            t = time.ticks_us()
+            step()
+            total += time.ticks_diff(time.ticks_us(), t)
+            txn += emu.transactions
+            nbytes += emu.bytes
+        print('{:38s} {:8.1f} {:10.1f} {:9.0f}'.format(name, txn / N, nbytes / N, total / N))
+lora.restoreRx()
+assert chip_state() == want_lora
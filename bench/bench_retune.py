@@ -0,0 +1,69 @@
+# Downlink channel switch through the gateway, driver and emulator: TX profile
+# lookup, retune to the txpk channel, send, and RX settings restored on TX_DONE.
+# The emulator finishes TX at once, so rx_blind here is the switching overhead
+# only, the airtime of the downlink adds to it on air.
+# run with: python bench/bench_retune.py
+import _host
+import time
+import usocket
+from sx126x_emu import SX126XEmulator, STATUS_MODE_RX
+from sx1262 import SX1262
+from picogateway import PicoGateway
+from gwconfig import GatewayConfig
+
+N = 200
+
+emu = SX126XEmulator()
+radio = GatewayConfig()
+sink = usocket.socket(usocket.AF_INET, usocket.SOCK_DGRAM)
+sink.bind(usocket.getaddrinfo('127.0.0.1', 0)[0][-1])
+gw = PicoGateway('0011223344556677', radio.freq, radio.sf, radio.bw, radio.cr, '', '', '127.0.0.1',
+                 sink.getsockname()[1], radio=radio)
+gw._log = lambda *args: None
+lora = SX1262(spi_bus=1, clk=10, mosi=11, miso=12, cs=3, irq=20, rst=15, gpio=2)
+radio.configure(lora)
+gw.lora = lora
+
+def _cb(events, obj):
+    if events & SX1262.TX_DONE:
+        obj.txnb += 1
+        obj._tx_done()
+
+lora.setBlockingCallback(False, _cb, gw)
+rx_frf = emu.frequency
+rx_mod = emu.modulation
+
+CASES = (
+    ('RX1, same channel', {'freq': 868.1, 'datr': 'SF12BW125', 'powe': 14, 'ipol': True}),
+    ('RX1, other channel', {'freq': 868.5, 'datr': 'SF10BW125', 'powe': 14, 'ipol': True}),
+    ('RX2 869.525 SF9', {'freq': 869.525, 'datr': 'SF9BW125', 'powe': 14, 'ipol': True}),
+    ('RX2 869.525 SF12', {'freq': 869.525, 'datr': 'SF12BW125', 'powe': 14, 'ipol': True}),
+)
+
+payload = bytes(range(17))
+t = time.ticks_us()
+err, profile = gw._tx_profile(CASES[2][1])
+cold = time.ticks_diff(time.ticks_us(), t)
+t = time.ticks_us()
+for _ in range(N):
+    gw._tx_profile(CASES[2][1])
+cached = time.ticks_diff(time.ticks_us(), t) / N
+print('txpk -> profile: first {} us, cached {:.1f} us'.format(cold, cached))
+
+print('case                 retune_max  restore_max  blind_max  spi_bytes tx/rx')
+for name, txpk in CASES:
+    gw.metrics.reset_window()
+    tx_bytes = rx_bytes = 0
+    for _ in range(N):
+        err, profile = gw._tx_profile(txpk)
+        emu.reset_counters()
+        #as armed by the PULL_RESP handler
+        gw.g_dl_pending.add(1)
+        gw._send_down_link(payload, time.ticks_cpu(), profile, 0)
+        tx_bytes = emu.bytes
+        emu.reset_counters()
+        emu.service()
+        rx_bytes = emu.bytes
+    assert emu.mode == STATUS_MODE_RX and emu.frequency == rx_frf and emu.modulation == rx_mod
+    print('{:20s} {:10d} {:12d} {:10d} {:9d}/{}'.format(name, gw.h_retune.summary()['max'],
+          gw.h_rx_restore.summary()['max'], gw.h_rx_blind.summary()['max'], tx_bytes, rx_bytes))
@@ -0,0 +1,139 @@
+# Duty cycled RX. First through the gateway on the emulator: the radio listens with
+# SET_RX_DUTY_CYCLE from the start, again after RX_DONE and after a downlink's
+# TX_DONE with standard IQ for the next uplink, and the stat packet carries the energy model. Then a simulation over a
+# Poisson uplink trace: packet loss against the energy saved, for RX windows sized
+# for one node preamble while the nodes send another.
+# run with: python bench/bench_rx_duty.py
+import _host
+import time
+import json
+import random
+from sx126x_emu import SX126XEmulator, STATUS_MODE_RX
+from sx1262 import SX1262
+from sx126x import loraTimeOnAir, rxDutyCyclePeriods
+from picogateway import PicoGateway
+from gwconfig import GatewayConfig
+from energy import EnergyModel
+from _sx126x import SX126X_LORA_CRC_ON, SX126X_LORA_HEADER_EXPLICIT
+
+SET_RX = 0x82
+SET_RX_DUTY_CYCLE = 0x94
+
+try:
+    GatewayConfig(rx_duty=True, sf=9)
+    raise AssertionError('an 8 symbol preamble left room to sleep')
+except ValueError as e:
+    print('rx_duty with the LoRaWAN 8 symbol preamble: {}'.format(e))
+
+emu = SX126XEmulator()
+radio = GatewayConfig(sf=9, rx_duty=True, node_preamble=24)
+gw = PicoGateway('0011223344556677', radio.freq, radio.sf, radio.bw, radio.cr, '', '', '127.0.0.1', 1700, radio=radio)
+gw._log = lambda *args: None
+gw._push_data = lambda *args: None
+lora = SX1262(spi_bus=1, clk=10, mosi=11, miso=12, cs=3, irq=20, rst=15, gpio=2)
+radio.configure(lora)
+gw.lora = lora
+
+def _cb(events, obj):
+    if events & SX1262.RX_DONE:
+        obj.rx_done()
+    if events & SX1262.TX_DONE:
+        obj.txnb += 1
+        obj._tx_done()
+
+def rearms(step):
+    emu.reset_counters()
+    step()
+    return emu.commands.get(SET_RX_DUTY_CYCLE, 0), emu.commands.get(SET_RX, 0)
+
+def rx_frame():
+    emu.receive(bytes([0x40, 0x34, 0x12, 0x01, 0x26, 0x00, 0x01, 0x00, 0x01]) + bytes(range(10)))
+    emu.service()
+
+def downlink():
+    err, profile = gw._tx_profile({'freq': 869.525, 'datr': 'SF12BW125', 'powe': 14, 'ipol': True})
+    gw._send_down_link_c(bytes(range(17)), profile)
+    emu.service()
+
+print('wake {} us, sleep {} us per window for a {} symbol node preamble at SF{}'.format(
+    radio.rx_wake_us, radio.rx_sleep_us, radio.node_preamble, radio.sf))
+print('re-arm                  SET_RX_DUTY_CYCLE  SET_RX')
+for name, step in (('callback mode', lambda: lora.setBlockingCallback(False, _cb, gw)),
+                   ('after RX_DONE', rx_frame), ('after TX_DONE', downlink)):
+    duty, rx = rearms(step)
+    print('{:22s} {:18d} {:7d}'.format(name, duty, rx))
+    assert duty == 1 and rx == 0 and emu.mode == STATUS_MODE_RX
+    #the last packet params byte is the IQ setup, RX listens with standard IQ even after
+    #an ipol downlink went out with inverted IQ
+    assert emu.packet_params[5] == 0
+#and hears the next uplink
+rxnb = gw.rxnb
+duty, rx = rearms(rx_frame)
+assert gw.rxnb == rxnb + 1 and duty == 1 and emu.packet_params[5] == 0
+#listen long enough past the airtime of the frame received
+time.sleep(1)
+perf = json.loads(gw._make_stat_packet())['stat']['perf']
+print('stat: {}'.format({k: perf[k] for k in ('e_mah', 'i_ma', 'res_pct', 'e_save_pct')}))
+assert perf['e_save_pct'] > 0
+#back to continuous RX
+assert lora.setRxDutyCycle(0) == 0 and emu.mode == STATUS_MODE_RX
+assert rearms(rx_frame) == (0, 1)
+
+#simulation: the radio detects a preamble when rx_duty_symbols of it fall in one RX window,
+#then stays in RX for the frame
+SF = 9
+BW = 125
+SYMBOL_US = ((1 << SF) * 1000) // BW
+MIN_SYMBOLS = 8
+TCXO_US = 5000
+SECONDS = 300
+
+def trace(per_s=1.0, seed=1):
+    rnd = random.Random(seed)
+    t = 0.0
+    frames = []
+    while True:
+        t += rnd.expovariate(per_s)
+        if t >= SECONDS:
+            return frames
+        frames.append((int(t * 1000000), rnd.randint(13, 51)))
+
+def detected(start, preamble_us, wake, period):
+    end = start + preamble_us
+    k = start // period
+    while k * period < end:
+        overlap = min(end, k * period + wake) - max(start, k * period)
+        if overlap >= MIN_SYMBOLS * SYMBOL_US:
+            return True
+        k += 1
+    return False
+
+def simulate(frames, node_preamble, sized_for):
+    periods = rxDutyCyclePeriods(sized_for, MIN_SYMBOLS, SF, BW, TCXO_US) if sized_for else None
+    wake, sleep = periods if periods else (0, 0)
+    energy = EnergyModel(False, wake, sleep, TCXO_US, 0)
+    lost = 0
+    for start, n in frames:
+        if periods is None or detected(start, node_preamble * SYMBOL_US, wake, wake + sleep):
+            energy.frame(loraTimeOnAir(n, SF, BW, 5, node_preamble, SX126X_LORA_CRC_ON, SX126X_LORA_HEADER_EXPLICIT))
+        else:
+            lost += 1
+    #read every minute like the stat packet would, ticks_diff only spans half the tick period
+    for t in range(0, SECONDS * 1000000 + 1, 60000000):
+        energy.residency(t)
+    now = SECONDS * 1000000
+    return lost / len(frames), energy.average_ma(now), 1 - energy.charge_mah(now) / energy.continuous_mah(now)
+
+frames = trace()
+print()
+print('{} uplinks in {} s at SF{}, windows catch {} preamble symbols'.format(len(frames), SECONDS, SF, MIN_SYMBOLS))
+print('node_preamble  sized_for  wake_us  sleep_us    loss    i_ma  saved')
+for node_preamble in (8, 16, 24, 32, 48):
+    for sized_for in (0, 18, 24, 32, 48):
+        loss, ma, saved = simulate(frames, node_preamble, sized_for)
+        periods = rxDutyCyclePeriods(sized_for, MIN_SYMBOLS, SF, BW, TCXO_US) if sized_for else (0, 0)
+        print('{:13d} {:>10s} {:8d} {:9d} {:7.3f} {:7.3f} {:6.3f}'.format(
+            node_preamble, str(sized_for) if sized_for else 'cont', periods[0], periods[1], loss, ma, saved))
+        #windows sized for the preamble the nodes send never miss one
+        if sized_for <= node_preamble:
+            assert loss == 0
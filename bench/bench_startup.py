@@ -0,0 +1,65 @@
+# Boot path as in main.py: imports, gateway and radio setup up to the first RX
+# armed, then heap in use once the sockets are open. Each run is a fresh
+# interpreter with the radio behind the emulator, NTP and WiFi are left out.
+# Times and heap come from separate runs, tracemalloc slows imports down.
+# run with: python bench/bench_startup.py
+import _host
+import os
+import sys
+import subprocess
+
+RUNS = 5
+
+def _measure(trace):
+    import _host
+    import gc
+    import time
+    import tracemalloc
+    import usocket
+    from sx126x_emu import SX126XEmulator, STATUS_MODE_RX
+    for m in ('_sx126x', 'sx126x'):
+        del sys.modules[m]
+    emu = SX126XEmulator()
+    sink = usocket.socket(usocket.AF_INET, usocket.SOCK_DGRAM)
+    sink.bind(usocket.getaddrinfo('127.0.0.1', 0)[0][-1])
+    gc.collect()
+    if trace:
+        tracemalloc.start()
+
+    t0 = time.ticks_us()
+    _host.micropython_import('sx1262', 'picogateway', 'gwconfig')
+    t_import = time.ticks_diff(time.ticks_us(), t0)
+    from sx1262 import SX1262
+    from picogateway import PicoGateway
+    from gwconfig import GatewayConfig
+    radio = GatewayConfig()
+    gw = PicoGateway('0011223344556677', radio.freq, radio.sf, radio.bw, radio.cr, '', '', '127.0.0.1',
+                     sink.getsockname()[1], radio=radio)
+    lora = SX1262(spi_bus=1, clk=10, mosi=11, miso=12, cs=3, irq=20, rst=15, gpio=2)
+    radio.configure(lora)
+    lora.setBlockingCallback(False, lambda events, obj: None, gw)
+    t_rx = time.ticks_diff(time.ticks_us(), t0)
+    assert emu.mode == STATUS_MODE_RX
+    gw.forwarder.open()
+
+    gc.collect()
+    heap = 0
+    if trace:
+        heap = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    lazy = ''.join('-' if m in sys.modules else 'L' for m in ('sx126x_fsk', 'sx126x_errors'))
+    print(t_import, t_rx, heap, lazy)
+
+def _run(trace):
+    code = 'import sys; sys.path.insert(0, {!r}); import bench_startup; bench_startup._measure({})'.format(
+        os.path.dirname(os.path.abspath(__file__)), trace)
+    out = subprocess.check_output([sys.executable, '-c', code]).split()
+    return int(out[0]), int(out[1]), int(out[2]), out[3].decode()
+
+if __name__ == '__main__':
+    runs = sorted((_run(False) for _ in range(RUNS)), key=lambda r: r[1])
+    t_import, t_rx = runs[len(runs) // 2][:2]
+    _, _, heap, lazy = _run(True)
+    print('import {:.1f} ms, first RX armed {:.1f} ms, heap after start {:.1f} kB'.format(
+        t_import / 1000, t_rx / 1000, heap / 1024))
+    print('FSK code {}, error names {}'.format(*('not loaded' if c == 'L' else 'loaded' for c in lazy)))
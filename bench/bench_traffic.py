@@ -0,0 +1,280 @@
+# End to end throughput under synthetic traffic. Nodes get an SF from a mix and send
+# Poisson uplinks with payload sizes from a distribution. On air, frames of other SFs
+# go unheard and a frame starting while the radio is on another of its SF is lost.
+# The frames heard are fed to the gateway, driver and emulator of bench/replay.py in
+# real time, sped up by each of the speeds, and pushed to its stand-in server. When the
+# next frame is done before the last one was read out it overwrites it in the chip.
+# Per speed: offered and sustained packets per second, the capacity the RX path's
+# service time allows, drops by cause, DIO1 to forward latency, RX path service time
+# and GC pauses. Once: heap allocated per packet on the RX path. Results are saved as
+# JSON, to bench/traffic.json unless out= says otherwise, compare= takes an earlier
+# results file and prints what changed.
+# Arguments are key=value: nodes, rate (uplinks per s per node), seconds of traffic,
+# sf (sf:weight,...), size (min-max or bytes:weight,...), gw_sf, speeds, seed, out, compare.
+# Only uses what MicroPython has too, but the emulator needs the host shims of _host.
+# run with: python bench/bench_traffic.py [nodes=100] [rate=0.05] [speeds=5,25,100,400]
+import _host
+import gc
+import sys
+import math
+import time
+import json
+import random
+from sx126x import loraTimeOnAir
+from gwconfig import GatewayConfig
+from replay import Rig
+from _sx126x import SX126X_LORA_CRC_ON, SX126X_LORA_HEADER_EXPLICIT
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+DEFAULTS = {'nodes': '100', 'rate': '0.05', 'seconds': '120', 'sf': '7:0.4,8:0.2,9:0.2,10:0.1,12:0.1',
+            'size': '13-51', 'gw_sf': '', 'speeds': '5,25,100,400', 'seed': '1',
+            'out': 'bench/traffic.json', 'compare': ''}
+#MHDR, DevAddr, FCtrl, FCnt, FPort and MIC
+OVERHEAD = 13
+ALLOC_FRAMES = 200
+#MicroPython collects once the heap has less than this free, like its automatic GC
+GC_FREE_MIN = 16384
+
+def parse_args(argv):
+    args = dict(DEFAULTS)
+    for a in argv:
+        key, _, value = a.partition('=')
+        if key not in args:
+            raise ValueError('unknown argument {}'.format(key))
+        args[key] = value
+    return args
+
+#'7:0.4,9:0.6' -> [(7, 0.4), (9, 0.6)], 'min-max' -> every size in range equally likely
+def parse_weights(spec):
+    if '-' in spec:
+        lo, hi = spec.split('-')
+        return [(n, 1.0) for n in range(int(lo), int(hi) + 1)]
+    out = []
+    for part in spec.split(','):
+        value, _, weight = part.partition(':')
+        out.append((int(value), float(weight) if weight else 1.0))
+    return out
+
+def pick(weights):
+    r = random.random() * sum(w for v, w in weights)
+    for v, w in weights:
+        r -= w
+        if r < 0:
+            return v
+    return weights[-1][0]
+
+def expo(rate):
+    return -math.log(1.0 - random.random()) / rate
+
+def percentiles(values):
+    if not values:
+        return {}
+    values = sorted(values)
+    n = len(values)
+    return {'p50': values[n // 2], 'p90': values[n * 9 // 10], 'p99': values[n * 99 // 100], 'max': values[-1]}
+
+#uplinks of all nodes as (start_us, end_us, sf, frame), the frame a LoRaWAN data uplink
+def make_traffic(args, radio):
+    random.seed(int(args['seed']))
+    sfs = parse_weights(args['sf'])
+    sizes = parse_weights(args['size'])
+    nodes = int(args['nodes'])
+    node_sf = [pick(sfs) for _ in range(nodes)]
+    fcnt = [0] * nodes
+    rate = nodes * float(args['rate'])
+    end = int(args['seconds']) * 1000000
+    traffic = []
+    t = 0
+    while True:
+        t += int(expo(rate) * 1000000)
+        if t >= end:
+            return traffic
+        node = int(random.random() * nodes)
+        n = max(OVERHEAD, pick(sizes))
+        fcnt[node] += 1
+        frame = bytes([0x40, node & 0xFF, node >> 8, 0x00, 0x26, 0x00, fcnt[node] & 0xFF, fcnt[node] >> 8, 0x01])
+        frame += bytes(int(random.random() * 256) for _ in range(n - OVERHEAD + 4))
+        air = loraTimeOnAir(n, node_sf[node], radio.bw, radio.cr, radio.preamble, SX126X_LORA_CRC_ON,
+                            SX126X_LORA_HEADER_EXPLICIT)
+        traffic.append((t, t + air, node_sf[node], frame))
+
+#frames the single SF radio receives as (end_us, frame, rssi, snr), and the counts of the rest
+def on_air(traffic, sf):
+    heard = []
+    other_sf = collision = 0
+    busy_until = 0
+    for start, end, frame_sf, frame in traffic:
+        if frame_sf != sf:
+            other_sf += 1
+        elif start < busy_until:
+            collision += 1
+        else:
+            busy_until = end
+            heard.append((end, frame, -120 + int(random.random() * 160) / 2, (int(random.random() * 80) - 40) / 4))
+    return heard, other_sf, collision
+
+def run(radio, heard, speed):
+    rig = Rig(radio.settings())
+    gw = rig.gw
+    due = [0]
+    latency = []
+    service = []
+    def _record(us):
+        latency.append(time.ticks_diff(time.ticks_us(), due[0]))
+        service.append(us)
+    gw.h_irq_fwd.record = _record
+    pauses = []
+    gc.collect()
+    callbacks = getattr(gc, 'callbacks', None)
+    if callbacks is not None:
+        started = [0]
+        def _gc(phase, info):
+            if phase == 'start':
+                started[0] = time.ticks_us()
+            else:
+                pauses.append(time.ticks_diff(time.ticks_us(), started[0]))
+        callbacks.append(_gc)
+    else:
+        gc.disable()
+    overrun = 0
+    n = len(heard)
+    start = time.ticks_add(time.ticks_us(), 10000)
+    try:
+        for i in range(n):
+            t = time.ticks_add(start, int(heard[i][0] / speed))
+            rig.run_until(t)
+            if i + 1 < n and time.ticks_diff(time.ticks_us(), time.ticks_add(start, int(heard[i + 1][0] / speed))) >= 0:
+                overrun += 1
+                continue
+            due[0] = t
+            end, frame, rssi, snr = heard[i]
+            rig.rx(frame, rssi, snr)
+            if callbacks is None and gc.mem_free() < GC_FREE_MIN:
+                t = time.ticks_us()
+                gc.collect()
+                pauses.append(time.ticks_diff(time.ticks_us(), t))
+        wall = time.ticks_diff(time.ticks_us(), start)
+        rig.run(50000)
+    finally:
+        if callbacks is not None:
+            callbacks.remove(_gc)
+        else:
+            gc.enable()
+    forwarded = len(rig.server.rxpk)
+    rig.close()
+    mean_service = sum(service) / len(service) if service else 0
+    return {
+        'speed': speed,
+        'sustained_pps': round(forwarded * 1000000 / wall, 1),
+        'capacity_pps': round(1000000 / mean_service, 1) if mean_service else 0,
+        'heard': n,
+        'forwarded': forwarded,
+        'overrun': overrun,
+        'lost': n - overrun - forwarded,
+        'latency_us': percentiles(latency),
+        'service_us': percentiles(service),
+        'gc': {'count': len(pauses), 'total_us': sum(pauses), 'pause_us': percentiles(pauses)},
+    }
+
+#heap allocated by rx_done through the push, frames back to back
+def allocations(radio, heard):
+    rig = Rig(radio.settings())
+    per = []
+    frames = heard[:ALLOC_FRAMES]
+    gc.collect()
+    if tracemalloc is not None:
+        #CPython frees on the spot, the peak above the start is what one packet holds at most
+        method = 'tracemalloc_peak'
+        tracemalloc.start()
+        for end, frame, rssi, snr in frames:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            rig.rx(frame, rssi, snr)
+            per.append(tracemalloc.get_traced_memory()[1] - before)
+            rig.step()
+        tracemalloc.stop()
+    else:
+        #nothing is freed with the GC off, the difference is all the packet allocated
+        method = 'mem_alloc'
+        for end, frame, rssi, snr in frames:
+            gc.collect()
+            gc.disable()
+            before = gc.mem_alloc()
+            rig.rx(frame, rssi, snr)
+            per.append(gc.mem_alloc() - before)
+            gc.enable()
+            rig.step()
+    rig.close()
+    return {'method': method, 'frames': len(per), 'bytes_mean': sum(per) // max(1, len(per)), 'bytes': percentiles(per)}
+
+def compare(results, path):
+    with open(path) as f:
+        old = json.loads(f.read())
+    print()
+    print('against {}'.format(path))
+    print('speed  sustained_pps       latency_p99_us         gw_drop_rate')
+    before = {r['speed']: r for r in old['runs']}
+    for r in results['runs']:
+        o = before.get(r['speed'])
+        if o is None:
+            continue
+        print('{:5d} {:7.1f} -> {:<7.1f} {:8d} -> {:<8d} {:7.3f} -> {:.3f}'.format(
+            r['speed'], o['sustained_pps'], r['sustained_pps'], o['latency_us'].get('p99', 0),
+            r['latency_us'].get('p99', 0), o['gw_drop_rate'], r['gw_drop_rate']))
+    print('heap per packet {} -> {} bytes'.format(old['alloc']['bytes_mean'], results['alloc']['bytes_mean']))
+
+def main(argv):
+    args = parse_args(argv)
+    sfs = parse_weights(args['sf'])
+    gw_sf = int(args['gw_sf']) if args['gw_sf'] else max(sfs, key=lambda w: w[1])[0]
+    radio = GatewayConfig(sf=gw_sf)
+    traffic = make_traffic(args, radio)
+    heard, other_sf, collision = on_air(traffic, gw_sf)
+    seconds = int(args['seconds'])
+    print('{} nodes, {} uplinks in {} s ({:.2f} per s), SF mix {}, sizes {}, gateway on SF{}'.format(
+        args['nodes'], len(traffic), seconds, len(traffic) / seconds, args['sf'], args['size'], gw_sf))
+    print('on air: {} heard, {} on other SFs, {} lost to collisions'.format(len(heard), other_sf, collision))
+    results = {
+        'implementation': sys.implementation.name,
+        'time': time.time(),
+        'args': args,
+        'offered': len(traffic),
+        'other_sf': other_sf,
+        'collision': collision,
+        'runs': [],
+    }
+    print()
+    print('speed  offered_pps  sustained_pps  capacity_pps  overrun  drop_rate  gw_drop  latency_us p50/p90/p99  service_us p50/p99  gc n/max_us')
+    for speed in [int(s) for s in args['speeds'].split(',')]:
+        r = run(radio, heard, speed)
+        r['offered_pps'] = round(len(traffic) * speed / seconds, 1)
+        #of all uplinks sent, and of the frames the radio received
+        r['drop_rate'] = round(1 - r['forwarded'] / max(1, len(traffic)), 4)
+        r['gw_drop_rate'] = round(1 - r['forwarded'] / max(1, len(heard)), 4)
+        results['runs'].append(r)
+        lat = r['latency_us']
+        srv = r['service_us']
+        print('{:5d} {:12.1f} {:14.1f} {:13.1f} {:8d} {:10.3f} {:8.3f} {:>11}/{}/{} {:>11}/{} {:>7}/{}'.format(
+            speed, r['offered_pps'], r['sustained_pps'], r['capacity_pps'], r['overrun'], r['drop_rate'], r['gw_drop_rate'],
+            lat.get('p50'), lat.get('p90'), lat.get('p99'), srv.get('p50'), srv.get('p99'),
+            r['gc']['count'], r['gc']['pause_us'].get('max', 0)))
+        #nothing heard goes missing inside the gateway, overwritten frames aside
+        assert r['lost'] == 0
+    #at the slowest speed the gateway keeps up with every frame
+    assert results['runs'][0]['overrun'] == 0
+    results['alloc'] = allocations(radio, heard)
+    a = results['alloc']
+    print('heap per packet on the RX path ({}): mean {} bytes, p90 {}, max {}'.format(
+        a['method'], a['bytes_mean'], a['bytes'].get('p90'), a['bytes'].get('max')))
+    if args['out']:
+        with open(args['out'], 'w') as f:
+            f.write(json.dumps(results))
+        print('results saved to {}'.format(args['out']))
+    if args['compare']:
+        compare(results, args['compare'])
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
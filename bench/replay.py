@@ -0,0 +1,282 @@
+# Replays a capture made on the gateway (capture.py) on host CPython: the frames go
+# through the SX126x emulator, the driver and the gateway again, at their original
+# pace or sped up, against a local stand-in for the network server that acks what it
+# gets and sends the captured PULL_RESPs back. Timed downlinks are moved to the
+# replayed uplink they answer. The rxpk pushed are compared field by field with the
+# captured ones, the run fails on any difference.
+# The capture is the binary log from flash or a serial console log with PGWC: lines.
+# run with: python bench/replay.py capture.bin [speed]
+import _host
+import sys
+import time
+import json
+import usocket
+import network
+import ubinascii
+import picogateway
+from sx126x_emu import SX126XEmulator
+from sx1262 import SX1262
+from picogateway import PicoGateway, PUSH_DATA, PUSH_ACK, PULL_DATA, PULL_ACK, PULL_RESP, TX_ACK
+from gwconfig import GatewayConfig
+from capture import read_capture, parse_rx, parse_udp, REC_CONFIG, REC_RX, REC_UDP_OUT, REC_UDP_IN
+from _sx126x import ERR_NONE, ERR_CRC_MISMATCH
+
+#rxpk fields that have to come out the same, tmst and time depend on when it runs
+RXPK_FIELDS = ('stat', 'modu', 'datr', 'codr', 'freq', 'rssi', 'lsnr', 'size', 'data')
+#longest a timed downlink waits for its send time
+SETTLE_MS = 25000
+
+#timers of the gateway fire from Rig.step(), in ms like the port's
+class ReplayTimer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+    armed = []
+
+    def __init__(self, id=-1, **kwargs):
+        self.init(**kwargs)
+
+    def init(self, mode=ONE_SHOT, period=0, callback=None, **kwargs):
+        self.mode = mode
+        self.period = period
+        self.callback = callback
+        self.due = time.ticks_add(time.ticks_ms(), period)
+        if self not in ReplayTimer.armed:
+            ReplayTimer.armed.append(self)
+
+    def deinit(self):
+        self.callback = None
+        if self in ReplayTimer.armed:
+            ReplayTimer.armed.remove(self)
+
+    @classmethod
+    def fire(cls):
+        now = time.ticks_ms()
+        for t in list(cls.armed):
+            if t.callback is None or time.ticks_diff(now, t.due) < 0:
+                continue
+            callback = t.callback
+            if t.mode == cls.PERIODIC:
+                t.due = time.ticks_add(t.due, t.period)
+            else:
+                t.deinit()
+            #a one shot callback may arm its timer again
+            callback(t)
+
+class StandIn:
+    """
+    Local network server: acks PUSH_DATA and PULL_DATA, keeps the rxpk and
+    TX_ACK errors it gets, and sends PULL_RESPs to the address the gateway
+    pulled from.
+    """
+
+    def __init__(self):
+        self.sock = usocket.socket(usocket.AF_INET, usocket.SOCK_DGRAM)
+        self.sock.bind(usocket.getaddrinfo('127.0.0.1', 0)[0][-1])
+        self.sock.setblocking(False)
+        self.port = self.sock.getsockname()[1]
+        self.gw_addr = None
+        self.rxpk = []
+        self.stats = 0
+        self.pulls = 0
+        self.tx_acks = []
+        #datagrams of any other type
+        self.other = []
+
+    def poll(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(2048)
+            except OSError:
+                return
+            kind = data[3]
+            if kind == PUSH_DATA:
+                self.sock.sendto(data[:3] + bytes([PUSH_ACK]), addr)
+                push = json.loads(data[12:])
+                self.rxpk.extend(push.get('rxpk', ()))
+                if 'stat' in push:
+                    self.stats += 1
+            elif kind == PULL_DATA:
+                self.gw_addr = addr
+                self.pulls += 1
+                self.sock.sendto(data[:3] + bytes([PULL_ACK]), addr)
+            elif kind == TX_ACK:
+                self.tx_acks.append(json.loads(data[12:])['txpk_ack']['error'] if len(data) > 12 else 'NONE')
+            else:
+                self.other.append(data)
+
+    def pull_resp(self, token, resp):
+        self.sock.sendto(bytes([2]) + token + bytes([PULL_RESP]) + json.dumps(resp).encode(), self.gw_addr)
+
+    def close(self):
+        self.sock.close()
+
+def _callback(events, gw):
+    if events & SX1262.RX_DONE:
+        gw.rx_done()
+    if events & SX1262.TX_DONE:
+        gw.txnb += 1
+        gw._tx_done()
+
+class Rig:
+    """
+    The gateway, driver and emulator on host with a stand-in server, set up
+    like start() would without WiFi, NTP and the periodic timers. step() is
+    one pass of the main loops: due timers, the DIO1 interrupt, the UDP loop
+    and the server.
+    """
+
+    def __init__(self, radio, gateway=None, capture=None, gateway_id='0011223344556677'):
+        picogateway.Timer = ReplayTimer
+        ReplayTimer.armed = []
+        self.emu = SX126XEmulator()
+        self.server = StandIn()
+        self.radio = GatewayConfig(**radio)
+        gw = PicoGateway(gateway_id, self.radio.freq, self.radio.sf, self.radio.bw, self.radio.cr, '', '',
+                         '127.0.0.1', self.server.port, radio=self.radio, capture=capture, **(gateway or {}))
+        gw.wlan = network.WLAN(network.STA_IF)
+        gw.forwarder.open()
+        gw._log = lambda *args: None
+        self.lora = SX1262(spi_bus=1, clk=10, mosi=11, miso=12, cs=3, irq=20, rst=15, gpio=2)
+        self.radio.configure(self.lora)
+        gw.lora = self.lora
+        self.lora.setBlockingCallback(False, _callback, gw)
+        self.gw = gw
+
+    def step(self):
+        ReplayTimer.fire()
+        self.emu.service()
+        self.server.poll()
+        self.gw.udp_cycle()
+
+    def run_until(self, t_us):
+        while time.ticks_diff(t_us, time.ticks_us()) > 0:
+            self.step()
+            time.sleep_us(200)
+
+    def run(self, us):
+        self.run_until(time.ticks_add(time.ticks_us(), us))
+
+    #until the datagrams in flight are handled and the timed downlinks went out
+    def settle(self):
+        self.run(100000)
+        t = time.ticks_ms()
+        while ReplayTimer.armed and time.ticks_diff(time.ticks_ms(), t) < SETTLE_MS:
+            self.run(1000)
+        self.run(100000)
+
+    #a frame as the radio received it, in DUAL mode on the modem it came in on.
+    #Returns the ticks_cpu it came in at
+    def rx(self, frame, rssi, snr, crc_ok=True):
+        fsk = snr is None
+        if self.gw.slicer is not None and self.gw._fsk != fsk:
+            self.lora.loadProfile('FSK' if fsk else 'LORA')
+            self.lora.startReceive()
+            self.gw._fsk = fsk
+        self.emu.receive(frame, rssi, 0 if fsk else snr, crc_ok)
+        t = time.ticks_cpu()
+        self.emu.service()
+        return t
+
+    def close(self):
+        self.gw.forwarder.close()
+        self.server.close()
+
+#replays records from read_capture(), returns a report dict with ok False on any difference
+def replay(records, speed=1.0):
+    config = None
+    gateway_id = None
+    for kind, t, body in records:
+        if kind == REC_CONFIG and config is None:
+            config = json.loads(body)
+        elif kind == REC_UDP_OUT and gateway_id is None and len(body) >= 13:
+            gateway_id = ubinascii.hexlify(body[5:13]).decode()
+    if config is None:
+        raise ValueError('capture has no config record')
+    rig = Rig(config['radio'], config['gateway'], gateway_id=gateway_id or '0011223344556677')
+    gw = rig.gw
+    captured = {'rxpk': [], 'stat': 0, 'pull': 0, 'tx_ack': []}
+    rx = skipped = 0
+    #replay ticks_cpu minus captured tmst of the last frame, moves the downlinks answering it
+    shift = None
+    t_wall = time.ticks_ms()
+    at = time.ticks_us()
+    t_prev = records[0][1]
+    for kind, t, body in records:
+        at = time.ticks_add(at, int(time.ticks_diff(t, t_prev) / speed))
+        t_prev = t
+        rig.run_until(at)
+        if kind == REC_RX:
+            tmst, err, rssi, snr, frame = parse_rx(body)
+            if err != ERR_NONE and err != ERR_CRC_MISMATCH:
+                skipped += 1
+                continue
+            rx += 1
+            shift = rig.rx(frame, rssi, snr, err == ERR_NONE) - tmst
+        elif kind == REC_UDP_OUT or kind == REC_UDP_IN:
+            index, datagram = parse_udp(body)
+            #the stand-in plays the primary server
+            if index:
+                continue
+            _type = datagram[3]
+            if kind == REC_UDP_IN:
+                if _type == PULL_RESP and rig.server.gw_addr is not None:
+                    resp = json.loads(datagram[4:])
+                    txpk = resp['txpk']
+                    if 'tmst' in txpk and shift is not None:
+                        txpk['tmst'] = (txpk['tmst'] + shift) & 0xFFFFFFFF
+                    rig.server.pull_resp(datagram[1:3], resp)
+            elif _type == PUSH_DATA:
+                push = json.loads(datagram[12:])
+                captured['rxpk'].extend(push.get('rxpk', ()))
+                #stat packets come from a timer, sent when the capture did
+                if 'stat' in push:
+                    captured['stat'] += 1
+                    gw._push_data(gw._make_stat_packet())
+            elif _type == PULL_DATA:
+                captured['pull'] += 1
+                gw._pull_data()
+            elif _type == TX_ACK:
+                captured['tx_ack'].append(json.loads(datagram[12:])['txpk_ack']['error'] if len(datagram) > 12 else 'NONE')
+    rig.settle()
+    server = rig.server
+    diffs = []
+    for i, (want, got) in enumerate(zip(captured['rxpk'], server.rxpk)):
+        for field in RXPK_FIELDS:
+            if want.get(field) != got.get(field):
+                diffs.append((i, field, want.get(field), got.get(field)))
+    metrics = gw.metrics.summary()
+    report = {
+        'speed': speed,
+        'records': len(records),
+        'rx': rx,
+        'rx_skipped': skipped,
+        'rxpk': (len(captured['rxpk']), len(server.rxpk)),
+        'rxpk_diffs': diffs,
+        'stat': (captured['stat'], server.stats),
+        'pull': (captured['pull'], server.pulls),
+        'tx_ack': (captured['tx_ack'], server.tx_acks),
+        'txnb': gw.txnb,
+        'wall_ms': time.ticks_diff(time.ticks_ms(), t_wall),
+        'metrics': {name: metrics[name] for name in ('irq_fwd_us', 'spi_rx_us', 'dl_err_us') if name in metrics},
+    }
+    report['ok'] = (not diffs and report['rxpk'][0] == report['rxpk'][1] and report['stat'][0] == report['stat'][1]
+                    and report['tx_ack'][0] == report['tx_ack'][1])
+    rig.close()
+    return report
+
+def main(argv):
+    if len(argv) < 2:
+        print('usage: replay.py capture [speed]')
+        return 2
+    with open(argv[1], 'rb') as f:
+        records = read_capture(f.read())
+    report = replay(records, float(argv[2]) if len(argv) > 2 else 1.0)
+    for name in ('records', 'rx', 'rx_skipped', 'rxpk', 'stat', 'pull', 'tx_ack', 'txnb', 'wall_ms', 'metrics'):
+        print('{:11s} {}'.format(name, report[name]))
+    for i, field, want, got in report['rxpk_diffs']:
+        print('rxpk {} {}: captured {!r}, replayed {!r}'.format(i, field, want, got))
+    print('replay matches the capture' if report['ok'] else 'replay differs from the capture')
+    return 0 if report['ok'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
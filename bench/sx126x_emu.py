@@ -0,0 +1,240 @@
+# Command level SX126x emulator behind the host shim's fake SPI bus and pins.
+# It keeps enough state for the driver's LoRa/GFSK RX, TX and CAD paths and
+# counts every SPI transaction and byte, so driver changes can be measured.
+import time
+import machine
+
+STATUS_MODE_STDBY_RC = 0x20
+STATUS_MODE_RX = 0x50
+STATUS_MODE_TX = 0x60
+
+IRQ_TX_DONE = 0x001
+IRQ_RX_DONE = 0x002
+IRQ_PREAMBLE_DETECTED = 0x004
+IRQ_HEADER_VALID = 0x010
+IRQ_HEADER_ERR = 0x020
+IRQ_CRC_ERR = 0x040
+IRQ_CAD_DONE = 0x080
+IRQ_CAD_DETECTED = 0x100
+
+#SetModulationParams LoRa bandwidth codes -> kHz
+LORA_BW_KHZ = {0x00: 7.8, 0x08: 10.4, 0x01: 15.6, 0x09: 20.8, 0x02: 31.25, 0x0A: 41.7, 0x03: 62.5,
+               0x04: 125.0, 0x05: 250.0, 0x06: 500.0}
+
+#opcode -> header length for commands answering with data
+READS = {0x1D: 3, 0x1E: 2, 0x10: 1, 0x11: 1, 0x12: 1, 0x13: 1, 0x14: 1, 0x15: 1, 0x17: 1, 0xC0: 1}
+
+NAMES = {0x80: 'SET_STANDBY', 0x82: 'SET_RX', 0x83: 'SET_TX', 0x84: 'SET_SLEEP', 0x86: 'SET_RF_FREQUENCY',
+         0x88: 'SET_CAD_PARAMS', 0x89: 'CALIBRATE', 0x8A: 'SET_PACKET_TYPE', 0x8B: 'SET_MODULATION_PARAMS',
+         0x8C: 'SET_PACKET_PARAMS', 0x8E: 'SET_TX_PARAMS', 0x8F: 'SET_BUFFER_BASE_ADDRESS', 0x93: 'SET_FALLBACK',
+         0x94: 'SET_RX_DUTY_CYCLE', 0x95: 'SET_PA_CONFIG', 0x96: 'SET_REGULATOR_MODE', 0x97: 'SET_DIO3_TCXO',
+         0x98: 'CALIBRATE_IMAGE', 0x9D: 'SET_DIO2_RF_SWITCH', 0xC5: 'SET_CAD', 0x08: 'SET_DIO_IRQ_PARAMS',
+         0x02: 'CLEAR_IRQ_STATUS', 0x07: 'CLEAR_DEVICE_ERRORS', 0x0D: 'WRITE_REGISTER', 0x0E: 'WRITE_BUFFER',
+         0x1D: 'READ_REGISTER', 0x1E: 'READ_BUFFER', 0x10: 'GET_STATS', 0x11: 'GET_PACKET_TYPE',
+         0x12: 'GET_IRQ_STATUS', 0x13: 'GET_RX_BUFFER_STATUS', 0x14: 'GET_PACKET_STATUS', 0x15: 'GET_RSSI_INST',
+         0x17: 'GET_DEVICE_ERRORS', 0xC0: 'GET_STATUS'}
+
+class SX126XEmulator:
+    def __init__(self, spi_bus=1, cs=3, irq=20, rst=15, busy=2):
+        self.irq_pin = irq
+        machine.SPI.devices[spi_bus] = self
+        machine.Pin.writers[cs] = self._cs
+        machine.Pin.readers[irq] = self._dio1
+        machine.Pin.readers[busy] = self._busy
+
+        self.registers = bytearray(0x1000)
+        self.buffer = bytearray(256)
+        self.mode = STATUS_MODE_STDBY_RC
+        self.packet_type = 0x01
+        self.irq = 0
+        self.irq_mask = 0
+        self.dio1_mask = 0
+        self.rx_len = 0
+        self.packet_status = bytes(3)
+        self.frequency = 0
+        self.modulation = b''
+        self.packet_params = b''
+        self.cad_busy = False
+        self.cad_symbols = 8
+        self.cads = 0
+        self._cad_end = None
+        #us BUSY stays high after every command, off unless a bench models it
+        self.busy_us = 0
+        self._busy_end = None
+
+        self.transactions = 0
+        self.bytes = 0
+        self.commands = {}
+        self.trace = None
+        self._frame = None
+        self._reply = b''
+        self._pending = False
+        self._last_dio1 = 0
+
+    def reset_counters(self):
+        self.transactions = 0
+        self.bytes = 0
+        self.commands = {}
+
+    def _status(self):
+        return self.mode | 0x02
+
+    def _cs(self, level):
+        if level == 0:
+            self._frame = bytearray()
+            self._reply = b''
+            return
+        frame = self._frame
+        self._frame = None
+        if not frame:
+            return
+        self.transactions += 1
+        self.bytes += len(frame)
+        op = frame[0]
+        self.commands[op] = self.commands.get(op, 0) + 1
+        if self.trace is not None:
+            self.trace.append(bytes(frame))
+        if op not in READS:
+            self._apply(op, frame[1:])
+        if self.busy_us:
+            self._busy_end = time.ticks_add(time.ticks_us(), self.busy_us)
+        self._update_dio1()
+
+    def _busy(self):
+        if self._busy_end is None:
+            return 0
+        if time.ticks_diff(self._busy_end, time.ticks_us()) > 0:
+            return 1
+        self._busy_end = None
+        return 0
+
+    def exchange(self, b):
+        frame = self._frame
+        idx = len(frame)
+        frame.append(b)
+        if idx == 0 or frame[0] not in READS:
+            return self._status()
+        hdr = READS[frame[0]]
+        if idx <= hdr:
+            if idx == hdr:
+                self._reply = self._read(frame[0], frame[1:hdr])
+            return self._status()
+        i = idx - hdr - 1
+        if i < len(self._reply):
+            return self._reply[i]
+        return 0
+
+    def _read(self, op, args):
+        if op == 0x1D:
+            addr = (args[0] << 8) | args[1]
+            return bytes(self.registers[addr:addr + 64])
+        if op == 0x1E:
+            return bytes(self.buffer[args[0]:])
+        if op == 0x11:
+            return bytes([self.packet_type])
+        if op == 0x12:
+            self._poll()
+            return bytes([self.irq >> 8, self.irq & 0xFF])
+        if op == 0x13:
+            return bytes([self.rx_len, 0])
+        if op == 0x14:
+            return self.packet_status
+        if op == 0x15:
+            return bytes([0xB4])
+        if op == 0xC0:
+            return bytes([self._status()])
+        return bytes(6)
+
+    def _apply(self, op, args):
+        if op == 0x80:
+            self.mode = STATUS_MODE_STDBY_RC
+        elif op == 0x82 or op == 0x94:
+            self.mode = STATUS_MODE_RX
+        elif op == 0x83:
+            self.mode = STATUS_MODE_STDBY_RC
+            self._raise(IRQ_TX_DONE)
+        elif op == 0xC5:
+            #CAD_DONE comes after the CAD duration on the host clock
+            self.mode = STATUS_MODE_RX
+            self.cads += 1
+            self._cad_end = time.ticks_add(time.ticks_us(), self.cad_time_us())
+        elif op == 0x88:
+            self.cad_symbols = 1 << args[0]
+        elif op == 0x8A:
+            self.packet_type = args[0]
+        elif op == 0x08:
+            self.irq_mask = (args[0] << 8) | args[1]
+            self.dio1_mask = (args[2] << 8) | args[3]
+        elif op == 0x02:
+            self.irq &= ~((args[0] << 8) | args[1])
+        elif op == 0x0D:
+            addr = (args[0] << 8) | args[1]
+            self.registers[addr:addr + len(args) - 2] = args[2:]
+        elif op == 0x0E:
+            self.buffer[args[0]:args[0] + len(args) - 1] = args[1:]
+        elif op == 0x86:
+            self.frequency = (args[0] << 24) | (args[1] << 16) | (args[2] << 8) | args[3]
+        elif op == 0x8B:
+            self.modulation = bytes(args)
+        elif op == 0x8C:
+            self.packet_params = bytes(args)
+
+    #detection symbols plus one to process them, like the driver's estimate
+    def cad_time_us(self):
+        sf = self.modulation[0] if self.modulation else 7
+        bw = LORA_BW_KHZ.get(self.modulation[1], 125.0) if self.modulation else 125.0
+        return int((self.cad_symbols + 1) * (1000 << sf) / bw)
+
+    def _poll(self):
+        if self._cad_end is not None and time.ticks_diff(time.ticks_us(), self._cad_end) >= 0:
+            self._cad_end = None
+            self.mode = STATUS_MODE_STDBY_RC
+            self._raise(IRQ_CAD_DONE | (IRQ_CAD_DETECTED if self.cad_busy else 0))
+            self._update_dio1()
+
+    def _raise(self, flags):
+        self.irq |= flags & (self.irq_mask | IRQ_CRC_ERR | IRQ_HEADER_ERR)
+
+    def _dio1(self):
+        self._poll()
+        return 1 if self.irq & self.dio1_mask else 0
+
+    def _update_dio1(self):
+        level = self._dio1()
+        if level and not self._last_dio1:
+            self._pending = True
+        self._last_dio1 = level
+
+    #puts a frame in the RX buffer and raises RX_DONE, like the radio finishing a reception
+    def receive(self, payload, rssi=-80, snr=7.0, crc_ok=True):
+        self.buffer[0:len(payload)] = payload
+        self.rx_len = len(payload)
+        s = int(snr * 4) & 0xFF
+        r = min(255, int(-rssi * 2))
+        #LoRa RssiPkt, SnrPkt, SignalRssiPkt, GFSK RxStatus, RssiSync, RssiAvg
+        self.packet_status = bytes([0, r, r] if self.packet_type == 0x00 else [r, s, r])
+        self._raise(IRQ_RX_DONE | (0 if crc_ok else IRQ_CRC_ERR))
+        self._update_dio1()
+
+    #preamble and header of a frame seen, the payload is still on air
+    def rx_start(self):
+        self._raise(IRQ_PREAMBLE_DETECTED | IRQ_HEADER_VALID)
+        self._update_dio1()
+
+    def header_error(self):
+        self._raise(IRQ_HEADER_ERR)
+        self._update_dio1()
+
+    #runs the DIO1 handler like MicroPython's scheduler would, returns True if it ran
+    def service(self):
+        if not self._pending:
+            return False
+        self._pending = False
+        handler = machine.Pin.handlers.get(self.irq_pin)
+        if handler:
+            handler(machine.Pin(self.irq_pin))
+        return True
+
+    def report(self):
+        rows = sorted(self.commands.items(), key=lambda kv: -kv[1])
+        return ', '.join('{} {}'.format(NAMES.get(op, hex(op)), n) for op, n in rows)
@@ -0,0 +1,131 @@
+import struct
+import time
+import ubinascii
+import ujson
+
+CAPTURE_MAGIC = b'PGWC'
+CAPTURE_VERSION = const(1)
+#lines of a capture sent over the USB serial console start with this, the rest is base64
+SERIAL_TAG = 'PGWC:'
+
+REC_CONFIG = const(1)
+REC_RX = const(2)
+REC_UDP_OUT = const(3)
+REC_UDP_IN = const(4)
+
+#every record: type, ticks_us when it happened and the body length
+_REC = '<BIH'
+_REC_LEN = const(7)
+#RX body: tmst latched at the interrupt, driver status, RSSI and SNR in quarter dB, 1 for FSK,
+#then the frame
+_RX = '<IhhhB'
+_RX_LEN = const(11)
+#UDP body: index of the upstream, then the datagram
+_UDP = '<B'
+
+class Capture:
+    """
+    Records what the gateway saw into a compact binary log: the radio
+    settings, every frame received with its latched timestamp, RSSI, SNR
+    and driver status, and every datagram to and from the servers. Records
+    are queued where they happen, the RX interrupt included, and written out
+    by the UDP loop: to a file on flash, or with path None as tagged base64
+    lines on the USB serial console. Records that find the queue full or the
+    file at max_bytes are dropped and counted.
+    """
+
+    def __init__(self, path=None, max_pending=32, max_bytes=262144):
+        self.path = path
+        self.max_pending = max_pending
+        self.max_bytes = max_bytes
+        self._pending = []
+        self._file = None
+        self.written = 0
+        self.records = 0
+        self.dropped = 0
+        if path is not None:
+            self._file = open(path, 'wb')
+        self._emit(CAPTURE_MAGIC + bytes([CAPTURE_VERSION]))
+
+    #radio is a dict of GatewayConfig constructor arguments, gateway one of the PicoGateway
+    #arguments that change what gets forwarded
+    def config(self, radio, gateway):
+        self._queue(REC_CONFIG, ujson.dumps({'radio': radio, 'gateway': gateway}))
+
+    #snr is None for FSK frames
+    def rx(self, tmst, err, rssi, snr, frame):
+        fsk = snr is None
+        self._queue(REC_RX, struct.pack(_RX, tmst & 0xFFFFFFFF, err, int(rssi * 4), 0 if fsk else int(snr * 4),
+                                        1 if fsk else 0) + frame)
+
+    #kind is REC_UDP_OUT or REC_UDP_IN
+    def udp(self, kind, index, datagram):
+        self._queue(kind, struct.pack(_UDP, index) + datagram)
+
+    def _queue(self, kind, body):
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        if isinstance(body, str):
+            body = body.encode()
+        self._pending.append(struct.pack(_REC, kind, time.ticks_us(), len(body)) + body)
+
+    #writes the queued records, from the UDP loop
+    def flush(self):
+        while self._pending:
+            rec = self._pending.pop(0)
+            if self._file is not None and self.written + len(rec) > self.max_bytes:
+                self.dropped += 1
+                continue
+            self._emit(rec)
+            self.records += 1
+        if self._file is not None:
+            self._file.flush()
+
+    def _emit(self, data):
+        if self._file is not None:
+            self._file.write(data)
+        else:
+            print(SERIAL_TAG + ubinascii.b2a_base64(data)[:-1].decode())
+        self.written += len(data)
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+#records of a capture as (type, ticks_us, body), from the binary log or from a serial console
+#log with the capture lines mixed into other output
+def read_capture(data):
+    if data[:len(CAPTURE_MAGIC)] != CAPTURE_MAGIC or data.startswith(SERIAL_TAG.encode()):
+        parts = []
+        for line in data.split(b'\n'):
+            i = line.find(SERIAL_TAG.encode())
+            if i >= 0:
+                parts.append(ubinascii.a2b_base64(line[i + len(SERIAL_TAG):].strip()))
+        data = b''.join(parts)
+        if data[:len(CAPTURE_MAGIC)] != CAPTURE_MAGIC:
+            raise ValueError('not a capture')
+    if data[len(CAPTURE_MAGIC)] != CAPTURE_VERSION:
+        raise ValueError('capture version {} not supported'.format(data[len(CAPTURE_MAGIC)]))
+    records = []
+    i = len(CAPTURE_MAGIC) + 1
+    while i + _REC_LEN <= len(data):
+        kind, t, n = struct.unpack_from(_REC, data, i)
+        i += _REC_LEN
+        #a capture cut off mid record ends there
+        if i + n > len(data):
+            break
+        records.append((kind, t, data[i:i + n]))
+        i += n
+    return records
+
+#RX record body -> (tmst, err, rssi, snr, frame), snr None for FSK
+def parse_rx(body):
+    tmst, err, rssi, snr, fsk = struct.unpack_from(_RX, body)
+    return tmst, err, rssi / 4, None if fsk else snr / 4, body[_RX_LEN:]
+
+#UDP record body -> (upstream index, datagram)
+def parse_udp(body):
+    return body[0], body[1:]
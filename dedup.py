@@ -0,0 +1,109 @@
+import time
+from array import array
+
+#confirmed uplinks are retransmitted at least RX2 delay + ACK_TIMEOUT (3s) later
+#and the network server must see those to send the ACK again, stay below that
+DEDUP_WINDOW_MS = const(2000)
+
+_EMPTY = const(0)
+
+#30 bit hash of DevAddr (or the first EUI bytes for joins), FCnt and MIC, stays a small int
+def frame_hash(frame):
+    n = len(frame)
+    if n < 9:
+        return -1
+    h = frame[1] | (frame[2] << 8) | (frame[3] << 16) | ((frame[4] & 0x3F) << 24)
+    h ^= (frame[6] | (frame[7] << 8)) << 7
+    h ^= frame[n - 4] | (frame[n - 3] << 8) | (frame[n - 2] << 16) | ((frame[n - 1] & 0x3F) << 24)
+    h ^= (frame[0] ^ n) << 22
+    return h & 0x3FFFFFFF
+
+class DedupCache:
+    """
+    Remembers the last capacity frames seen within window_ms. Hashes live in a
+    ring in arrival order, an open addressed index twice the ring size maps a
+    hash to its ring slot (stored +1, 0 is empty). The oldest ring slot is
+    recycled on insert so memory use is fixed.
+    """
+
+    def __init__(self, capacity=64, window_ms=DEDUP_WINDOW_MS):
+        n = 1
+        while n < capacity:
+            n <<= 1
+        self.capacity = n
+        self.window_ms = window_ms
+        self._keys = array('l', [-1] * n)
+        self._time = array('L', [0] * n)
+        self._head = 0
+        self._index = array('H', [_EMPTY] * (2 * n))
+        self._imask = 2 * n - 1
+        self.lookups = 0
+        self.hits = 0
+
+    #True if the frame was already seen within the window, otherwise remembers it
+    def seen(self, frame, now=None):
+        key = frame_hash(frame)
+        if key < 0:
+            return False
+        if now is None:
+            now = time.ticks_ms()
+        self.lookups += 1
+        i = self._find(key)
+        if i >= 0:
+            slot = self._index[i] - 1
+            if time.ticks_diff(now, self._time[slot]) <= self.window_ms:
+                self.hits += 1
+                return True
+            self._time[slot] = now
+            return False
+        self._insert(key, now)
+        return False
+
+    def hit_rate(self):
+        if self.lookups == 0:
+            return 0.0
+        return self.hits / self.lookups
+
+    def _find(self, key):
+        index = self._index
+        mask = self._imask
+        i = key & mask
+        while True:
+            slot = index[i]
+            if slot == _EMPTY:
+                return -1
+            if self._keys[slot - 1] == key:
+                return i
+            i = (i + 1) & mask
+
+    def _insert(self, key, now):
+        slot = self._head
+        self._head = (slot + 1) & (self.capacity - 1)
+        old = self._keys[slot]
+        if old >= 0:
+            self._unlink(self._find(old))
+        self._keys[slot] = key
+        self._time[slot] = now
+        index = self._index
+        mask = self._imask
+        i = key & mask
+        while index[i] != _EMPTY:
+            i = (i + 1) & mask
+        index[i] = slot + 1
+
+    def _unlink(self, i):
+        #backward shift deletion keeps the probe sequences intact
+        index = self._index
+        mask = self._imask
+        index[i] = _EMPTY
+        j = i
+        while True:
+            j = (j + 1) & mask
+            slot = index[j]
+            if slot == _EMPTY:
+                return
+            home = self._keys[slot - 1] & mask
+            if (j > i and (home <= i or home > j)) or (j < i and (home <= i and home > j)):
+                index[i] = slot
+                index[j] = _EMPTY
+                i = j
@@ -0,0 +1,101 @@
+import time
+from array import array
+
+#most airtime a sub-band's budget banks, in us of refill: a tenth of the hour ETSI
+#EN 300 220 accounts over, enough for a multicast burst to go out back to back
+DUTY_BURST_US = const(360000000)
+
+class DownlinkQueue:
+    """
+    Class C downlinks waiting for the radio. Entries sit in a fixed ring in
+    arrival order and go out one at a time: the next one leaves when the
+    previous TX is done, a listen gap has passed and the airtime budget of its
+    sub-band covers it. subbands is a list of (from MHz, to MHz, duty cycle),
+    each has a token bucket of airtime in us refilled at its duty cycle rate,
+    starting full with DUTY_BURST_US worth of refill so a burst goes out back
+    to back, after that the queue paces to the duty cycle.
+    """
+
+    def __init__(self, capacity=16, subbands=((0.0, 10000.0, 0.01),), gap_us=0):
+        self.capacity = capacity
+        self._ring = [None] * capacity
+        self._head = 0
+        self._len = 0
+        self.subbands = subbands
+        self.gap_us = gap_us
+        self.budget_max = array('l', [int(duty * DUTY_BURST_US) for lo, hi, duty in subbands])
+        self.budget = array('l', self.budget_max)
+        #frequencies between sub-bands are held to the strictest one
+        self._strict = 0
+        for i in range(len(subbands)):
+            if subbands[i][2] < subbands[self._strict][2]:
+                self._strict = i
+        self._refilled = time.ticks_us()
+        self.busy = False
+        #nothing leaves for hold us after since, covers a TX in flight plus the gap
+        self._since = self._refilled
+        self._hold = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self._len
+
+    #index of the sub-band freq in MHz is charged to
+    def band(self, freq):
+        for i in range(len(self.subbands)):
+            if self.subbands[i][0] <= freq <= self.subbands[i][1]:
+                return i
+        return self._strict
+
+    #False when the ring is full, the entry is dropped
+    def put(self, payload, profile, airtime, now, band=0):
+        if self._len == self.capacity:
+            self.dropped += 1
+            return False
+        self._ring[(self._head + self._len) % self.capacity] = (payload, profile, airtime, now, band)
+        self._len += 1
+        return True
+
+    #oldest entry if it may go out at now, else None. Call it regularly even when
+    #empty, ticks wrap and the budgets and hold are kept current here
+    def next(self, now):
+        self._refill(now)
+        if self._hold:
+            if time.ticks_diff(now, self._since) < self._hold:
+                return None
+            self._hold = 0
+        if self._len == 0:
+            return None
+        entry = self._ring[self._head]
+        band = entry[4]
+        #a frame longer than the whole budget goes out once the bucket is full
+        if entry[2] > self.budget[band] and self.budget[band] < self.budget_max[band]:
+            return None
+        return entry
+
+    def pop(self):
+        self._ring[self._head] = None
+        self._head = (self._head + 1) % self.capacity
+        self._len -= 1
+
+    #a TX of airtime us starts at now in band, class A downlinks are charged too so they
+    #hold class C of their sub-band back
+    def start(self, airtime, now, band=0):
+        self._refill(now)
+        self.budget[band] -= airtime
+        self.busy = True
+        #in case TX_DONE goes missing the queue moves on once the airtime is over
+        self._since = now
+        self._hold = airtime + self.gap_us
+
+    def done(self, now):
+        self.busy = False
+        self._since = now
+        self._hold = self.gap_us
+
+    def _refill(self, now):
+        dt = time.ticks_diff(now, self._refilled)
+        if dt >= 100:
+            for i in range(len(self.budget)):
+                self.budget[i] = min(self.budget_max[i], self.budget[i] + int(dt * self.subbands[i][2]))
+            self._refilled = now
@@ -0,0 +1,115 @@
+import time
+
+#SX1262 supply current in mA, datasheet typicals at 3.3 V with the DC-DC regulator and with
+#the LDO: sleep with the RTC kept for duty cycled RX, standby on the crystal, RX
+SLEEP_MA = (0.0012, 0.0012)
+STDBY_MA = (0.8, 1.5)
+RX_MA = (4.6, 8.8)
+#TX at the HP PA's optimal settings per output power, below +14 dBm its figure is an upper bound
+TX_MA = ((22, 118.0), (20, 102.0), (17, 90.0), (14, 45.0))
+
+STATE_SLEEP = const(0)
+STATE_STDBY = const(1)
+STATE_RX = const(2)
+STATE_TX = const(3)
+
+def tx_ma(power):
+    for p, ma in TX_MA:
+        if power >= p:
+            return ma
+    return TX_MA[-1][1]
+
+class EnergyModel:
+    """
+    Radio supply current estimated from the time the chip spends in each
+    state. The gateway reports when the radio goes listening and when it
+    transmits. A duty cycled listen is split by its wake and sleep periods
+    into RX, the TCXO and standby transition before each window, and sleep;
+    a frame received keeps the radio in RX for its airtime. Ticks wrap, it
+    has to be read every few minutes at least, the stat packet does.
+    """
+
+    def __init__(self, ldo=False, wake_us=0, sleep_us=0, tcxo_us=0, now=None):
+        self._col = 1 if ldo else 0
+        self.set_duty(wake_us, sleep_us, tcxo_us)
+        self._since = time.ticks_us() if now is None else now
+        self._tx_ma = 0.0
+        #us per state, listen time still unsplit, and the airtime of frames received meanwhile
+        self._listen_us = 0
+        self._frames_us = 0
+        self._stdby_us = 0
+        self._tx_us = 0
+        #charge of the TX time so far in mA us, the current depends on the power of each TX
+        self._tx_charge = 0.0
+        self._state = STATE_RX
+
+    #wake and sleep us of the RX duty cycle, 0 for continuous RX. sleep_us includes
+    #the tcxo_us plus 1 ms the radio needs to get back to RX
+    def set_duty(self, wake_us, sleep_us, tcxo_us=0):
+        self.wake_us = wake_us
+        self.sleep_us = sleep_us
+        self.transition_us = tcxo_us + 1000 if sleep_us else 0
+
+    def _close(self, now):
+        dt = time.ticks_diff(now, self._since)
+        self._since = now
+        if self._state == STATE_RX:
+            self._listen_us += dt
+        elif self._state == STATE_TX:
+            self._tx_us += dt
+            self._tx_charge += dt * self._tx_ma
+        else:
+            self._stdby_us += dt
+
+    def listen(self, now):
+        self._close(now)
+        self._state = STATE_RX
+
+    def standby(self, now):
+        self._close(now)
+        self._state = STATE_STDBY
+
+    def transmit(self, power, now):
+        self._close(now)
+        self._state = STATE_TX
+        self._tx_ma = tx_ma(power)
+
+    #a frame of airtime us came in while listening
+    def frame(self, airtime):
+        self._frames_us += airtime
+
+    #us in sleep, standby, RX and TX so far
+    def residency(self, now):
+        self._close(now)
+        listen = self._listen_us
+        rx = listen
+        sleep = 0
+        stdby = self._stdby_us
+        period = self.wake_us + self.sleep_us
+        if self.sleep_us and listen > self._frames_us:
+            idle = listen - self._frames_us
+            sleep = idle * (self.sleep_us - self.transition_us) // period
+            stdby += idle * self.transition_us // period
+            rx = listen - sleep - (idle * self.transition_us // period)
+        return [sleep, stdby, rx, self._tx_us]
+
+    #charge drawn so far in mAh
+    def charge_mah(self, now):
+        sleep, stdby, rx, tx = self.residency(now)
+        col = self._col
+        charge = sleep * SLEEP_MA[col] + stdby * STDBY_MA[col] + rx * RX_MA[col] + self._tx_charge
+        return charge / 3600000000
+
+    #charge a radio listening continuously instead would have drawn, in mAh
+    def continuous_mah(self, now):
+        self._close(now)
+        col = self._col
+        charge = self._stdby_us * STDBY_MA[col] + self._listen_us * RX_MA[col] + self._tx_charge
+        return charge / 3600000000
+
+    #average current in mA since the start
+    def average_ma(self, now):
+        us = sum(self.residency(now))
+        if us <= 0:
+            return 0.0
+        return self.charge_mah(now) * 3600000000 / us
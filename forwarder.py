@@ -0,0 +1,208 @@
+import time
+import usocket
+import uos
+import ubinascii
+import errno
+import machine
+from tokens import TokenTable
+from capture import REC_UDP_OUT, REC_UDP_IN
+
+#1 compiles in the hot path probes of probes.py, 0 leaves no trace of them
+_PROBES = const(0)
+if _PROBES:
+    from probes import PROBES, P_FRAME, P_SENDTO
+
+PROTOCOL_VERSION = const(2)
+
+PUSH_DATA = const(0)
+PULL_DATA = const(2)
+
+#consecutive failures before an upstream is backed off, and the backoff bounds
+FAIL_THRESHOLD = const(3)
+BACKOFF_MIN_MS = const(1000)
+BACKOFF_MAX_MS = const(60000)
+
+class Upstream:
+    """
+    One network server or collector: its own socket, token table and health.
+    prefixes is a list of (devaddr, bits) pairs, None forwards everything.
+    """
+
+    def __init__(self, host, port, prefixes=None, downlink=True, name=None):
+        self.host = host
+        self.port = port
+        self.name = name or host
+        self.downlink = downlink
+        self.prefixes = None
+        if prefixes:
+            self.prefixes = [(p & self._mask(b), self._mask(b)) for p, b in prefixes]
+        self.addr = None
+        self.sock = None
+        self.tokens = TokenTable()
+
+        self.sent = 0
+        self.failed = 0
+        self.filtered = 0
+        self.fails = 0
+        self.backoff_ms = 0
+        self._retry_at = 0
+        #ticks_ms of the last datagram sent, the NAT mapping was refreshed then
+        self.sent_at = time.ticks_ms()
+
+    @staticmethod
+    def _mask(bits):
+        return (0xFFFFFFFF << (32 - bits)) & 0xFFFFFFFF
+
+    def open(self, addr=None):
+        if addr is None:
+            addr = usocket.getaddrinfo(self.host, self.port)[0][-1]
+        self.addr = addr
+        self.sock = usocket.socket(usocket.AF_INET, usocket.SOCK_DGRAM)
+        self.sock.setsockopt(usocket.SOL_SOCKET, usocket.SO_REUSEADDR, 1)
+        self.sock.setblocking(False)
+
+    def close(self):
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+    def accepts(self, addr):
+        if self.prefixes is None:
+            return True
+        if addr < 0:
+            return False
+        for value, mask in self.prefixes:
+            if addr & mask == value:
+                return True
+        return False
+
+    def healthy(self, now):
+        return self.fails < FAIL_THRESHOLD or time.ticks_diff(now, self._retry_at) >= 0
+
+    #returns 0 or the errno of the failed send, never raises
+    def send(self, packet, token, kind, now):
+        if _PROBES:
+            PROBES.enter(P_SENDTO)
+        try:
+            self.sock.sendto(packet, self.addr)
+        except Exception as ex:
+            if _PROBES:
+                PROBES.exit(P_SENDTO)
+            self.failed += 1
+            self.fails += 1
+            if self.fails >= FAIL_THRESHOLD:
+                self.backoff_ms = min(max(self.backoff_ms * 2, BACKOFF_MIN_MS), BACKOFF_MAX_MS)
+                self._retry_at = time.ticks_add(now, self.backoff_ms)
+            if ex.args and isinstance(ex.args[0], int):
+                return ex.args[0]
+            return errno.EIO
+        if _PROBES:
+            PROBES.exit(P_SENDTO)
+        self.sent += 1
+        self.sent_at = now
+        self.fails = 0
+        self.backoff_ms = 0
+        #DIO1 and the timers ack into the same table
+        state = machine.disable_irq()
+        self.tokens.track(token, kind, time.ticks_us())
+        machine.enable_irq(state)
+        return 0
+
+    def state(self):
+        return {'sent': self.sent, 'fail': self.failed, 'filt': self.filtered,
+                'ackr': self.tokens.ratio(PUSH_DATA), 'up': self.fails < FAIL_THRESHOLD}
+
+class Forwarder:
+    """
+    Fans every datagram out to all upstreams. The Semtech header is kept in a
+    preallocated buffer and the datagram is built once, the same buffer is then
+    handed to every upstream socket.
+    """
+
+    def __init__(self, gateway_id, upstreams, resolver=None):
+        self.upstreams = upstreams
+        self.resolver = resolver
+        self._hdr = bytearray(12)
+        self._hdr[0] = PROTOCOL_VERSION
+        self._hdr[4:12] = ubinascii.unhexlify(gateway_id)
+        self.primary = upstreams[0]
+        #a Capture recording the datagrams sent and received, None when off
+        self.capture = None
+
+    def open(self):
+        for u in self.upstreams:
+            if self.resolver:
+                u.open(self.resolver.resolve(u.host, u.port))
+            else:
+                u.open()
+
+    #picks up addresses changed by a resolver refresh
+    def readdress(self):
+        for u in self.upstreams:
+            addr = self.resolver.cached(u.host, u.port)
+            if addr is not None:
+                u.addr = addr
+
+    def close(self):
+        for u in self.upstreams:
+            u.close()
+
+    #the buffer is shared, callers build the datagram from it with interrupts held off
+    def header(self, kind, token):
+        hdr = self._hdr
+        hdr[1] = token[0]
+        hdr[2] = token[1]
+        hdr[3] = kind
+        return hdr
+
+    #sends to every matching upstream, returns the first errno seen or 0
+    def send(self, kind, payload=b'', addr=-1, downlink_only=False):
+        if _PROBES:
+            PROBES.enter(P_FRAME)
+        token = uos.urandom(2)
+        state = machine.disable_irq()
+        packet = self.header(kind, token) + payload
+        machine.enable_irq(state)
+        if _PROBES:
+            PROBES.exit(P_FRAME)
+        now = time.ticks_ms()
+        err = 0
+        for i, u in enumerate(self.upstreams):
+            if downlink_only and not u.downlink:
+                continue
+            if not u.accepts(addr):
+                u.filtered += 1
+                continue
+            if not u.healthy(now):
+                continue
+            e = u.send(packet, token, kind, now)
+            if not e and self.capture is not None:
+                self.capture.udp(REC_UDP_OUT, i, packet)
+            if e:
+                if not err:
+                    err = e
+                if u.fails == FAIL_THRESHOLD and self.resolver:
+                    #the server may have moved, re-resolve it on the next refresh
+                    self.resolver.invalidate(u.host, u.port)
+        return err
+
+    def push(self, payload, addr=-1):
+        return self.send(PUSH_DATA, payload, addr)
+
+    def pull(self):
+        return self.send(PULL_DATA, downlink_only=True)
+
+    #reads one pending datagram from any upstream, returns (upstream, data) or (None, None)
+    def recv(self, size=1024):
+        for i, u in enumerate(self.upstreams):
+            if u.sock is None:
+                continue
+            try:
+                data = u.sock.recv(size)
+                if self.capture is not None:
+                    self.capture.udp(REC_UDP_IN, i, data)
+                return u, data
+            except OSError as ex:
+                if ex.args[0] != errno.EAGAIN and ex.args[0] != errno.ETIMEDOUT:
+                    print('UDP recv OSError Exception: ', ex)
+        return None, None
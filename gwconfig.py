@@ -0,0 +1,232 @@
+import ujson
+from _sx126x import ASSERT, SX126X_LORA_CRC_ON, SX126X_LORA_CRC_OFF, SX126X_LORA_HEADER_EXPLICIT
+from sx126x import loraTimeOnAir, fskTimeOnAir, rxDutyCyclePeriods
+
+#band limits in MHz, max EIRP in dBm, duty cycle of the band when it has no sub-bands
+PLANS = {
+    'EU868': (863.0, 870.0, 16, 0.1),
+    'US915': (902.0, 928.0, 30, 1.0),
+    'AU915': (915.0, 928.0, 30, 1.0),
+    'AS923': (915.0, 928.0, 16, 0.1),
+    'IN865': (865.0, 867.0, 30, 1.0),
+}
+#ETSI EN 300 220 sub-bands as (from MHz, to MHz, duty cycle), each with its own budget
+SUBBANDS = {
+    'EU868': ((863.0, 865.0, 0.001), (865.0, 868.0, 0.01), (868.0, 868.6, 0.01), (868.7, 869.2, 0.001),
+              (869.4, 869.65, 0.1), (869.7, 870.0, 0.01)),
+}
+
+LORA_BW = (125, 250, 500)
+
+#largest LoRaWAN PHYPayload at the slowest data rates, 59 byte MACPayload plus MHDR and MIC
+UPLINK_MAX_LEN = const(64)
+#smallest one, MHDR, FHDR without options and MIC
+UPLINK_MIN_LEN = const(12)
+
+#DUAL time slices one radio between a LoRa and an FSK listen profile
+MODEMS = ('LORA', 'FSK', 'DUAL')
+#LoRaWAN FSK PHY: 5 byte preamble, sync word C1 94 C1, variable length, CCITT CRC and whitening
+FSK_PREAMBLE_BITS = const(40)
+FSK_SYNC_WORD = [0xC1, 0x94, 0xC1]
+FSK_CRC_BYTES = const(2)
+FSK_WHITENING_SEED = const(0x01FF)
+
+#constructor arguments, all kept as attributes of the same name
+SETTINGS = ('region', 'freq', 'sf', 'bw', 'cr', 'sync_word', 'power', 'preamble', 'crc', 'current_limit',
+            'tcxo_voltage', 'ldo', 'tx_lead_us', 'duty', 'dl_queue', 'lbt', 'lbt_attempts', 'modem', 'br',
+            'fdev', 'rx_bw', 'fsk_freq', 'lora_slice_ms', 'fsk_slice_ms', 'rx_duty', 'node_preamble',
+            'rx_duty_symbols')
+
+#'SF9BW125' -> (9, 125)
+def parse_datr(datr):
+    i = datr.find('BW')
+    if datr[:2] != 'SF' or i < 0:
+        raise ValueError('bad LoRa datr {}'.format(datr))
+    return int(datr[2:i]), int(datr[i + 2:])
+
+class GatewayConfig:
+    """
+    Radio settings and channel plan of the gateway, checked once and shared by
+    PicoGateway and the SX1262 driver. Everything derived from them (rxpk
+    strings, preamble time, listen gaps) is computed here so the packet paths
+    only read attributes.
+    """
+
+    def __init__(self, region='EU868', freq=868.1, sf=12, bw=125, cr=5, sync_word=0x34, power=-5,
+                 preamble=8, crc=True, current_limit=60.0, tcxo_voltage=1.7, ldo=False, tx_lead_us=28000,
+                 duty=None, dl_queue=16, lbt=False, lbt_attempts=3, modem='LORA', br=50.0, fdev=25.0, rx_bw=117.3,
+                 fsk_freq=None, lora_slice_ms=750, fsk_slice_ms=250, rx_duty=False, node_preamble=None,
+                 rx_duty_symbols=8):
+        if region not in PLANS:
+            raise ValueError('unknown region {}'.format(region))
+        f_min, f_max, max_eirp, plan_duty = PLANS[region]
+        if not f_min <= freq <= f_max:
+            raise ValueError('freq {} outside {} band {}-{} MHz'.format(freq, region, f_min, f_max))
+        if not 7 <= sf <= 12:
+            raise ValueError('sf {} out of range 7-12'.format(sf))
+        if bw not in LORA_BW:
+            raise ValueError('bw {} not one of {}'.format(bw, LORA_BW))
+        if not 5 <= cr <= 8:
+            raise ValueError('cr {} out of range 5-8'.format(cr))
+        if power > max_eirp:
+            raise ValueError('power {} dBm above the {} limit of {} dBm'.format(power, region, max_eirp))
+        if not 0 <= sync_word <= 0xFF:
+            raise ValueError('sync_word {} is not a byte'.format(sync_word))
+        if preamble < 6:
+            raise ValueError('preamble {} shorter than 6 symbols'.format(preamble))
+        if duty is not None and not 0.0 < duty <= 1.0:
+            raise ValueError('duty {} out of range 0-1'.format(duty))
+        if dl_queue < 1:
+            raise ValueError('dl_queue {} must hold at least one downlink'.format(dl_queue))
+        if lbt_attempts < 1:
+            raise ValueError('lbt_attempts {} must be at least 1'.format(lbt_attempts))
+        if modem not in MODEMS:
+            raise ValueError('modem {} not one of {}'.format(modem, MODEMS))
+        fsk = modem == 'FSK'
+        if fsk_freq is None:
+            fsk_freq = freq
+        if modem != 'LORA':
+            if not f_min <= fsk_freq <= f_max:
+                raise ValueError('fsk_freq {} outside {} band {}-{} MHz'.format(fsk_freq, region, f_min, f_max))
+            if not 0.6 <= br <= 300.0:
+                raise ValueError('br {} kbps out of range 0.6-300'.format(br))
+            if not 0.0 < fdev <= 200.0:
+                raise ValueError('fdev {} kHz out of range 0-200'.format(fdev))
+            #Carson's rule, the receiver filter has to take both deviations plus the bit rate
+            if rx_bw < 2 * fdev + br:
+                raise ValueError('rx_bw {} kHz narrower than 2 * fdev + br'.format(rx_bw))
+            if lbt:
+                raise ValueError('lbt needs LoRa CAD, not available with FSK')
+        if rx_duty and modem != 'LORA':
+            raise ValueError('rx_duty sizes its windows in LoRa symbols, not available with {}'.format(modem))
+        if node_preamble is None:
+            node_preamble = preamble
+        if lora_slice_ms <= 0 or fsk_slice_ms <= 0:
+            raise ValueError('slices {}/{} ms must be positive'.format(lora_slice_ms, fsk_slice_ms))
+
+        self.region = region
+        self.freq = freq
+        self.sf = sf
+        self.bw = bw
+        self.cr = cr
+        self.sync_word = sync_word
+        self.power = power
+        self.preamble = preamble
+        self.crc = crc
+        self.current_limit = current_limit
+        self.tcxo_voltage = tcxo_voltage
+        self.ldo = ldo
+        self.tx_lead_us = tx_lead_us
+        self.f_min = f_min
+        self.f_max = f_max
+        self.max_eirp = max_eirp
+        #downlink duty cycle per sub-band, duty puts one over the whole band instead
+        self.duty = duty
+        if duty is not None:
+            self.subbands = ((f_min, f_max, duty),)
+        else:
+            self.subbands = SUBBANDS.get(region, ((f_min, f_max, plan_duty),))
+        self.dl_queue = dl_queue
+        #listen before talk, timed downlinks start lbt_attempts CAD durations early
+        self.lbt = lbt
+        self.lbt_attempts = lbt_attempts
+        #FSK listens with br kbps, fdev kHz deviation and rx_bw kHz filter instead of sf/bw/cr
+        self.modem = modem
+        self.br = br
+        self.fdev = fdev
+        self.rx_bw = rx_bw
+        self.fsk_freq = fsk_freq
+        self.lora_slice_ms = lora_slice_ms
+        self.fsk_slice_ms = fsk_slice_ms
+        #duty cycled RX, windows sized so a node preamble of node_preamble symbols has
+        #rx_duty_symbols of it in one of them wherever it starts
+        self.rx_duty = rx_duty
+        self.node_preamble = node_preamble
+        self.rx_duty_symbols = rx_duty_symbols
+        #the driver's TCXO start delay, part of every wake up
+        self.tcxo_delay_us = 5000 if tcxo_voltage > 0.0 else 0
+        self.rx_wake_us = self.rx_sleep_us = 0
+        if rx_duty:
+            periods = rxDutyCyclePeriods(node_preamble, rx_duty_symbols, sf, bw, self.tcxo_delay_us)
+            if periods is None:
+                raise ValueError('node_preamble {} too short to sleep between RX windows at SF{}'.format(node_preamble, sf))
+            self.rx_wake_us, self.rx_sleep_us = periods
+
+        #rxpk/txpk fields, FSK datr is the bit rate in bit/s
+        self.fsk_datr = int(br * 1000)
+        self.datr = self.fsk_datr if fsk else 'SF{}BW{}'.format(sf, bw)
+        self.codr = '4/{}'.format(cr)
+        self.fsk_preamble_us = int((FSK_PREAMBLE_BITS + 8 * len(FSK_SYNC_WORD)) * 1000 / br)
+        symbol_us = ((1 << sf) * 1000) // bw
+        if fsk:
+            self.preamble_us = self.fsk_preamble_us
+        else:
+            #preamble plus sync word, the earliest a receiver can lock on the frame
+            self.preamble_us = (preamble * 4 + 17) * symbol_us // 4
+        #class C downlinks wait at most this long for an uplink in progress, then a
+        #preamble detection without a frame is taken as stale
+        self.rx_hold_us = self.uplink_air_us(UPLINK_MAX_LEN)
+        self.fsk_hold_us = self.uplink_air_us(UPLINK_MAX_LEN, True)
+        #the shortest uplink, how fast frames can follow each other
+        self.rx_min_air_us = self.uplink_air_us(UPLINK_MIN_LEN)
+        if modem == 'DUAL':
+            self.rx_min_air_us = min(self.rx_min_air_us, self.uplink_air_us(UPLINK_MIN_LEN, True))
+            #a slice has to last at least a preamble to catch anything
+            if lora_slice_ms * 1000 <= self.preamble_us or fsk_slice_ms * 1000 <= self.fsk_preamble_us:
+                raise ValueError('slices {}/{} ms shorter than a preamble'.format(lora_slice_ms, fsk_slice_ms))
+        #listen gap between two class C downlinks, long enough to detect an uplink preamble
+        self.dl_gap_us = self.preamble_us if fsk else 4 * symbol_us
+
+    #airtime in us of an uplink of len_ bytes at the LoRa or FSK RX settings, the listen modem's by default
+    def uplink_air_us(self, len_, fsk=None):
+        if fsk is None:
+            fsk = self.modem == 'FSK'
+        if fsk:
+            return fskTimeOnAir(len_, self.br, FSK_PREAMBLE_BITS, 8 * len(FSK_SYNC_WORD),
+                                FSK_CRC_BYTES if self.crc else 0)
+        return loraTimeOnAir(len_, self.sf, self.bw, self.cr, self.preamble,
+                             SX126X_LORA_CRC_ON if self.crc else SX126X_LORA_CRC_OFF, SX126X_LORA_HEADER_EXPLICIT)
+
+    #constructor arguments that give this configuration back, GatewayConfig(**settings())
+    def settings(self):
+        return {name: getattr(self, name) for name in SETTINGS}
+
+    #reads a JSON object with the constructor arguments, missing keys keep their default
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(**ujson.loads(f.read()))
+
+    def begin_args(self):
+        return {'freq': self.freq, 'bw': float(self.bw), 'sf': self.sf, 'cr': self.cr, 'syncWord': self.sync_word,
+                'power': self.power, 'currentLimit': self.current_limit, 'preambleLength': self.preamble,
+                'implicit': False, 'implicitLen': 0xFF, 'crcOn': self.crc, 'txIq': True, 'rxIq': False,
+                'tcxoVoltage': self.tcxo_voltage, 'useRegulatorLDO': self.ldo, 'blocking': True}
+
+    def begin_fsk_args(self):
+        return {'freq': self.fsk_freq, 'br': self.br, 'freqDev': self.fdev, 'rxBw': self.rx_bw, 'power': self.power,
+                'currentLimit': self.current_limit, 'preambleLength': FSK_PREAMBLE_BITS, 'dataShaping': 0.5,
+                'syncWord': FSK_SYNC_WORD, 'syncBitsLength': 8 * len(FSK_SYNC_WORD),
+                'crcLength': FSK_CRC_BYTES if self.crc else 0, 'crcInitial': 0x1D0F, 'crcPolynomial': 0x1021,
+                'crcInverted': True, 'whiteningOn': True, 'whiteningInitial': FSK_WHITENING_SEED,
+                'fixedPacketLength': False, 'packetLength': 0xFF, 'tcxoVoltage': self.tcxo_voltage,
+                'useRegulatorLDO': self.ldo, 'blocking': True}
+
+    #configures the radio, raises like SX1262.begin on a driver error. DUAL keeps both
+    #setups as named profiles, 'LORA' and 'FSK', and is left listening to LoRa
+    def configure(self, lora):
+        if self.modem == 'FSK':
+            return lora.beginFSK(**self.begin_fsk_args())
+        if self.modem == 'DUAL':
+            lora.beginFSK(**self.begin_fsk_args())
+            ASSERT(lora.saveProfile('FSK'))
+            state = lora.begin(**self.begin_args())
+            ASSERT(lora.saveProfile('LORA'))
+            #begin() reset the chip, the FSK registers go back in once so both modems find theirs
+            ASSERT(lora.loadProfile('FSK'))
+            ASSERT(lora.loadProfile('LORA'))
+            return state
+        state = lora.begin(**self.begin_args())
+        if self.rx_duty:
+            ASSERT(lora.setRxDutyCycle(self.node_preamble, self.rx_duty_symbols))
+        return state
@@ -0,0 +1,77 @@
+import time
+
+KEEPALIVE_MIN_MS = const(5000)
+KEEPALIVE_MAX_MS = const(120000)
+KEEPALIVE_START_MS = const(25000)
+#how long a downlink keeps the interval tight
+ACTIVE_HOLD_MS = const(120000)
+
+class Keepalive:
+    """
+    Adaptive PULL_DATA interval. A PULL_ACK only shows the server answered, the
+    PULL_DATA it answers refreshed the NAT mapping itself, so acks never take the
+    interval past start_ms. What shows the mapping outlives a longer gap is a
+    downlink coming in after the gateway sent nothing for that long: when idle the
+    interval backs off by 1/8 per keepalive up to the longest such gap, within
+    max_ms. A missed PULL_ACK halves the interval and drops that evidence if the
+    interval was past start_ms, a downlink holds it at the minimum for ACTIVE_HOLD_MS.
+    """
+
+    def __init__(self, min_ms=KEEPALIVE_MIN_MS, max_ms=KEEPALIVE_MAX_MS, start_ms=KEEPALIVE_START_MS):
+        if min_ms <= 0 or max_ms < min_ms:
+            raise ValueError('invalid keepalive bounds')
+        self.min_ms = min_ms
+        self.max_ms = max_ms
+        self.start_ms = min(max(start_ms, min_ms), max_ms)
+        self.interval = self.start_ms
+        #longest gap without sending that a downlink still came in after
+        self.idle_ok_ms = 0
+        self._active_until = None
+        self._lost_at = None
+
+    def ceiling(self):
+        return min(self.max_ms, max(self.start_ms, self.idle_ok_ms))
+
+    def active(self, now=None):
+        if self._active_until is None:
+            return False
+        if now is None:
+            now = time.ticks_ms()
+        if time.ticks_diff(self._active_until, now) > 0:
+            return True
+        self._active_until = None
+        return False
+
+    #a PULL_ACK matched, returns the time since the first missed PULL_ACK in ms or -1.
+    #That is packet loss as much as a NAT rebind, both cut downlinks off meanwhile
+    def on_ack(self, now=None):
+        if now is None:
+            now = time.ticks_ms()
+        recovered = -1
+        if self._lost_at is not None:
+            recovered = time.ticks_diff(now, self._lost_at)
+            self._lost_at = None
+        if self.active(now):
+            self.interval = self.min_ms
+        else:
+            self.interval = min(self.interval + self.interval // 8, self.ceiling())
+        return recovered
+
+    def on_miss(self, now=None):
+        if now is None:
+            now = time.ticks_ms()
+        if self._lost_at is None:
+            self._lost_at = now
+        if self.interval > self.start_ms:
+            #the longer interval may be what lost the mapping
+            self.idle_ok_ms = 0
+        self.interval = max(self.min_ms, self.interval // 2)
+
+    #a PULL_RESP came in idle_ms after the gateway last sent to the server
+    def on_downlink(self, idle_ms=0, now=None):
+        if now is None:
+            now = time.ticks_ms()
+        if idle_ms > self.idle_ok_ms:
+            self.idle_ok_ms = idle_ms
+        self._active_until = time.ticks_add(now, ACTIVE_HOLD_MS)
+        self.interval = self.min_ms
@@ -8,15 +8,34 @@ if implementation.name == 'circuitpython':
     def sleep_ms(ms):
         sleep(ms/1000)
 
+#status names are only needed for logging, the table is imported on the first lookup
+class _ErrorNames:
+    def __getitem__(self, state):
+        from sx126x_errors import ERROR
+        return ERROR[state]
+
+    def get(self, state, default=None):
+        from sx126x_errors import ERROR
+        return ERROR.get(state, default)
+
+ERROR = _ErrorNames()
+
+#carries the numeric status so callers don't have to map the message back to a code
+class SX126XError(AssertionError):
+    def __init__(self, state):
+        super().__init__(ERROR.get(state, state))
+        self.state = state
+
 def ASSERT(state):
-    assert state == ERR_NONE, ERROR[state]
+    if state != ERR_NONE:
+        raise SX126XError(state)
 
 def yield_():
     sleep_ms(1)
 
 SX126X_FREQUENCY_STEP_SIZE = 0.9536743164
 SX126X_MAX_PACKET_LENGTH = const(255)
-SX126X_CRYSTAL_FREQ = 32.0
+SX126X_CRYSTAL_FREQ = const(32)
 SX126X_DIV_EXPONENT = const(25)
 SX126X_CMD_NOP = const(0x00)
 SX126X_CMD_SET_SLEEP = const(0x84)
@@ -296,6 +315,7 @@ ERR_WRONG_MODEM = const(-20)
 ERR_INVALID_NUM_SAMPLES = const(-21)
 ERR_INVALID_RSSI_OFFSET = const(-22)
 ERR_INVALID_ENCODING = const(-23)
+ERR_LORA_HEADER_DAMAGED = const(-24)
 ERR_INVALID_BIT_RATE = const(-101)
 ERR_INVALID_FREQUENCY_DEVIATION = const(-102)
 ERR_INVALID_BIT_RATE_BW_RATIO = const(-103)
@@ -340,74 +360,3 @@ ERR_INVALID_NUM_REPEATERS = const(-802)
 ERR_INVALID_REPEATER_CALLSIGN = const(-803)
 ERR_INVALID_PACKET_TYPE = const(-804)
 ERR_INVALID_PACKET_LENGTH = const(-805)
-
-ERROR = {
-    0: 'ERR_NONE',
-    -1: 'ERR_UNKNOWN',
-    -2: 'ERR_CHIP_NOT_FOUND',
-    -3: 'ERR_MEMORY_ALLOCATION_FAILED',
-    -4: 'ERR_PACKET_TOO_LONG',
-    -5: 'ERR_TX_TIMEOUT',
-    -6: 'ERR_RX_TIMEOUT',
-    -7: 'ERR_CRC_MISMATCH',
-    -8: 'ERR_INVALID_BANDWIDTH',
-    -9: 'ERR_INVALID_SPREADING_FACTOR',
-    -10: 'ERR_INVALID_CODING_RATE',
-    -11: 'ERR_INVALID_BIT_RANGE',
-    -12: 'ERR_INVALID_FREQUENCY',
-    -13: 'ERR_INVALID_OUTPUT_POWER',
-    -14: 'PREAMBLE_DETECTED',
-    -15: 'CHANNEL_FREE',
-    -16: 'ERR_SPI_WRITE_FAILED',
-    -17: 'ERR_INVALID_CURRENT_LIMIT',
-    -18: 'ERR_INVALID_PREAMBLE_LENGTH',
-    -19: 'ERR_INVALID_GAIN',
-    -20: 'ERR_WRONG_MODEM',
-    -21: 'ERR_INVALID_NUM_SAMPLES',
-    -22: 'ERR_INVALID_RSSI_OFFSET',
-    -23: 'ERR_INVALID_ENCODING',
-    -101: 'ERR_INVALID_BIT_RATE',
-    -102: 'ERR_INVALID_FREQUENCY_DEVIATION',
-    -103: 'ERR_INVALID_BIT_RATE_BW_RATIO',
-    -104: 'ERR_INVALID_RX_BANDWIDTH',
-    -105: 'ERR_INVALID_SYNC_WORD',
-    -106: 'ERR_INVALID_DATA_SHAPING',
-    -107: 'ERR_INVALID_MODULATION',
-    -201: 'ERR_AT_FAILED',
-    -202: 'ERR_URL_MALFORMED',
-    -203: 'ERR_RESPONSE_MALFORMED_AT',
-    -204: 'ERR_RESPONSE_MALFORMED',
-    -205: 'ERR_MQTT_CONN_VERSION_REJECTED',
-    -206: 'ERR_MQTT_CONN_ID_REJECTED',
-    -207: 'ERR_MQTT_CONN_SERVER_UNAVAILABLE',
-    -208: 'ERR_MQTT_CONN_BAD_USERNAME_PASSWORD',
-    -208: 'ERR_MQTT_CONN_NOT_AUTHORIZED',
-    -209: 'ERR_MQTT_UNEXPECTED_PACKET_ID',
-    -210: 'ERR_MQTT_NO_NEW_PACKET_AVAILABLE',
-    -301: 'ERR_CMD_MODE_FAILED',
-    -302: 'ERR_FRAME_MALFORMED',
-    -303: 'ERR_FRAME_INCORRECT_CHECKSUM',
-    -304: 'ERR_FRAME_UNEXPECTED_ID',
-    -305: 'ERR_FRAME_NO_RESPONSE',
-    -401: 'ERR_INVALID_RTTY_SHIFT',
-    -402: 'ERR_UNSUPPORTED_ENCODING',
-    -501: 'ERR_INVALID_DATA_RATE',
-    -502: 'ERR_INVALID_ADDRESS_WIDTH',
-    -503: 'ERR_INVALID_PIPE_NUMBER',
-    -504: 'ERR_ACK_NOT_RECEIVED',
-    -601: 'ERR_INVALID_NUM_BROAD_ADDRS',
-    -701: 'ERR_INVALID_CRC_CONFIGURATION',
-    -702: 'LORA_DETECTED',
-    -703: 'ERR_INVALID_TCXO_VOLTAGE',
-    -704: 'ERR_INVALID_MODULATION_PARAMETERS',
-    -705: 'ERR_SPI_CMD_TIMEOUT',
-    -706: 'ERR_SPI_CMD_INVALID',
-    -707: 'ERR_SPI_CMD_FAILED',
-    -708: 'ERR_INVALID_SLEEP_PERIOD',
-    -709: 'ERR_INVALID_RX_PERIOD',
-    -801: 'ERR_INVALID_CALLSIGN',
-    -802: 'ERR_INVALID_NUM_REPEATERS',
-    -803: 'ERR_INVALID_REPEATER_CALLSIGN',
-    -804: 'ERR_INVALID_PACKET_TYPE',
-    -805: 'ERR_INVALID_PACKET_LENGTH'
-    }
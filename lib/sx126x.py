@@ -35,6 +35,74 @@ if implementation.name == 'circuitpython':
         diff = ((diff + _TICKS_HALFPERIOD) & _TICKS_MAX) - _TICKS_HALFPERIOD
         return diff
 
+#1 compiles in the hot path probes of probes.py, 0 leaves no trace of them
+_PROBES = const(0)
+if _PROBES:
+    from probes import PROBES, P_SPI, P_STATUS
+
+#LoRa time on air in us, also used for profiles that aren't applied to the radio yet
+def loraTimeOnAir(len_, sf, bwKhz, cr, preambleLength, crcType, headerType):
+    symbolLength_us = int(((1000 * 10) << sf) / (bwKhz * 10))
+    sfCoeff1_x4 = 17
+    sfCoeff2 = 8
+    if sf == 5 or sf == 6:
+        sfCoeff1_x4 = 25
+        sfCoeff2 = 0
+    sfDivisor = 4*sf
+    if symbolLength_us >= 16000:
+        sfDivisor = 4*(sf - 2)
+    bitsPerCrc = 16
+    N_symbol_header = 20 if headerType == SX126X_LORA_HEADER_EXPLICIT else 0
+
+    bitCount = int(8 * len_ + crcType * bitsPerCrc - 4 * sf  + sfCoeff2 + N_symbol_header)
+    if bitCount < 0:
+        bitCount = 0
+
+    nPreCodedSymbols = int((bitCount + (sfDivisor - 1)) / sfDivisor)
+
+    nSymbol_x4 = int((preambleLength + 8) * 4 + sfCoeff1_x4 + nPreCodedSymbols * (cr + 4) * 4)
+
+    return int((symbolLength_us * nSymbol_x4) / 4)
+
+#GFSK time on air in us of a len_ byte payload at brKbps, preamble and sync word in bits,
+#plus the length byte of variable length packets and the CRC
+def fskTimeOnAir(len_, brKbps, preambleBits, syncBits, crcBytes, variable=True):
+    bits = preambleBits + syncBits + 8 * (len_ + crcBytes + (1 if variable else 0))
+    return int(bits * 1000 / brKbps)
+
+#RX duty cycle windows in us, (wake, sleep), that catch a LoRa preamble of senderPreambleLength
+#symbols with minSymbols of it in a window wherever it starts, None when the gap between two
+#windows would be shorter than the TCXO start and standby transition
+def rxDutyCyclePeriods(senderPreambleLength, minSymbols, sf, bwKhz, tcxoDelay):
+    sleepSymbols = int(senderPreambleLength - 2 * minSymbols)
+    if sleepSymbols <= 0:
+        return None
+    symbolLength = int(((10*1000) << sf) / (10 * bwKhz))
+    sleepPeriod = symbolLength * sleepSymbols
+    if sleepPeriod < (tcxoDelay + 1016):
+        return None
+    wakePeriod = int(max((symbolLength * (senderPreambleLength + 1) - (sleepPeriod - 1000)) / 2, symbolLength * (minSymbols + 1)))
+    return wakePeriod, sleepPeriod
+
+#preassembled frames for the commands on the RX and TX paths: opcode, parameters and
+#for reads the status byte and the answer. LoRa lengths of the modulation/packet params
+_FRAMES = {SX126X_CMD_SET_STANDBY: 2, SX126X_CMD_SET_RX: 4, SX126X_CMD_SET_TX: 4, SX126X_CMD_SET_CAD: 1,
+           SX126X_CMD_SET_DIO_IRQ_PARAMS: 9, SX126X_CMD_CLEAR_IRQ_STATUS: 3, SX126X_CMD_SET_RF_FREQUENCY: 5,
+           SX126X_CMD_SET_TX_PARAMS: 3, SX126X_CMD_SET_MODULATION_PARAMS: 5, SX126X_CMD_SET_PACKET_PARAMS: 7,
+           SX126X_CMD_SET_BUFFER_BASE_ADDRESS: 3, SX126X_CMD_GET_IRQ_STATUS: 4, SX126X_CMD_GET_PACKET_TYPE: 3,
+           SX126X_CMD_GET_STATUS: 3, SX126X_CMD_GET_PACKET_STATUS: 5, SX126X_CMD_GET_RX_BUFFER_STATUS: 4}
+#commands assembled by SPItransfer up to this length keep their frame, the rest are buffer accesses
+_SCRATCH_MAX = const(16)
+
+#preamble and header flags only latch in the status, they tell a frame is on its way
+_RX_IRQ = SX126X_IRQ_RX_DONE | SX126X_IRQ_TIMEOUT | SX126X_IRQ_CRC_ERR | SX126X_IRQ_HEADER_ERR |\
+          SX126X_IRQ_PREAMBLE_DETECTED | SX126X_IRQ_HEADER_VALID
+
+_STATUS_ERR = {SX126X_STATUS_CMD_TIMEOUT: ERR_SPI_CMD_TIMEOUT,
+               SX126X_STATUS_CMD_INVALID: ERR_SPI_CMD_INVALID,
+               SX126X_STATUS_CMD_FAILED: ERR_SPI_CMD_FAILED,
+               SX126X_STATUS_SPI_FAILED: ERR_CHIP_NOT_FOUND}
+
 class SX126X:
 
     def __init__(self, spi_bus, clk, mosi, miso, cs, irq, rst, gpio):
@@ -78,6 +146,18 @@ class SX126X:
         self._rxIq = 0
         self._invertIQ = 0
         self._ldroAuto = True
+        self._headerErrors = 0
+        self._cadSymbolNum = SX126X_CAD_ON_8_SYMB
+        #errata register values last written, -1 until read back from the chip
+        self._iqConfig = -1
+        self._sensitivityConfig = -1
+        #address -> byte of register writes held back by beginRegisters(), None when writing through
+        self._regBatch = None
+        self._regDepth = 0
+        #shadow of the chip: packet type last set, -1 when unknown, and start address -> bytes
+        #of the register ranges profiles write
+        self._modem = -1
+        self._regShadow = {}
 
         self._br = 0
         self._freqDev = 0
@@ -94,6 +174,16 @@ class SX126X:
         self._packetLength = 0
         self._preambleDetectorLength = 0
 
+        #opcode -> (frame, status buffer), parameters are packed in place on every call
+        self._frames = {}
+        for op in _FRAMES:
+            frame = bytearray(_FRAMES[op])
+            frame[0] = op
+            self._frames[op] = (frame, bytearray(len(frame)))
+        #RX timeout packed into the SET_RX frame, re-arms with the same one skip the packing
+        self._rxTimeout = -1
+        #length -> (frame, status) for SPItransfer, allocated once per command length
+        self._scratch = {}
 
     def begin(self, bw, sf, cr, syncWord, currentLimit, preambleLength, tcxoVoltage, useRegulatorLDO=False, txIq=False, rxIq=False):
         self._bwKhz = 125
@@ -153,69 +243,11 @@ class SX126X:
 
         return state
 
-    def beginFSK(self, br, freqDev, rxBw, currentLimit, preambleLength, dataShaping, preambleDetectorLength, tcxoVoltage, useRegulatorLDO=False):
-        self._br = 21333
-        self._freqDev = 52428
-        self._rxBw = SX126X_GFSK_RX_BW_156_2
-        self._rxBwKhz = 156.2
-        self._pulseShape = SX126X_GFSK_FILTER_GAUSS_0_5
-        self._crcTypeFSK = SX126X_GFSK_CRC_2_BYTE_INV
-        self._preambleLengthFSK = preambleLength
-        self._addrComp = SX126X_GFSK_ADDRESS_FILT_OFF
-        self._preambleDetectorLength = preambleDetectorLength
-
-        state = self.reset()
-        ASSERT(state)
-
-        state = self.standby()
-        ASSERT(state)
-
-        state = self.config(SX126X_PACKET_TYPE_GFSK)
-        ASSERT(state)
-
-        if tcxoVoltage > 0.0:
-            state = self.setTCXO(tcxoVoltage)
-            ASSERT(state)
-
-        state = self.setBitRate(br)
-        ASSERT(state)
-
-        state = self.setFrequencyDeviation(freqDev)
-        ASSERT(state)
-
-        state = self.setRxBandwidth(rxBw)
-        ASSERT(state)
-
-        state = self.setCurrentLimit(currentLimit)
-        ASSERT(state)
-
-        state = self.setDataShaping(dataShaping)
-        ASSERT(state)
-
-        state = self.setPreambleLength(preambleLength)
-        ASSERT(state)
-
-        sync = [0x2D, 0x01]
-        state = self.setSyncWord(sync, 2)
-        ASSERT(state)
-
-        state = self.setWhitening(True, 0x0100)
-        ASSERT(state)
-
-        state = self.variablePacketLengthMode(SX126X_MAX_PACKET_LENGTH)
-        ASSERT(state)
-
-        state = self.setDio2AsRfSwitch(True)
-        ASSERT(state)
-
-        if useRegulatorLDO:
-            state = self.setRegulatorLDO()
-        else:
-            state = self.setRegulatorDCDC()
-
-        return state
-
     def reset(self, verify=True):
+        self._iqConfig = -1
+        self._sensitivityConfig = -1
+        self._modem = -1
+        self._regShadow = {}
         if implementation.name == 'micropython':
           self.rst.value(1)
           sleep_us(150)
@@ -358,11 +390,17 @@ class SX126X:
         state = self.clearIrqStatus()
         ASSERT(state)
 
+        #CAD takes a few symbols, poll the pin instead of sleeping whole milliseconds
+        timeout = 2 * self.getCadTime() + 1000
+        start = ticks_us()
         state = self.setCad()
         ASSERT(state)
 
         while not self.irq.value():
-            yield_()
+            if ticks_diff(ticks_us(), start) > timeout:
+                self.clearIrqStatus()
+                self.standby()
+                return ERR_RX_TIMEOUT
 
         cadResult = self.getIrqStatus()
         if cadResult & SX126X_IRQ_CAD_DETECTED:
@@ -379,14 +417,19 @@ class SX126X:
         if not retainConfig:
             sleepMode = [SX126X_SLEEP_START_COLD | SX126X_SLEEP_RTC_OFF]
         state = self.SPIwriteCommand([SX126X_CMD_SET_SLEEP], 1, sleepMode, 1, False)
+        self._iqConfig = -1
+        self._sensitivityConfig = -1
+        self._modem = -1
+        self._regShadow = {}
 
         sleep_us(500)
 
         return state
 
     def standby(self, mode=SX126X_STANDBY_RC):
-        data = [mode]
-        return self.SPIwriteCommand([SX126X_CMD_SET_STANDBY], 1, data, 1)
+        frame, status = self._frames[SX126X_CMD_SET_STANDBY]
+        frame[1] = mode
+        return self._transfer(frame, status, 2)
 
     def setDio1Action(self, func):
         try:
@@ -444,7 +487,7 @@ class SX126X:
         state = self.clearIrqStatus()
         ASSERT(state)
         
-        state = self.fixSensitivity()
+        state = self.fixSensitivity(modem)
         ASSERT(state)
         
         state = self.setTx(SX126X_TX_TIMEOUT_NONE)
@@ -506,24 +549,15 @@ class SX126X:
     def startReceiveDutyCycleAuto(self, senderPreambleLength=0, minSymbols=8):
         if senderPreambleLength == 0:
             senderPreambleLength = self._preambleLength
-                
-        sleepSymbols = int(senderPreambleLength - 2 * minSymbols)
-        
-        if (2 * minSymbols) > senderPreambleLength:
-            return self.startReceive()
-                
-        symbolLength = int(((10*1000) << self._sf) / (10 * self._bwKhz))
-        sleepPeriod = symbolLength * sleepSymbols
-        
-        wakePeriod = int(max((symbolLength * (senderPreambleLength + 1) - (sleepPeriod - 1000)) / 2, symbolLength * (minSymbols + 1)))
-        
-        if sleepPeriod < (self._tcxoDelay + 1016):
+
+        periods = rxDutyCyclePeriods(senderPreambleLength, minSymbols, self._sf, self._bwKhz, self._tcxoDelay)
+        if periods is None:
             return self.startReceive()
-                
-        return self.startReceiveDutyCycle(wakePeriod, sleepPeriod)
+
+        return self.startReceiveDutyCycle(periods[0], periods[1])
             
     def startReceiveCommon(self):
-        state = self.setDioIrqParams(SX126X_IRQ_RX_DONE | SX126X_IRQ_TIMEOUT | SX126X_IRQ_CRC_ERR | SX126X_IRQ_HEADER_ERR, SX126X_IRQ_RX_DONE)
+        state = self.setDioIrqParams(_RX_IRQ, SX126X_IRQ_RX_DONE)
         ASSERT(state)
         
         state = self.setBufferBaseAddress()
@@ -533,6 +567,11 @@ class SX126X:
 
         modem = self.getPacketType()
         if modem == SX126X_PACKET_TYPE_LORA:
+            #a downlink may have left the TX IQ setting, duty cycled RX comes through here only
+            if self._rxIq:
+                self._invertIQ = SX126X_LORA_IQ_INVERTED
+            else:
+                self._invertIQ = SX126X_LORA_IQ_STANDARD
             state = self.setPacketParams(self._preambleLength, self._crcType, self._implicitLen, self._headerType, self._invertIQ)
         elif modem == SX126X_PACKET_TYPE_GFSK:
             state = self.setPacketParamsFSK(self._preambleLengthFSK, self._crcTypeFSK, self._syncWordLength, self._addrComp, self._whitening, self._packetType)
@@ -547,8 +586,13 @@ class SX126X:
         
         irq = self.getIrqStatus()
         crcState = ERR_NONE
-        if irq & SX126X_IRQ_CRC_ERR or irq & SX126X_IRQ_HEADER_ERR:
+        if irq & SX126X_IRQ_CRC_ERR:
             crcState = ERR_CRC_MISMATCH
+        elif irq & SX126X_IRQ_HEADER_ERR:
+            # a header error doesn't raise RX_DONE, along with it the flag is left over from an earlier frame
+            self._headerErrors += 1
+            if not irq & SX126X_IRQ_RX_DONE:
+                crcState = ERR_LORA_HEADER_DAMAGED
                 
         length = len_
         if len_ == SX126X_MAX_PACKET_LENGTH:
@@ -558,9 +602,11 @@ class SX126X:
         ASSERT(state)
         
         state = self.clearIrqStatus()
-        
-        ASSERT(crcState)
-        
+
+        #CRC and header errors are returned, they're frequent on a busy channel
+        if crcState != ERR_NONE:
+            return crcState
+
         return state
             
     def setBandwidth(self, bw):
@@ -660,155 +706,6 @@ class SX126X:
 
         return ERR_UNKNOWN
 
-    def setFrequencyDeviation(self, freqDev):
-        if self.getPacketType() != SX126X_PACKET_TYPE_GFSK:
-            return ERR_WRONG_MODEM
-
-        if not (freqDev <= 200.0):
-            return ERR_INVALID_FREQUENCY_DEVIATION
-
-        freqDevRaw = int(((freqDev * 1000.0) * float(1 << 25)) / (SX126X_CRYSTAL_FREQ * 1000000.0))
-
-        self._freqDev = freqDevRaw
-        return self.setModulationParamsFSK(self._br, self._pulseShape, self._rxBw, self._freqDev)
-
-    def setBitRate(self, br):
-        if self.getPacketType() != SX126X_PACKET_TYPE_GFSK:
-            return ERR_WRONG_MODEM
-
-        if not ((br >= 0.6) and (br <= 300.0)):
-            return ERR_INVALID_BIT_RATE
-
-        brRaw = int((SX126X_CRYSTAL_FREQ * 1000000.0 * 32.0) / (br * 1000.0))
-
-        self._br = brRaw
-
-        return self.setModulationParamsFSK(self._br, self._pulseShape, self._rxBw, self._freqDev)
-
-    def setRxBandwidth(self, rxBw):
-        if self.getPacketType() != SX126X_PACKET_TYPE_GFSK:
-            return ERR_WRONG_MODEM
-
-        self._rxBwKhz = rxBw
-
-        if abs(rxBw - 4.8) <= 0.001:
-            self._rxBw = SX126X_GFSK_RX_BW_4_8
-        elif abs(rxBw - 5.8) <= 0.001:
-            self._rxBw = SX126X_GFSK_RX_BW_5_8
-        elif abs(rxBw - 7.3) <= 0.001:
-            self._rxBw = SX126X_GFSK_RX_BW_7_3
-        elif abs(rxBw - 9.7) <= 0.001:
-            self._rxBw = SX126X_GFSK_RX_BW_9_7
-        elif abs(rxBw - 11.7) <= 0.001:
-            self._rxBw = SX126X_GFSK_RX_BW_11_7
-        elif abs(rxBw - 14.6) <= 0.001:
-            self._rxBw = SX126X_GFSK_RX_BW_14_6
-        elif abs(rxBw - 19.5) <= 0.001:
-            self._rxBw = SX126X_GFSK_RX_BW_19_5
-        elif abs(rxBw - 23.4) <= 0.001:
-            self._rxBw = SX126X_GFSK_RX_BW_23_4
-        elif abs(rxBw - 29.3) <= 0.001:
-            self._rxBw = SX126X_GFSK_RX_BW_29_3
-        elif abs(rxBw - 39.0) <= 0.001:
-            self._rxBw = SX126X_GFSK_RX_BW_39_0
-        elif abs(rxBw - 46.9) <= 0.001:
-            self._rxBw = SX126X_GFSK_RX_BW_46_9
-        elif abs(rxBw - 58.6) <= 0.001:
-            self._rxBw = SX126X_GFSK_RX_BW_58_6
-        elif abs(rxBw - 78.2) <= 0.001:
-            self._rxBw = SX126X_GFSK_RX_BW_78_2
-        elif abs(rxBw - 93.8) <= 0.001:
-            self._rxBw = SX126X_GFSK_RX_BW_93_8
-        elif abs(rxBw - 117.3) <= 0.001:
-            self._rxBw = SX126X_GFSK_RX_BW_117_3
-        elif abs(rxBw - 156.2) <= 0.001:
-            self._rxBw = SX126X_GFSK_RX_BW_156_2
-        elif abs(rxBw - 187.2) <= 0.001:
-            self._rxBw = SX126X_GFSK_RX_BW_187_2
-        elif abs(rxBw - 234.3) <= 0.001:
-            self._rxBw = SX126X_GFSK_RX_BW_234_3
-        elif abs(rxBw - 312.0) <= 0.001:
-            self._rxBw = SX126X_GFSK_RX_BW_312_0
-        elif abs(rxBw - 373.6) <= 0.001:
-            self._rxBw = SX126X_GFSK_RX_BW_373_6
-        elif abs(rxBw - 467.0) <= 0.001:
-            self._rxBw = SX126X_GFSK_RX_BW_467_0
-        else:
-            return ERR_INVALID_RX_BANDWIDTH
-
-        return self.setModulationParamsFSK(self._br, self._pulseShape, self._rxBw, self._freqDev)
-
-    def setDataShaping(self, sh):
-        if self.getPacketType() != SX126X_PACKET_TYPE_GFSK:
-            return ERR_WRONG_MODEM
-
-        sh *= 10.0
-        if abs(sh - 0.0) <= 0.001:
-            self._pulseShape = SX126X_GFSK_FILTER_NONE
-        elif abs(sh - 3.0) <= 0.001:
-            self._pulseShape = SX126X_GFSK_FILTER_GAUSS_0_3
-        elif abs(sh - 5.0) <= 0.001:
-            self._pulseShape = SX126X_GFSK_FILTER_GAUSS_0_5
-        elif abs(sh - 7.0) <= 0.001:
-            self._pulseShape = SX126X_GFSK_FILTER_GAUSS_0_7
-        elif abs(sh - 10.0) <= 0.001:
-            self._pulseShape = SX126X_GFSK_FILTER_GAUSS_1
-        else:
-            return ERR_INVALID_DATA_SHAPING
-
-        return self.setModulationParamsFSK(self._br, self._pulseShape, self._rxBw, self._freqDev)
-
-    def setSyncBits(self, syncWord, bitsLen):
-        if self.getPacketType() != SX126X_PACKET_TYPE_GFSK:
-            return ERR_WRONG_MODEM
-
-        if bitsLen > 0x40:
-            return ERR_INVALID_SYNC_WORD
-
-        bytesLen = int(bitsLen / 8)
-        if (bitsLen % 8) != 0:
-            bytesLen += 1
-
-        state = self.writeRegister(SX126X_REG_SYNC_WORD_0, syncWord, bytesLen)
-        ASSERT(state)
-
-        self._syncWordLength = bitsLen
-        state = self.setPacketParamsFSK(self._preambleLengthFSK, self._crcTypeFSK, self._syncWordLength, self._addrComp, self._whitening, self._packetType, self._packetLength, self._preambleDetectorLength)
-
-        return state
-
-    def setNodeAddress(self, nodeAddr):
-        if self.getPacketType() != SX126X_PACKET_TYPE_GFSK:
-            return ERR_WRONG_MODEM
-
-        self._addrComp = SX126X_GFSK_ADDRESS_FILT_NODE
-
-        state = self.setPacketParamsFSK(self._preambleLengthFSK, self._crcTypeFSK, self._syncWordLength, self._addrComp, self._whitening, self._packetType, self._packetLength, self._preambleDetectorLength)
-        ASSERT(state)
-
-        state = self.writeRegister(SX126X_REG_NODE_ADDRESS, [nodeAddr], 1)
-
-        return state
-
-    def setBroadcastAddress(self, broadAddr):
-        if self.getPacketType() != SX126X_PACKET_TYPE_GFSK:
-            return ERR_WRONG_MODEM
-
-        self._addrComp = SX126X_GFSK_ADDRESS_FILT_NODE_BROADCAST
-        state = self.setPacketParamsFSK(self._preambleLengthFSK, self._crcTypeFSK, self._syncWordLength, self._addrComp, self._whitening, self._packetType, self._packetLength, self._preambleDetectorLength)
-        ASSERT(state)
-
-        state = self.writeRegister(SX126X_REG_BROADCAST_ADDRESS, [broadAddr], 1)
-
-        return state
-
-    def disableAddressFiltering(self):
-        if self.getPacketType() != SX126X_PACKET_TYPE_GFSK:
-            return ERR_WRONG_MODEM
-
-        self._addrComp = SX126X_GFSK_ADDRESS_FILT_OFF
-        return self.setPacketParamsFSK(self._preambleLengthFSK, self._crcTypeFSK, self._syncWordLength, self._addrComp, self._whitening, self._packetType, self._packetLength, self._preambleDetectorLength)
-
     def setCRC(self, len_, initial=0x1D0F, polynomial=0x1021, inverted=True):
         modem = self.getPacketType()
 
@@ -831,15 +728,16 @@ class SX126X:
             state = self.setPacketParamsFSK(self._preambleLengthFSK, self._crcTypeFSK, self._syncWordLength, self._addrComp, self._whitening, self._packetType, self._packetLength, self._preambleDetectorLength)
             ASSERT(state)
 
+            #initial value and polynomial are neighbours, one WRITE_REGISTER
+            self.beginRegisters()
             data = [int((initial >> 8) & 0xFF), int(initial & 0xFF)]
-            state = self.writeRegister(SX126X_REG_CRC_INITIAL_MSB, data, 2)
-            ASSERT(state)
+            self.writeRegister(SX126X_REG_CRC_INITIAL_MSB, data, 2)
 
             data[0] = int((polynomial >> 8) & 0xFF)
             data[1] = int(polynomial & 0xFF)
-            state = self.writeRegister(SX126X_REG_CRC_POLYNOMIAL_MSB, data, 2)
+            self.writeRegister(SX126X_REG_CRC_POLYNOMIAL_MSB, data, 2)
 
-            return state
+            return self.flushRegisters()
 
         elif modem == SX126X_PACKET_TYPE_LORA:
 
@@ -852,87 +750,66 @@ class SX126X:
 
         return ERR_UNKNOWN
 
-    def setWhitening(self, enabled, initial=0x0100):
-        if self.getPacketType() != SX126X_PACKET_TYPE_GFSK:
-            return ERR_WRONG_MODEM
-
-        state = ERR_NONE
-        if enabled != True:
-            self._whitening = SX126X_GFSK_WHITENING_OFF
-
-            state = self.setPacketParamsFSK(self._preambleLengthFSK, self._crcTypeFSK, self._syncWordLength, self._addrComp, self._whitening, self._packetType, self._packetLength, self._preambleDetectorLength)
-            ASSERT(state)
-        else:
-            self._whitening = SX126X_GFSK_WHITENING_ON
-            
-            data = bytearray(1)
-            data_mv = memoryview(data)
-            state = self.readRegister(SX126X_REG_WHITENING_INITIAL_MSB, data_mv, 1)
-            ASSERT(state)
-            data2 = [(data[0] & 0xFE) | int((initial >> 8) & 0x01), int(initial & 0xFF)]
-            state = self.writeRegister(SX126X_REG_WHITENING_INITIAL_MSB, data2, 2)
-            ASSERT(state)
-
-            state = self.setPacketParamsFSK(self._preambleLengthFSK, self._crcTypeFSK, self._syncWordLength, self._addrComp, self._whitening, self._packetType, self._packetLength, self._preambleDetectorLength)
-            ASSERT(state)
-        return state
-
     def getDataRate(self):
         return self._dataRate
 
+    def getHeaderErrors(self):
+        return self._headerErrors
+
+    #GFSK packet status is RxStatus, RssiSync, RssiAvg, the RSSI at sync word detection is taken
     def getRSSI(self):
+        if _PROBES:
+            PROBES.enter(P_STATUS)
         packetStatus = self.getPacketStatus()
+        if self.getPacketType() == SX126X_PACKET_TYPE_GFSK:
+            packetStatus >>= 8
         rssiPkt = int(packetStatus & 0xFF)
+        if _PROBES:
+            PROBES.exit(P_STATUS)
         return -1.0 * rssiPkt/2.0
 
     def getSNR(self):
         if self.getPacketType() != SX126X_PACKET_TYPE_LORA:
             return ERR_WRONG_MODEM
 
+        if _PROBES:
+            PROBES.enter(P_STATUS)
         packetStatus = self.getPacketStatus()
         snrPkt = int((packetStatus >> 8) & 0xFF)
+        if _PROBES:
+            PROBES.exit(P_STATUS)
         if snrPkt < 128:
             return snrPkt/4.0
         else:
             return (snrPkt - 256)/4.0
 
     def getPacketLength(self, update=True):
-        rxBufStatus = bytearray(2)
-        rxBufStatus_mv = memoryview(rxBufStatus)
-        self.SPIreadCommand([SX126X_CMD_GET_RX_BUFFER_STATUS], 1, rxBufStatus_mv, 2)
-        return rxBufStatus[0]
-
-    def fixedPacketLengthMode(self, len_=SX126X_MAX_PACKET_LENGTH):
-        return self.setPacketMode(SX126X_GFSK_PACKET_FIXED, len_)
+        frame, status = self._frames[SX126X_CMD_GET_RX_BUFFER_STATUS]
+        if self._transfer(frame, status, 2) != ERR_NONE:
+            return 0
+        return status[2]
 
-    def variablePacketLengthMode(self, maxLen=SX126X_MAX_PACKET_LENGTH):
-        return self.setPacketMode(SX126X_GFSK_PACKET_VARIABLE, maxLen)
+    #CAD duration in us with the current settings, the detection symbols plus about one to process them
+    def getCadTime(self):
+        return int(((1 << self._cadSymbolNum) + 1) * (1000 << self._sf) / self._bwKhz)
 
     def getTimeOnAir(self, len_):
         if self.getPacketType() == SX126X_PACKET_TYPE_LORA:
-            symbolLength_us = int(((1000 * 10) << self._sf) / (self._bwKhz * 10))
-            sfCoeff1_x4 = 17
-            sfCoeff2 = 8
-            if self._sf == 5 or self._sf == 6:
-                sfCoeff1_x4 = 25
-                sfCoeff2 = 0
-            sfDivisor = 4*self._sf
-            if symbolLength_us >= 16000:
-                sfDivisor = 4*(self._sf - 2)
-            bitsPerCrc = 16
-            N_symbol_header = 20 if self._headerType == SX126X_LORA_HEADER_EXPLICIT else 0
-
-            bitCount = int(8 * len_ + self._crcType * bitsPerCrc - 4 * self._sf  + sfCoeff2 + N_symbol_header)
-            if bitCount < 0:
-                bitCount = 0
-
-            nPreCodedSymbols = int((bitCount + (sfDivisor - 1)) / sfDivisor)
-
-            nSymbol_x4 = int((self._preambleLength + 8) * 4 + sfCoeff1_x4 + nPreCodedSymbols * (self._cr + 4) * 4)
-
-            return int((symbolLength_us * nSymbol_x4) / 4)
+            return loraTimeOnAir(len_, self._sf, self._bwKhz, self._cr, self._preambleLength, self._crcType, self._headerType)
         else:
-            return int((len_ * 8 * self._br) / (SX126X_CRYSTAL_FREQ * 32))
+            return fskTimeOnAir(len_, self.getBitRate(), self._preambleLengthFSK, self._syncWordLength,
+                                self.getCrcBytesFSK(), self._packetType == SX126X_GFSK_PACKET_VARIABLE)
+
+    #GFSK bit rate in kbps back from the BitRate word
+    def getBitRate(self):
+        return SX126X_CRYSTAL_FREQ * 32000.0 / self._br
+
+    def getCrcBytesFSK(self):
+        if self._crcTypeFSK == SX126X_GFSK_CRC_OFF:
+            return 0
+        if self._crcTypeFSK & 0x02:
+            return 2
+        return 1
 
     def implicitHeader(self, len_):
         return self.setHeaderType(SX126X_LORA_HEADER_IMPLICIT, len_)
@@ -1011,28 +888,100 @@ class SX126X:
         return self.SPIwriteCommand([SX126X_CMD_SET_DIO2_AS_RF_SWITCH_CTRL], 1, data, 1)
 
     def setTx(self, timeout=0):
-        data = [int((timeout >> 16) & 0xFF), int((timeout >> 8) & 0xFF), int(timeout & 0xFF)]
-        return self.SPIwriteCommand([SX126X_CMD_SET_TX], 1, data, 3)
+        frame, status = self._frames[SX126X_CMD_SET_TX]
+        frame[1] = (timeout >> 16) & 0xFF
+        frame[2] = (timeout >> 8) & 0xFF
+        frame[3] = timeout & 0xFF
+        return self._transfer(frame, status, 4)
 
     def setRx(self, timeout):
-        data = [int((timeout >> 16) & 0xFF), int((timeout >> 8) & 0xFF), int(timeout & 0xFF)]
-        return self.SPIwriteCommand([SX126X_CMD_SET_RX], 1, data, 3)
+        frame, status = self._frames[SX126X_CMD_SET_RX]
+        if timeout != self._rxTimeout:
+            frame[1] = (timeout >> 16) & 0xFF
+            frame[2] = (timeout >> 8) & 0xFF
+            frame[3] = timeout & 0xFF
+            self._rxTimeout = timeout
+        return self._transfer(frame, status, 4)
 
     def setCad(self):
-        return self.SPIwriteCommand([SX126X_CMD_SET_CAD], 1, [], 0)
+        frame, status = self._frames[SX126X_CMD_SET_CAD]
+        return self._transfer(frame, status, 1)
+
+    def setCadParams(self, symbolNum, detPeak, detMin, exitMode=SX126X_CAD_GOTO_STDBY, timeout=0):
+        data = [symbolNum, detPeak, detMin, exitMode,
+                int((timeout >> 16) & 0xFF), int((timeout >> 8) & 0xFF), int(timeout & 0xFF)]
+        self._cadSymbolNum = symbolNum
+        return self.SPIwriteCommand([SX126X_CMD_SET_CAD_PARAMS], 1, data, 7)
 
     def setPaConfig(self, paDutyCycle, deviceSel, hpMax=SX126X_PA_CONFIG_HP_MAX, paLut=SX126X_PA_CONFIG_PA_LUT):
         data = [paDutyCycle, hpMax, deviceSel, paLut]
         return self.SPIwriteCommand([SX126X_CMD_SET_PA_CONFIG], 1, data, 4)
 
     def writeRegister(self, addr, data, numBytes):
+        shadow = self._regShadow
+        if shadow:
+            for start in list(shadow):
+                if start < addr + numBytes and addr < start + len(shadow[start]):
+                    del shadow[start]
+        batch = self._regBatch
+        if batch is not None:
+            for i in range(numBytes):
+                batch[addr + i] = data[i] & 0xFF
+            return ERR_NONE
         cmd = [SX126X_CMD_WRITE_REGISTER, int((addr >> 8) & 0xFF), int(addr & 0xFF)]
         state = self.SPIwriteCommand(cmd, 3, data, numBytes)
         return state
 
     def readRegister(self, addr, data, numBytes):
+        batch = self._regBatch
+        if batch:
+            #a held back write is what the register will hold, the chip is only asked for the rest
+            held = 0
+            for i in range(numBytes):
+                if addr + i in batch:
+                    held += 1
+            if held < numBytes:
+                cmd = [SX126X_CMD_READ_REGISTER, int((addr >> 8) & 0xFF), int(addr & 0xFF)]
+                state = self.SPItransfer(cmd, 3, False, None, data, numBytes, True)
+                if state != ERR_NONE:
+                    return state
+            for i in range(numBytes):
+                if addr + i in batch:
+                    data[i] = batch[addr + i]
+            return ERR_NONE
         cmd = [SX126X_CMD_READ_REGISTER, int((addr >> 8) & 0xFF), int(addr & 0xFF)]
-        return self.SPItransfer(cmd, 3, False, [], data, numBytes, True)
+        return self.SPItransfer(cmd, 3, False, None, data, numBytes, True)
+
+    #register writes up to the matching flushRegisters() are held back and go out merged,
+    #one WRITE_REGISTER per run of neighbouring addresses, the last value written wins.
+    #Reads see the held back values. Batches nest, the outermost flush writes
+    def beginRegisters(self):
+        if self._regDepth == 0:
+            self._regBatch = {}
+        self._regDepth += 1
+
+    def flushRegisters(self):
+        self._regDepth -= 1
+        if self._regDepth > 0:
+            return ERR_NONE
+        batch = self._regBatch
+        self._regBatch = None
+        self._regDepth = 0
+        addrs = sorted(batch)
+        state = ERR_NONE
+        i = 0
+        while i < len(addrs):
+            j = i + 1
+            while j < len(addrs) and addrs[j] == addrs[j - 1] + 1:
+                j += 1
+            run = bytearray(j - i)
+            for k in range(i, j):
+                run[k - i] = batch[addrs[k]]
+            state = self.writeRegister(addrs[i], run, j - i)
+            if state != ERR_NONE:
+                return state
+            i = j
+        return state
 
     def writeBuffer(self, data, numBytes, offset=0x00):
         cmd = [SX126X_CMD_WRITE_BUFFER, offset]
@@ -1047,52 +996,63 @@ class SX126X:
         return state
 
     def setDioIrqParams(self, irqMask, dio1Mask, dio2Mask=SX126X_IRQ_NONE, dio3Mask=SX126X_IRQ_NONE):
-        data = [int((irqMask >> 8) & 0xFF), int(irqMask & 0xFF),
-                int((dio1Mask >> 8) & 0xFF), int(dio1Mask & 0xFF),
-                int((dio2Mask >> 8) & 0xFF), int(dio2Mask & 0xFF),
-                int((dio3Mask >> 8) & 0xFF), int(dio3Mask & 0xFF)]
-        return self.SPIwriteCommand([SX126X_CMD_SET_DIO_IRQ_PARAMS], 1, data, 8)
+        frame, status = self._frames[SX126X_CMD_SET_DIO_IRQ_PARAMS]
+        frame[1] = (irqMask >> 8) & 0xFF
+        frame[2] = irqMask & 0xFF
+        frame[3] = (dio1Mask >> 8) & 0xFF
+        frame[4] = dio1Mask & 0xFF
+        frame[5] = (dio2Mask >> 8) & 0xFF
+        frame[6] = dio2Mask & 0xFF
+        frame[7] = (dio3Mask >> 8) & 0xFF
+        frame[8] = dio3Mask & 0xFF
+        return self._transfer(frame, status, 9)
 
     def getIrqStatus(self):
-        data = bytearray(2)
-        data_mv = memoryview(data)
-        self.SPIreadCommand([SX126X_CMD_GET_IRQ_STATUS], 1, data_mv, 2)
-        return int((data[0] << 8) | data[1])
+        frame, status = self._frames[SX126X_CMD_GET_IRQ_STATUS]
+        if self._transfer(frame, status, 2) != ERR_NONE:
+            return 0
+        return (status[2] << 8) | status[3]
 
     def clearIrqStatus(self, clearIrqParams=SX126X_IRQ_ALL):
-        data = [int((clearIrqParams >> 8) & 0xFF), int(clearIrqParams & 0xFF)]
-        return self.SPIwriteCommand([SX126X_CMD_CLEAR_IRQ_STATUS], 1, data, 2)
+        frame, status = self._frames[SX126X_CMD_CLEAR_IRQ_STATUS]
+        frame[1] = (clearIrqParams >> 8) & 0xFF
+        frame[2] = clearIrqParams & 0xFF
+        return self._transfer(frame, status, 3)
 
     def setRfFrequency(self, frf):
-        data = [int((frf >> 24) & 0xFF),
-                int((frf >> 16) & 0xFF),
-                int((frf >> 8) & 0xFF),
-                int(frf & 0xFF)]
-        return self.SPIwriteCommand([SX126X_CMD_SET_RF_FREQUENCY], 1, data, 4)
+        frame, status = self._frames[SX126X_CMD_SET_RF_FREQUENCY]
+        frame[1] = (frf >> 24) & 0xFF
+        frame[2] = (frf >> 16) & 0xFF
+        frame[3] = (frf >> 8) & 0xFF
+        frame[4] = frf & 0xFF
+        return self._transfer(frame, status, 5)
 
     def calibrateImage(self, data):
         return self.SPIwriteCommand([SX126X_CMD_CALIBRATE_IMAGE], 1, data, 2)
 
+    #answered from the shadow once the packet type is known, the setters ask on every call
     def getPacketType(self):
-        data = bytearray([0xFF])
-        data_mv = memoryview(data)
-        self.SPIreadCommand([SX126X_CMD_GET_PACKET_TYPE], 1, data_mv, 1)
-        return data[0]
+        if self._modem >= 0:
+            return self._modem
+        frame, status = self._frames[SX126X_CMD_GET_PACKET_TYPE]
+        if self._transfer(frame, status, 2) != ERR_NONE:
+            return 0xFF
+        self._modem = status[2]
+        return self._modem
+
+    def setPacketType(self, modem):
+        state = self.SPIwriteCommand([SX126X_CMD_SET_PACKET_TYPE], 1, [modem], 1)
+        if state == ERR_NONE:
+            self._modem = modem
+        else:
+            self._modem = -1
+        return state
 
     def setTxParams(self, power, rampTime=SX126X_PA_RAMP_200U):
-        data = [power, rampTime]
-        return self.SPIwriteCommand([SX126X_CMD_SET_TX_PARAMS], 1, data, 2)
-
-    def setPacketMode(self, mode, len_):
-        if self.getPacketType() != SX126X_PACKET_TYPE_GFSK:
-            return ERR_WRONG_MODEM
-
-        state = self.setPacketParamsFSK(self._preambleLengthFSK, self._crcTypeFSK, self._syncWordLength, self._addrComp, self._whitening, mode, len_, self._preambleDetectorLength)
-        ASSERT(state)
-
-        self._packetType = mode
-        self._packetLength = len_
-        return state
+        frame, status = self._frames[SX126X_CMD_SET_TX_PARAMS]
+        frame[1] = power & 0xFF
+        frame[2] = rampTime
+        return self._transfer(frame, status, 3)
 
     def setHeaderType(self, headerType, len_=0xFF):
         if self.getPacketType() != SX126X_PACKET_TYPE_LORA:
@@ -1115,47 +1075,49 @@ class SX126X:
                 self._ldro = SX126X_LORA_LOW_DATA_RATE_OPTIMIZE_OFF
         else:
             self._ldro = ldro
-        data = [sf, bw, cr, self._ldro]
-        return self.SPIwriteCommand([SX126X_CMD_SET_MODULATION_PARAMS], 1, data, 4)
+        return self.setModulationParamsRaw(sf, bw, cr, self._ldro)
 
-    def setModulationParamsFSK(self, br, pulseShape, rxBw, freqDev):
-        data = [int((br >> 16) & 0xFF), int((br >> 8) & 0xFF), int(br & 0xFF),
-                pulseShape, rxBw,
-                int((freqDev >> 16) & 0xFF), int((freqDev >> 8) & 0xFF), int(freqDev & 0xFF)]
-        return self.SPIwriteCommand([SX126X_CMD_SET_MODULATION_PARAMS], 1, data, 8)
+    def setModulationParamsRaw(self, sf, bw, cr, ldro):
+        frame, status = self._frames[SX126X_CMD_SET_MODULATION_PARAMS]
+        frame[1] = sf
+        frame[2] = bw
+        frame[3] = cr
+        frame[4] = ldro
+        return self._transfer(frame, status, 5)
 
     def setPacketParams(self, preambleLength, crcType, payloadLength, headerType, invertIQ=SX126X_LORA_IQ_STANDARD):
         state = self.fixInvertedIQ(invertIQ)
         ASSERT(state)
-        data = [int((preambleLength >> 8) & 0xFF), int(preambleLength & 0xFF),
-                headerType, payloadLength, crcType, invertIQ]
-        return self.SPIwriteCommand([SX126X_CMD_SET_PACKET_PARAMS], 1, data, 6)
-
-    def setPacketParamsFSK(self, preambleLength, crcType, syncWordLength, addrComp, whitening, packetType=SX126X_GFSK_PACKET_VARIABLE, payloadLength=0xFF, preambleDetectorLength=SX126X_GFSK_PREAMBLE_DETECT_16):
-        data = [int((preambleLength >> 8) & 0xFF), int(preambleLength & 0xFF),
-                preambleDetectorLength, syncWordLength, addrComp,
-                packetType, payloadLength, crcType, whitening]
-        return self.SPIwriteCommand([SX126X_CMD_SET_PACKET_PARAMS], 1, data, 9)
+        frame, status = self._frames[SX126X_CMD_SET_PACKET_PARAMS]
+        frame[1] = (preambleLength >> 8) & 0xFF
+        frame[2] = preambleLength & 0xFF
+        frame[3] = headerType
+        frame[4] = payloadLength
+        frame[5] = crcType
+        frame[6] = invertIQ
+        return self._transfer(frame, status, 7)
 
     def setBufferBaseAddress(self, txBaseAddress=0x00, rxBaseAddress=0x00):
-        data = [txBaseAddress, rxBaseAddress]
-        return self.SPIwriteCommand([SX126X_CMD_SET_BUFFER_BASE_ADDRESS], 1, data, 2)
+        frame, status = self._frames[SX126X_CMD_SET_BUFFER_BASE_ADDRESS]
+        frame[1] = txBaseAddress
+        frame[2] = rxBaseAddress
+        return self._transfer(frame, status, 3)
 
     def setRegulatorMode(self, mode):
         data = [mode]
         return self.SPIwriteCommand([SX126X_CMD_SET_REGULATOR_MODE], 1, data, 1)
 
     def getStatus(self):
-        data = bytearray(1)
-        data_mv = memoryview(data)
-        self.SPIreadCommand([SX126X_CMD_GET_STATUS], 1, data_mv, 1)
-        return data[0]
+        frame, status = self._frames[SX126X_CMD_GET_STATUS]
+        if self._transfer(frame, status, 2) != ERR_NONE:
+            return 0
+        return status[2]
 
     def getPacketStatus(self):
-        data = bytearray(3)
-        data_mv = memoryview(data)
-        self.SPIreadCommand([SX126X_CMD_GET_PACKET_STATUS], 1, data_mv, 3)
-        return (data[0] << 16) | (data[1] << 8) | data[2]
+        frame, status = self._frames[SX126X_CMD_GET_PACKET_STATUS]
+        if self._transfer(frame, status, 2) != ERR_NONE:
+            return 0
+        return (status[2] << 16) | (status[3] << 8) | status[4]
 
     def getDeviceErrors(self):
         data = bytearray(2)
@@ -1172,17 +1134,23 @@ class SX126X:
         frf = int((freq * (1 << SX126X_DIV_EXPONENT)) / SX126X_CRYSTAL_FREQ)
         return self.setRfFrequency(frf)
 
-    def fixSensitivity(self):
-        sensitivityConfig = bytearray(1)
-        sensitivityConfig_mv = memoryview(sensitivityConfig)
-        state = self.readRegister(SX126X_REG_SENSITIVITY_CONFIG, sensitivityConfig_mv, 1)
-        ASSERT(state)
+    #the register is read once and then tracked, it is only written when the bit changes
+    def fixSensitivity(self, modem=None):
+        if modem is None:
+            modem = self.getPacketType()
+        current = self._sensitivityConfig
+        if current < 0:
+            current = self._readRegisterByte(SX126X_REG_SENSITIVITY_CONFIG)
 
-        if self.getPacketType() == SX126X_PACKET_TYPE_LORA and abs(self._bwKhz - 500.0) <= 0.001:
-            sensitivityConfig_mv[0] &= 0xFB
+        if modem == SX126X_PACKET_TYPE_LORA and abs(self._bwKhz - 500.0) <= 0.001:
+            sensitivityConfig = current & 0xFB
         else:
-            sensitivityConfig_mv[0] |= 0x04
-        return self.writeRegister(SX126X_REG_SENSITIVITY_CONFIG, sensitivityConfig, 1)
+            sensitivityConfig = current | 0x04
+        state = ERR_NONE
+        if sensitivityConfig != current:
+            state = self.writeRegister(SX126X_REG_SENSITIVITY_CONFIG, [sensitivityConfig], 1)
+        self._sensitivityConfig = sensitivityConfig if state == ERR_NONE else -1
+        return state
 
     def fixPaClamping(self):
         clampConfig = bytearray(1)
@@ -1209,40 +1177,41 @@ class SX126X:
         rtcEvent_mv[0] |= 0x02
         return self.writeRegister(SX126X_REG_RTC_EVENT, rtcEvent, 1)
 
+    #tracked like fixSensitivity, RX and TX with the same IQ setting cost no SPI access
     def fixInvertedIQ(self, iqConfig):
-        iqConfigCurrent = bytearray(1)
-        iqConfigCurrent_mv = memoryview(iqConfigCurrent)
-        state = self.readRegister(SX126X_REG_IQ_CONFIG, iqConfigCurrent_mv, 1)
-        ASSERT(state)
+        current = self._iqConfig
+        if current < 0:
+            current = self._readRegisterByte(SX126X_REG_IQ_CONFIG)
 
         if iqConfig == SX126X_LORA_IQ_STANDARD:
-            iqConfigCurrent_mv[0] &= 0xFB
+            iqConfigCurrent = current & 0xFB
         else:
-            iqConfigCurrent_mv[0] |= 0x04
+            iqConfigCurrent = current | 0x04
+        state = ERR_NONE
+        if iqConfigCurrent != current:
+            state = self.writeRegister(SX126X_REG_IQ_CONFIG, [iqConfigCurrent], 1)
+        self._iqConfig = iqConfigCurrent if state == ERR_NONE else -1
+        return state
 
-        return self.writeRegister(SX126X_REG_IQ_CONFIG, iqConfigCurrent, 1)
+    def _readRegisterByte(self, addr):
+        data = bytearray(1)
+        state = self.readRegister(addr, memoryview(data), 1)
+        ASSERT(state)
+        return data[0]
 
     def config(self, modem):
         state = self.setBufferBaseAddress()
         ASSERT(state)
 
-        data = [0,0,0,0,0,0,0]
-        data[0] = modem
-        state = self.SPIwriteCommand([SX126X_CMD_SET_PACKET_TYPE], 1, data, 1)
+        state = self.setPacketType(modem)
         ASSERT(state)
 
+        data = [0,0,0,0,0,0,0]
         data[0] = SX126X_RX_TX_FALLBACK_MODE_STDBY_RC
         state = self.SPIwriteCommand([SX126X_CMD_SET_RX_TX_FALLBACK_MODE], 1, data, 1)
         ASSERT(state)
 
-        data[0] = SX126X_CAD_ON_8_SYMB
-        data[1] = self._sf + 13
-        data[2] = 10
-        data[3] = SX126X_CAD_GOTO_STDBY
-        data[4] = 0x00
-        data[5] = 0x00
-        data[6] = 0x00
-        state = self.SPIwriteCommand([SX126X_CMD_SET_CAD_PARAMS], 1, data, 7)
+        state = self.setCadParams(SX126X_CAD_ON_8_SYMB, self._sf + 13, 10)
         ASSERT(state)
 
         state = self.clearIrqStatus()
@@ -1266,122 +1235,131 @@ class SX126X:
         return ERR_NONE
 
     def SPIwriteCommand(self, cmd, cmdLen, data, numBytes, waitForBusy=True):
-        return self.SPItransfer(cmd, cmdLen, True, data, [], numBytes, waitForBusy)
+        return self.SPItransfer(cmd, cmdLen, True, data, None, numBytes, waitForBusy)
 
     def SPIreadCommand(self, cmd, cmdLen, data, numBytes, waitForBusy=True):
-        return self.SPItransfer(cmd, cmdLen, False, [], data, numBytes, waitForBusy)
+        return self.SPItransfer(cmd, cmdLen, False, None, data, numBytes, waitForBusy)
 
+    #commands without a preassembled frame, assembled here into a scratch frame of the
+    #right length and sent as one transfer too
     def SPItransfer(self, cmd, cmdLen, write, dataOut, dataIn, numBytes, waitForBusy, timeout=5000):
+        n = cmdLen + numBytes
+        if not write:
+            n += 1
+        bufs = self._scratch.get(n)
+        if bufs is None:
+            bufs = (bytearray(n), bytearray(n))
+            #buffer reads and writes come in any length, those frames aren't kept
+            if n <= _SCRATCH_MAX:
+                self._scratch[n] = bufs
+        frame, status = bufs
+        i = 0
+        while i < cmdLen:
+            frame[i] = cmd[i]
+            i += 1
+        if write:
+            while i < n:
+                frame[i] = dataOut[i - cmdLen] & 0xFF
+                i += 1
+            checked = n
+        else:
+            #NOPs clocked out while the answer comes in
+            while i < n:
+                frame[i] = 0
+                i += 1
+            checked = cmdLen + 1
+        state = self._transfer(frame, status, checked, waitForBusy, timeout, cmdLen)
+        if not write and state == ERR_NONE:
+            i = 0
+            while i < numBytes:
+                dataIn[i] = status[checked + i]
+                i += 1
+        return state
+
+    #one SPI transfer of frame while status receives what the chip clocks out. The bytes
+    #from first up to checked carry the chip status: the data bytes of a write, the byte
+    #in front of the answer of a read
+    def _transfer(self, frame, status, checked, waitForBusy=True, timeout=5000, first=1):
+        if _PROBES:
+            PROBES.enter(P_SPI)
         if implementation.name == 'micropython':
           self.cs.value(0)
-
-          start = ticks_ms()
-          while self.gpio.value():
-              yield_()
-              if abs(ticks_diff(start, ticks_ms())) >= timeout:
-                  self.cs.value(1)
-                  return ERR_SPI_CMD_TIMEOUT
-
-          for i in range(cmdLen):
-              self.spi.write(bytes([cmd[i]]))
+          if not self._waitBusy(timeout):
+              self.cs.value(1)
+              return ERR_SPI_CMD_TIMEOUT
+          self.spi.write_readinto(frame, status)
+          self.cs.value(1)
 
         if implementation.name == 'circuitpython':
           while not self.spi.try_lock():
               pass
           self.cs.value = False
+          if not self._waitBusy(timeout):
+              self.cs.value = True
+              self.spi.unlock()
+              return ERR_SPI_CMD_TIMEOUT
+          self.spi.write_readinto(frame, status)
+          self.cs.value = True
+          self.spi.unlock()
 
-          start = ticks_ms()
-          while self.gpio.value:
-              yield_()
-              if abs(ticks_diff(start, ticks_ms())) >= timeout:
-                  self.cs.value = True
-                  self.spi.unlock()
-                  return ERR_SPI_CMD_TIMEOUT
-
-          for i in range(cmdLen):
-              self.spi.write(bytes([cmd[i]]))
+        result = 0
+        i = first
+        while i < checked:
+            b = status[i]
+            if (b & 0b00001110) == SX126X_STATUS_CMD_TIMEOUT or\
+               (b & 0b00001110) == SX126X_STATUS_CMD_INVALID or\
+               (b & 0b00001110) == SX126X_STATUS_CMD_FAILED:
+                result = b & 0b00001110
+                break
+            elif (b == 0x00) or (b == 0xFF):
+                result = SX126X_STATUS_SPI_FAILED
+                break
+            i += 1
 
-          in_ = bytearray(1)
+        if waitForBusy:
+            sleep_us(1)
+            if not self._waitBusy(timeout):
+                result = SX126X_STATUS_CMD_TIMEOUT
 
-        status = 0
-
-        if write:
-            for i in range(numBytes):
-                if implementation.name == 'micropython':
-                    try:
-                        in_ = self.spi.read(1, dataOut[i])
-                    except:
-                        in_ = self.spi.read(1, write=dataOut[i])
-
-                if implementation.name == 'circuitpython':
-                  self.spi.write_readinto(bytes([dataOut[i]]), in_)
-
-                if (in_[0] & 0b00001110) == SX126X_STATUS_CMD_TIMEOUT or\
-                   (in_[0] & 0b00001110) == SX126X_STATUS_CMD_INVALID or\
-                   (in_[0] & 0b00001110) == SX126X_STATUS_CMD_FAILED:
-                    status = in_[0] & 0b00001110
-                    break
-                elif (in_[0] == 0x00) or (in_[0] == 0xFF):
-                    status = SX126X_STATUS_SPI_FAILED
-                    break
-        else:
-            if implementation.name == 'micropython':
-                try:
-                    in_ = self.spi.read(1, SX126X_CMD_NOP)
-                except:
-                    in_ = self.spi.read(1, write=SX126X_CMD_NOP)
-
-            if implementation.name == 'circuitpython':
-              self.spi.readinto(in_)
-
-            if (in_[0] & 0b00001110) == SX126X_STATUS_CMD_TIMEOUT or\
-               (in_[0] & 0b00001110) == SX126X_STATUS_CMD_INVALID or\
-               (in_[0] & 0b00001110) == SX126X_STATUS_CMD_FAILED:
-                status = in_[0] & 0b00001110
-            elif (in_[0] == 0x00) or (in_[0] == 0xFF):
-                status = SX126X_STATUS_SPI_FAILED
-            else:
-                if implementation.name == 'micropython':
-                    for i in range(numBytes):
-                        try:
-                            dataIn[i] = self.spi.read(1, SX126X_CMD_NOP)[0]
-                        except:
-                            dataIn[i] = self.spi.read(1, write=SX126X_CMD_NOP)[0]
-
-                if implementation.name == 'circuitpython':
-                  for i in range(numBytes):
-                      self.spi.readinto(in_)
-                      dataIn[i] = in_[0]
+        if _PROBES:
+            PROBES.exit(P_SPI)
+        return _STATUS_ERR.get(result, ERR_NONE)
 
+    #polls BUSY until it drops, False after timeout ms. The clock is only read once BUSY is seen high
+    def _waitBusy(self, timeout):
         if implementation.name == 'micropython':
-          self.cs.value(1)
+          if not self.gpio.value():
+              return True
+          start = ticks_ms()
+          while self.gpio.value():
+              yield_()
+              if abs(ticks_diff(start, ticks_ms())) >= timeout:
+                  return False
 
         if implementation.name == 'circuitpython':
-          self.cs.value = True
-          self.spi.unlock()
-
-        if waitForBusy:
-            sleep_us(1)
-            start = ticks_ms()
-            if implementation.name == 'micropython':
-              while self.gpio.value():
-                  yield_()
-                  if abs(ticks_diff(start, ticks_ms())) >= timeout:
-                      status =  SX126X_STATUS_CMD_TIMEOUT
-                      break
-
-            if implementation.name == 'circuitpython':
-              while self.gpio.value:
-                  yield_()
-                  if abs(ticks_diff(start, ticks_ms())) >= timeout:
-                      status =  SX126X_STATUS_CMD_TIMEOUT
-                      break
-
-        switch = {SX126X_STATUS_CMD_TIMEOUT: ERR_SPI_CMD_TIMEOUT,
-                  SX126X_STATUS_CMD_INVALID: ERR_SPI_CMD_INVALID,
-                  SX126X_STATUS_CMD_FAILED: ERR_SPI_CMD_FAILED,
-                  SX126X_STATUS_SPI_FAILED: ERR_CHIP_NOT_FOUND}
-        try:
-            return switch[status]
-        except:
-            return ERR_NONE
\ No newline at end of file
+          if not self.gpio.value:
+              return True
+          start = ticks_ms()
+          while self.gpio.value:
+              yield_()
+              if abs(ticks_diff(start, ticks_ms())) >= timeout:
+                  return False
+        return True
+
+#GFSK methods live in sx126x_fsk. Each starts as a stub that binds all of them to the class
+#on its first call, so a LoRa only gateway never loads the module. A class __getattr__ would
+#do the same but CPython then builds a bound method on every self.method() call
+FSK_METHODS = ('beginFSK', 'setFrequencyDeviation', 'setBitRate', 'setRxBandwidth', 'setDataShaping',
+               'setSyncBits', 'setNodeAddress', 'setBroadcastAddress', 'disableAddressFiltering',
+               'setWhitening', 'fixedPacketLengthMode', 'variablePacketLengthMode', 'setPacketMode',
+               'setModulationParamsFSK', 'setPacketParamsFSK')
+
+def _fskStub(name):
+    def stub(self, *args, **kwargs):
+        import sx126x_fsk
+        sx126x_fsk.bind(SX126X, name)
+        return getattr(SX126X, name)(self, *args, **kwargs)
+    return stub
+
+for _name in FSK_METHODS:
+    setattr(SX126X, _name, _fskStub(_name))
@@ -0,0 +1,524 @@
+#only the names used here, a star import would copy the whole constant table into this module
+from _sx126x import (ASSERT, ERROR, SX126XError, ERR_NONE, ERR_CRC_MISMATCH, ERR_INVALID_FREQUENCY,
+                     ERR_INVALID_OUTPUT_POWER, ERR_INVALID_PACKET_TYPE, ERR_INVALID_SLEEP_PERIOD, SX126X_MAX_PACKET_LENGTH,
+                     SX126X_IRQ_RX_DONE, SX126X_IRQ_TX_DONE, SX126X_IRQ_PREAMBLE_DETECTED, SX126X_IRQ_HEADER_VALID,
+                     SX126X_SYNC_WORD_PRIVATE, SX126X_PA_CONFIG_HP_MAX,
+                     SX126X_REG_OCP_CONFIGURATION, SX126X_GFSK_ADDRESS_FILT_OFF, SX126X_GFSK_ADDRESS_FILT_NODE,
+                     SX126X_GFSK_ADDRESS_FILT_NODE_BROADCAST, SX126X_GFSK_PREAMBLE_DETECT_OFF,
+                     SX126X_GFSK_PREAMBLE_DETECT_8, SX126X_GFSK_PREAMBLE_DETECT_16, SX126X_GFSK_PREAMBLE_DETECT_24,
+                     SX126X_GFSK_PREAMBLE_DETECT_32, SX126X_CAL_IMG_430_MHZ_1, SX126X_CAL_IMG_430_MHZ_2,
+                     SX126X_CAL_IMG_470_MHZ_1, SX126X_CAL_IMG_470_MHZ_2, SX126X_CAL_IMG_779_MHZ_1,
+                     SX126X_CAL_IMG_779_MHZ_2, SX126X_CAL_IMG_863_MHZ_1, SX126X_CAL_IMG_863_MHZ_2,
+                     SX126X_CAL_IMG_902_MHZ_1, SX126X_CAL_IMG_902_MHZ_2, SX126X_DIV_EXPONENT, SX126X_CRYSTAL_FREQ,
+                     SX126X_LORA_BW_125_0, SX126X_LORA_BW_250_0, SX126X_LORA_BW_500_0,
+                     SX126X_LORA_LOW_DATA_RATE_OPTIMIZE_OFF, SX126X_LORA_LOW_DATA_RATE_OPTIMIZE_ON,
+                     SX126X_CAD_ON_2_SYMB, SX126X_CAD_ON_4_SYMB, ERR_UNKNOWN, ERR_WRONG_MODEM,
+                     SX126X_PACKET_TYPE_LORA, SX126X_PACKET_TYPE_GFSK, SX126X_REG_LORA_SYNC_WORD_MSB,
+                     SX126X_REG_WHITENING_INITIAL_MSB, SX126X_REG_CRC_INITIAL_MSB, SX126X_REG_NODE_ADDRESS,
+                     SX126X_GFSK_PACKET_VARIABLE)
+from sx126x import SX126X, loraTimeOnAir, fskTimeOnAir, rxDutyCyclePeriods, ticks_us, ticks_diff
+
+#1 compiles in the hot path probes of probes.py, 0 leaves no trace of them
+_PROBES = const(0)
+if _PROBES:
+    from probes import PROBES, P_READ
+
+#LoRaWAN downlink bandwidths in kHz and their SetModulationParams codes
+_TX_BW = {125: SX126X_LORA_BW_125_0, 250: SX126X_LORA_BW_250_0, 500: SX126X_LORA_BW_500_0}
+_PROFILE_CACHE = const(8)
+
+#CAD symbols and detPeak per SF for listen before talk, from Semtech AN1200.48, detMin is 10
+_CAD_PARAMS = {5: (SX126X_CAD_ON_2_SYMB, 22), 6: (SX126X_CAD_ON_2_SYMB, 22), 7: (SX126X_CAD_ON_2_SYMB, 22),
+               8: (SX126X_CAD_ON_2_SYMB, 22), 9: (SX126X_CAD_ON_4_SYMB, 23), 10: (SX126X_CAD_ON_4_SYMB, 24),
+               11: (SX126X_CAD_ON_4_SYMB, 25), 12: (SX126X_CAD_ON_4_SYMB, 28)}
+_CAD_DET_MIN = const(10)
+
+#register ranges a profile carries per modem as (address, length): the LoRa sync word, and for
+#GFSK the whitening seed, CRC seed and polynomial with the sync word, node and broadcast address
+_PROFILE_REGS = {SX126X_PACKET_TYPE_LORA: ((SX126X_REG_LORA_SYNC_WORD_MSB, 2),),
+                 SX126X_PACKET_TYPE_GFSK: ((SX126X_REG_WHITENING_INITIAL_MSB, 2), (SX126X_REG_CRC_INITIAL_MSB, 12),
+                                           (SX126X_REG_NODE_ADDRESS, 2))}
+
+#frame being received, or received and not read yet
+_RX_BUSY = SX126X_IRQ_PREAMBLE_DETECTED | SX126X_IRQ_HEADER_VALID | SX126X_IRQ_RX_DONE
+
+#CalibrateImage band covering freq
+def _imageBand(freq):
+    if freq > 900.0:
+        return bytes((SX126X_CAL_IMG_902_MHZ_1, SX126X_CAL_IMG_902_MHZ_2))
+    elif freq > 850.0:
+        return bytes((SX126X_CAL_IMG_863_MHZ_1, SX126X_CAL_IMG_863_MHZ_2))
+    elif freq > 770.0:
+        return bytes((SX126X_CAL_IMG_779_MHZ_1, SX126X_CAL_IMG_779_MHZ_2))
+    elif freq > 460.0:
+        return bytes((SX126X_CAL_IMG_470_MHZ_1, SX126X_CAL_IMG_470_MHZ_2))
+    return bytes((SX126X_CAL_IMG_430_MHZ_1, SX126X_CAL_IMG_430_MHZ_2))
+
+class SX126XChip(SX126X):
+    """
+    Shared driver for the SX1261, SX1262 and SX1268. A chip subclass only sets
+    its PA configuration and its power and frequency ranges, the RX, TX and IRQ
+    paths live here once.
+    """
+    TX_DONE = SX126X_IRQ_TX_DONE
+    RX_DONE = SX126X_IRQ_RX_DONE
+    ADDR_FILT_OFF = SX126X_GFSK_ADDRESS_FILT_OFF
+    ADDR_FILT_NODE = SX126X_GFSK_ADDRESS_FILT_NODE
+    ADDR_FILT_NODE_BROAD = SX126X_GFSK_ADDRESS_FILT_NODE_BROADCAST
+    PREAMBLE_DETECT_OFF = SX126X_GFSK_PREAMBLE_DETECT_OFF
+    PREAMBLE_DETECT_8 = SX126X_GFSK_PREAMBLE_DETECT_8
+    PREAMBLE_DETECT_16 = SX126X_GFSK_PREAMBLE_DETECT_16
+    PREAMBLE_DETECT_24 = SX126X_GFSK_PREAMBLE_DETECT_24
+    PREAMBLE_DETECT_32 = SX126X_GFSK_PREAMBLE_DETECT_32
+    STATUS = ERROR
+
+    #SetPaConfig deviceSel and hpMax, output power and frequency limits
+    PA_DEVICE_SEL = 0x00
+    PA_HP_MAX = SX126X_PA_CONFIG_HP_MAX
+    POWER_MIN = -9
+    POWER_MAX = 22
+    FREQ_MIN = 150.0
+    FREQ_MAX = 960.0
+
+    def __init__(self, spi_bus, clk, mosi, miso, cs, irq, rst, gpio):
+        super().__init__(spi_bus, clk, mosi, miso, cs, irq, rst, gpio)
+        self._callbackFunction = self._dummyFunction
+        self._obj = None
+
+        #what the chip is currently tuned to, so a retune only sends what changed
+        self._frf = 0
+        self._power = None
+        self._imageBand = None
+        self._rxProfile = None
+        self._profiles = {}
+        self._named = {}
+        self._restoreUs = 0
+        self._cadSf = 0
+        #(wake, sleep) us of the RX duty cycle, None listens continuously
+        self._rxDuty = None
+
+    def begin(self, freq=434.0, bw=125.0, sf=9, cr=7, syncWord=SX126X_SYNC_WORD_PRIVATE,
+              power=14, currentLimit=60.0, preambleLength=8, implicit=False, implicitLen=0xFF,
+              crcOn=True, txIq=False, rxIq=False, tcxoVoltage=1.6, useRegulatorLDO=False,
+              blocking=True):
+        #register writes of the whole setup go out merged before RX or standby
+        super().beginRegisters()
+        try:
+            state = super().begin(bw, sf, cr, syncWord, currentLimit, preambleLength, tcxoVoltage, useRegulatorLDO, txIq, rxIq)
+            ASSERT(state)
+            #begin wrote generic CAD settings
+            self._cadSf = 0
+
+            if not implicit:
+                state = super().explicitHeader()
+            else:
+                state = super().implicitHeader(implicitLen)
+            ASSERT(state)
+
+            state = super().setCRC(crcOn)
+            ASSERT(state)
+
+            state = self.setFrequency(freq)
+            ASSERT(state)
+
+            state = self.setOutputPower(power)
+            ASSERT(state)
+
+            state = super().fixPaClamping()
+            ASSERT(state)
+        finally:
+            flushed = super().flushRegisters()
+        ASSERT(flushed)
+
+        state = self.setBlockingCallback(blocking)
+
+        return state
+
+    def setFrequency(self, freq, calibrate=True):
+        if freq < self.FREQ_MIN or freq > self.FREQ_MAX:
+            return ERR_INVALID_FREQUENCY
+
+        state = ERR_NONE
+
+        if calibrate:
+            band = _imageBand(freq)
+            state = super().calibrateImage(band)
+            ASSERT(state)
+            self._imageBand = band
+
+        self._frf = int((freq * (1 << SX126X_DIV_EXPONENT)) / SX126X_CRYSTAL_FREQ)
+        return super().setRfFrequency(self._frf)
+
+    def setOutputPower(self, power):
+        if not ((power >= self.POWER_MIN) and (power <= self.POWER_MAX)):
+            return ERR_INVALID_OUTPUT_POWER
+
+        ocp = bytearray(1)
+        ocp_mv = memoryview(ocp)
+        state = super().readRegister(SX126X_REG_OCP_CONFIGURATION, ocp_mv, 1)
+        ASSERT(state)
+
+        state = super().setPaConfig(0x04, self.PA_DEVICE_SEL, self.PA_HP_MAX)
+        ASSERT(state)
+
+        state = super().setTxParams(power)
+        ASSERT(state)
+        self._power = power
+
+        return super().writeRegister(SX126X_REG_OCP_CONFIGURATION, ocp, 1)
+
+    #precomputed downlink settings, returns (state, profile). Profiles are cached
+    #so a repeated RX1/RX2 channel costs a dict lookup
+    def txProfile(self, freq, sf, bw, power, txIq):
+        key = (freq, sf, bw, power, txIq)
+        profile = self._profiles.get(key)
+        if profile is not None:
+            return ERR_NONE, profile
+        if freq < self.FREQ_MIN or freq > self.FREQ_MAX:
+            return ERR_INVALID_FREQUENCY, None
+        if not ((power >= self.POWER_MIN) and (power <= self.POWER_MAX)):
+            return ERR_INVALID_OUTPUT_POWER, None
+        if not ((sf >= 5) and (sf <= 12)) or bw not in _TX_BW:
+            return ERR_INVALID_PACKET_TYPE, None
+        ldro = self._ldro
+        if self._ldroAuto:
+            if (1 << sf) / bw >= 16.0:
+                ldro = SX126X_LORA_LOW_DATA_RATE_OPTIMIZE_ON
+            else:
+                ldro = SX126X_LORA_LOW_DATA_RATE_OPTIMIZE_OFF
+        frf = int((freq * (1 << SX126X_DIV_EXPONENT)) / SX126X_CRYSTAL_FREQ)
+        profile = (frf, _imageBand(freq), SX126X_PACKET_TYPE_LORA, (sf, _TX_BW[bw], bw, self._cr, ldro),
+                   power, txIq, None, None)
+        if len(self._profiles) >= _PROFILE_CACHE:
+            self._profiles = {}
+        self._profiles[key] = profile
+        return ERR_NONE, profile
+
+    #GFSK downlink settings at the bit rate and deviation the radio listens with, returns
+    #(state, profile) like txProfile and shares its cache
+    def fskTxProfile(self, freq, power):
+        key = (freq, power)
+        profile = self._profiles.get(key)
+        if profile is not None:
+            return ERR_NONE, profile
+        if freq < self.FREQ_MIN or freq > self.FREQ_MAX:
+            return ERR_INVALID_FREQUENCY, None
+        if not ((power >= self.POWER_MIN) and (power <= self.POWER_MAX)):
+            return ERR_INVALID_OUTPUT_POWER, None
+        frf = int((freq * (1 << SX126X_DIV_EXPONENT)) / SX126X_CRYSTAL_FREQ)
+        profile = (frf, _imageBand(freq), SX126X_PACKET_TYPE_GFSK, self._modulation(SX126X_PACKET_TYPE_GFSK),
+                   power, None, None, None)
+        if len(self._profiles) >= _PROFILE_CACHE:
+            self._profiles = {}
+        self._profiles[key] = profile
+        return ERR_NONE, profile
+
+    #modulation settings of modem as kept in the driver, LoRa (sf, bw, bwKhz, cr, ldro),
+    #GFSK (br, pulseShape, rxBw, rxBwKhz, freqDev)
+    def _modulation(self, modem):
+        if modem == SX126X_PACKET_TYPE_LORA:
+            return (self._sf, self._bw, self._bwKhz, self._cr, self._ldro)
+        return (self._br, self._pulseShape, self._rxBw, self._rxBwKhz, self._freqDev)
+
+    #what a downlink profile changes, packet settings and registers are left alone
+    def currentProfile(self):
+        modem = super().getPacketType()
+        return (self._frf, self._imageBand, modem, self._modulation(modem), self._power, self._txIq, None, None)
+
+    #full radio state as a profile, returns (state, profile): packet type, frequency, modulation,
+    #power, packet settings and the sync word, CRC and whitening registers. The registers are
+    #read back once, after that they come from the shadow
+    def snapshot(self):
+        modem = super().getPacketType()
+        if modem == SX126X_PACKET_TYPE_LORA:
+            packet = (self._preambleLength, self._crcType, self._headerType, self._implicitLen, self._rxIq)
+        elif modem == SX126X_PACKET_TYPE_GFSK:
+            packet = (self._preambleLengthFSK, self._crcTypeFSK, self._syncWordLength, self._addrComp,
+                      self._whitening, self._packetType, self._packetLength, self._preambleDetectorLength)
+        else:
+            return ERR_WRONG_MODEM, None
+        shadow = self._regShadow
+        regs = []
+        for addr, n in _PROFILE_REGS[modem]:
+            data = shadow.get(addr)
+            if data is None:
+                buf = bytearray(n)
+                state = super().readRegister(addr, buf, n)
+                if state != ERR_NONE:
+                    return state, None
+                data = bytes(buf)
+                shadow[addr] = data
+            regs.append((addr, data))
+        return ERR_NONE, (self._frf, self._imageBand, modem, self._modulation(modem), self._power,
+                          self._txIq, packet, tuple(regs))
+
+    #snapshot kept under name, for loadProfile()
+    def saveProfile(self, name):
+        state, profile = self.snapshot()
+        if state == ERR_NONE:
+            self._named[name] = profile
+        return state
+
+    def loadProfile(self, name):
+        profile = self._named.get(name)
+        if profile is None:
+            return ERR_UNKNOWN
+        return self.applyProfile(profile)
+
+    #switches to a TX profile, the RX settings are put back when TX_DONE fires
+    def retune(self, profile):
+        if self._rxProfile is None:
+            self._rxProfile = self.currentProfile()
+        return self.applyProfile(profile)
+
+    #only what differs from the shadow is sent: the packet type, image calibration on a band
+    #change, frequency, modulation, power and the registers merged into as few writes as they
+    #allow. Packet settings go out with the next TX or RX start. The radio is left in standby
+    #after a packet type change, else in the mode it was in
+    def applyProfile(self, profile):
+        frf, band, modem, mod, power, txIq, packet, regs = profile
+        switch = modem != super().getPacketType()
+        if switch:
+            ASSERT(super().standby())
+            ASSERT(super().setPacketType(modem))
+            self._cadSf = 0
+        if band != self._imageBand and band is not None:
+            ASSERT(super().calibrateImage(band))
+            self._imageBand = band
+        if frf != self._frf:
+            ASSERT(super().setRfFrequency(frf))
+            self._frf = frf
+        if switch or mod != self._modulation(modem):
+            if modem == SX126X_PACKET_TYPE_LORA:
+                ASSERT(super().setModulationParamsRaw(mod[0], mod[1], mod[3], mod[4]))
+                self._sf, self._bw, self._bwKhz, self._cr, self._ldro = mod
+            else:
+                ASSERT(self.setModulationParamsFSK(mod[0], mod[1], mod[2], mod[4]))
+                self._br, self._pulseShape, self._rxBw, self._rxBwKhz, self._freqDev = mod
+        if power != self._power and power is not None:
+            ASSERT(super().setTxParams(power))
+            self._power = power
+        if txIq is not None:
+            self._txIq = txIq
+        if packet is not None:
+            if modem == SX126X_PACKET_TYPE_LORA:
+                self._preambleLength, self._crcType, self._headerType, self._implicitLen, self._rxIq = packet
+            else:
+                (self._preambleLengthFSK, self._crcTypeFSK, self._syncWordLength, self._addrComp,
+                 self._whitening, self._packetType, self._packetLength, self._preambleDetectorLength) = packet
+        if regs is not None:
+            shadow = self._regShadow
+            super().beginRegisters()
+            for addr, data in regs:
+                if shadow.get(addr) != data:
+                    super().writeRegister(addr, data, len(data))
+            ASSERT(super().flushRegisters())
+            for addr, data in regs:
+                shadow[addr] = data
+        return ERR_NONE
+
+    #time on air of len_ bytes sent with profile, no SPI access
+    def profileTimeOnAir(self, profile, len_):
+        mod = profile[3]
+        if profile[2] == SX126X_PACKET_TYPE_GFSK:
+            return fskTimeOnAir(len_, SX126X_CRYSTAL_FREQ * 32000.0 / mod[0], self._preambleLengthFSK,
+                                self._syncWordLength, self.getCrcBytesFSK(), self._packetType == SX126X_GFSK_PACKET_VARIABLE)
+        return loraTimeOnAir(len_, mod[0], mod[2], mod[3], self._preambleLength, self._crcType, self._headerType)
+
+    #non zero while a frame is on its way in, TX now would cut it off
+    def rxBusy(self):
+        return super().getIrqStatus() & _RX_BUSY
+
+    #drops a preamble detection that never turned into a frame
+    def clearRxBusy(self):
+        return super().clearIrqStatus(SX126X_IRQ_PREAMBLE_DETECTED | SX126X_IRQ_HEADER_VALID)
+
+    #CAD on the channel and SF the radio is tuned to, returns CHANNEL_FREE or LORA_DETECTED.
+    #The radio is left in standby, follow with a TX or restoreRx()
+    def lbtScan(self):
+        sf = self._sf
+        if sf != self._cadSf:
+            symbolNum, detPeak = _CAD_PARAMS[sf]
+            ASSERT(super().setCadParams(symbolNum, detPeak, _CAD_DET_MIN))
+            self._cadSf = sf
+        return super().scanChannel()
+
+    #duration of one lbtScan() with a TX profile, no SPI access
+    def cadTime(self, profile):
+        mod = profile[3]
+        sf = mod[0]
+        return int(((1 << _CAD_PARAMS[sf][0]) + 1) * (1000 << sf) / mod[2])
+
+    #RX settings back and RX re-armed, after TX_DONE or a TX given up
+    def restoreRx(self):
+        t = ticks_us()
+        if self._rxProfile is not None:
+            self.applyProfile(self._rxProfile)
+            self._rxProfile = None
+        state = self.startListen()
+        self._restoreUs = ticks_diff(ticks_us(), t)
+        return state
+
+    #RX duty cycle sized for senders with a preamble of senderPreambleLength symbols, 0 for
+    #continuous RX. Every re-arm, callback mode, after RX_DONE and after TX_DONE, listens this
+    #way. Returns ERR_INVALID_SLEEP_PERIOD when the preamble is too short to sleep between windows.
+    #The windows are sized at the current SF and bandwidth, call again after changing them
+    def setRxDutyCycle(self, senderPreambleLength, minSymbols=8):
+        if senderPreambleLength == 0:
+            self._rxDuty = None
+        else:
+            if super().getPacketType() != SX126X_PACKET_TYPE_LORA:
+                return ERR_WRONG_MODEM
+            periods = rxDutyCyclePeriods(senderPreambleLength, minSymbols, self._sf, self._bwKhz, self._tcxoDelay)
+            if periods is None:
+                return ERR_INVALID_SLEEP_PERIOD
+            self._rxDuty = periods
+        if not self.blocking:
+            return self.startListen()
+        return ERR_NONE
+
+    #(wake, sleep) us of the RX duty cycle, None when listening continuously
+    def getRxDutyCycle(self):
+        return self._rxDuty
+
+    #RX armed the way setRxDutyCycle() chose
+    def startListen(self):
+        if self._rxDuty is None:
+            return super().startReceive()
+        return super().startReceiveDutyCycle(self._rxDuty[0], self._rxDuty[1])
+
+    #time spent putting the RX settings back and re-arming RX after the last downlink
+    def getRestoreTime(self):
+        return self._restoreUs
+
+    def setTxIq(self, txIq):
+        self._txIq = txIq
+
+    def setRxIq(self, rxIq):
+        self._rxIq = rxIq
+        if not self.blocking:
+            ASSERT(self.startListen())
+
+    def setPreambleDetectorLength(self, preambleDetectorLength):
+        self._preambleDetectorLength = preambleDetectorLength
+        if not self.blocking:
+            ASSERT(self.startListen())
+
+    #callback is called as callback(events, obj) on every chip
+    def setBlockingCallback(self, blocking, callback=None, obj=None):
+        self.blocking = blocking
+        if not self.blocking:
+            state = self.startListen()
+            ASSERT(state)
+            if callback != None:
+                self._obj = obj
+                self._callbackFunction = callback
+                super().setDio1Action(self._onIRQ)
+            else:
+                self._obj = None
+                self._callbackFunction = self._dummyFunction
+                super().clearDio1Action()
+            return state
+        else:
+            state = super().standby()
+            ASSERT(state)
+            self._obj = None
+            self._callbackFunction = self._dummyFunction
+            super().clearDio1Action()
+            return state
+
+    def recv(self, len=0, timeout_en=False, timeout_ms=0):
+        if not self.blocking:
+            return self._readData(len)
+        else:
+            return self._receive(len, timeout_en, timeout_ms)
+
+    def send(self, data):
+        if not self.blocking:
+            return self._startTransmit(data)
+        else:
+            return self._transmit(data)
+
+    def _events(self):
+        return super().getIrqStatus()
+
+    def _receive(self, len_=0, timeout_en=False, timeout_ms=0):
+        state = ERR_NONE
+        
+        length = len_
+        
+        if len_ == 0:
+            length = SX126X_MAX_PACKET_LENGTH
+
+        data = bytearray(length)
+        data_mv = memoryview(data)
+
+        try:
+            state = super().receive(data_mv, length, timeout_en, timeout_ms)
+        except SX126XError as e:
+            state = e.state
+
+        if state == ERR_NONE or state == ERR_CRC_MISMATCH:
+            if len_ == 0:
+                length = super().getPacketLength(False)
+                data = data[:length]
+
+        else:
+            return b'', state
+
+        return  bytes(data), state
+
+    def _transmit(self, data):
+        if isinstance(data, bytes) or isinstance(data, bytearray):
+            pass
+        else:
+            return 0, ERR_INVALID_PACKET_TYPE
+
+        state = super().transmit(data, len(data))
+        return len(data), state
+
+    def _readData(self, len_=0):
+        if _PROBES:
+            PROBES.enter(P_READ)
+        state = ERR_NONE
+
+        length = super().getPacketLength()
+
+        if len_ < length and len_ != 0:
+            length = len_
+
+        data = bytearray(length)
+        data_mv = memoryview(data)
+
+        try:
+            state = super().readData(data_mv, length)
+        except SX126XError as e:
+            state = e.state
+
+        ASSERT(self.startListen())
+        if _PROBES:
+            PROBES.exit(P_READ)
+
+        if state == ERR_NONE or state == ERR_CRC_MISMATCH:
+            return bytes(data), state
+
+        else:
+            return b'', state
+
+    def _startTransmit(self, data):
+        if isinstance(data, bytes) or isinstance(data, bytearray):
+            pass
+        else:
+            return 0, ERR_INVALID_PACKET_TYPE
+
+        state = super().startTransmit(data, len(data))
+        return len(data), state
+
+    def _dummyFunction(self, *args):
+        pass
+
+    def _onIRQ(self, callback):
+        events = self._events()
+        if events & SX126X_IRQ_TX_DONE:
+            self.restoreRx()
+        self._callbackFunction(events, self._obj)
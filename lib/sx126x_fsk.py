@@ -0,0 +1,362 @@
+#only the names used here, a star import would copy the whole constant table into this module
+from _sx126x import (ASSERT, ERR_NONE, ERR_UNKNOWN, ERR_WRONG_MODEM, ERR_INVALID_BIT_RATE, ERR_INVALID_DATA_SHAPING,
+                     ERR_INVALID_FREQUENCY_DEVIATION, ERR_INVALID_RX_BANDWIDTH, ERR_INVALID_SYNC_WORD,
+                     SX126X_CMD_SET_MODULATION_PARAMS, SX126X_CMD_SET_PACKET_PARAMS, SX126X_CRYSTAL_FREQ,
+                     SX126X_MAX_PACKET_LENGTH, SX126X_PACKET_TYPE_GFSK, SX126X_REG_BROADCAST_ADDRESS,
+                     SX126X_REG_NODE_ADDRESS, SX126X_REG_SYNC_WORD_0, SX126X_REG_WHITENING_INITIAL_MSB,
+                     SX126X_GFSK_ADDRESS_FILT_OFF, SX126X_GFSK_ADDRESS_FILT_NODE,
+                     SX126X_GFSK_ADDRESS_FILT_NODE_BROADCAST, SX126X_GFSK_CRC_2_BYTE_INV, SX126X_GFSK_FILTER_NONE,
+                     SX126X_GFSK_FILTER_GAUSS_0_3, SX126X_GFSK_FILTER_GAUSS_0_5, SX126X_GFSK_FILTER_GAUSS_0_7,
+                     SX126X_GFSK_FILTER_GAUSS_1, SX126X_GFSK_PACKET_FIXED, SX126X_GFSK_PACKET_VARIABLE,
+                     SX126X_GFSK_PREAMBLE_DETECT_16, SX126X_GFSK_WHITENING_OFF, SX126X_GFSK_WHITENING_ON,
+                     SX126X_GFSK_RX_BW_4_8, SX126X_GFSK_RX_BW_5_8, SX126X_GFSK_RX_BW_7_3, SX126X_GFSK_RX_BW_9_7,
+                     SX126X_GFSK_RX_BW_11_7, SX126X_GFSK_RX_BW_14_6, SX126X_GFSK_RX_BW_19_5, SX126X_GFSK_RX_BW_23_4,
+                     SX126X_GFSK_RX_BW_29_3, SX126X_GFSK_RX_BW_39_0, SX126X_GFSK_RX_BW_46_9, SX126X_GFSK_RX_BW_58_6,
+                     SX126X_GFSK_RX_BW_78_2, SX126X_GFSK_RX_BW_93_8, SX126X_GFSK_RX_BW_117_3, SX126X_GFSK_RX_BW_156_2,
+                     SX126X_GFSK_RX_BW_187_2, SX126X_GFSK_RX_BW_234_3, SX126X_GFSK_RX_BW_312_0,
+                     SX126X_GFSK_RX_BW_373_6, SX126X_GFSK_RX_BW_467_0)
+
+from sx126x import FSK_METHODS as METHODS
+
+#GFSK only part of the driver. SX126X binds these functions as methods the first
+#time one of them is called, so a LoRa only gateway never loads this module.
+def bind(cls, name):
+    if name not in METHODS:
+        return False
+    g = globals()
+    for m in METHODS:
+        setattr(cls, m, g[m])
+    return True
+
+def beginFSK(self, freq=434.0, br=48.0, freqDev=50.0, rxBw=156.2, power=14, currentLimit=60.0,
+             preambleLength=16, dataShaping=0.5, syncWord=[0x2D, 0x01], syncBitsLength=16,
+             addrFilter=SX126X_GFSK_ADDRESS_FILT_OFF, addr=0x00, crcLength=2, crcInitial=0x1D0F, crcPolynomial=0x1021,
+             crcInverted=True, whiteningOn=True, whiteningInitial=0x0100,
+             fixedPacketLength=False, packetLength=0xFF, preambleDetectorLength=SX126X_GFSK_PREAMBLE_DETECT_16,
+             tcxoVoltage=1.6, useRegulatorLDO=False,
+             blocking=True):
+    #register writes of the whole setup go out merged before RX or standby
+    self.beginRegisters()
+    try:
+        state = _setup(self, br, freqDev, rxBw, currentLimit, preambleLength, dataShaping, preambleDetectorLength, tcxoVoltage, useRegulatorLDO)
+        ASSERT(state)
+
+        state = self.setSyncBits(syncWord, syncBitsLength)
+        ASSERT(state)
+
+        if addrFilter == SX126X_GFSK_ADDRESS_FILT_OFF:
+            state = self.disableAddressFiltering()
+        elif addrFilter == SX126X_GFSK_ADDRESS_FILT_NODE:
+            state = self.setNodeAddress(addr)
+        elif addrFilter == SX126X_GFSK_ADDRESS_FILT_NODE_BROADCAST:
+            state = self.setBroadcastAddress(addr)
+        else:
+            state = ERR_UNKNOWN
+        ASSERT(state)
+
+        state = self.setCRC(crcLength, crcInitial, crcPolynomial, crcInverted)
+        ASSERT(state)
+
+        state = self.setWhitening(whiteningOn, whiteningInitial)
+        ASSERT(state)
+
+        if fixedPacketLength:
+            state = self.fixedPacketLengthMode(packetLength)
+        else:
+            state = self.variablePacketLengthMode(packetLength)
+        ASSERT(state)
+
+        state = self.setFrequency(freq)
+        ASSERT(state)
+
+        state = self.setOutputPower(power)
+        ASSERT(state)
+
+        state = self.fixPaClamping()
+        ASSERT(state)
+    finally:
+        flushed = self.flushRegisters()
+    ASSERT(flushed)
+
+    state = self.setBlockingCallback(blocking)
+
+    return state
+
+def _setup(self, br, freqDev, rxBw, currentLimit, preambleLength, dataShaping, preambleDetectorLength, tcxoVoltage, useRegulatorLDO=False):
+    self._br = 21333
+    self._freqDev = 52428
+    self._rxBw = SX126X_GFSK_RX_BW_156_2
+    self._rxBwKhz = 156.2
+    self._pulseShape = SX126X_GFSK_FILTER_GAUSS_0_5
+    self._crcTypeFSK = SX126X_GFSK_CRC_2_BYTE_INV
+    self._preambleLengthFSK = preambleLength
+    self._addrComp = SX126X_GFSK_ADDRESS_FILT_OFF
+    self._preambleDetectorLength = preambleDetectorLength
+
+    state = self.reset()
+    ASSERT(state)
+
+    state = self.standby()
+    ASSERT(state)
+
+    state = self.config(SX126X_PACKET_TYPE_GFSK)
+    ASSERT(state)
+
+    if tcxoVoltage > 0.0:
+        state = self.setTCXO(tcxoVoltage)
+        ASSERT(state)
+
+    state = self.setBitRate(br)
+    ASSERT(state)
+
+    state = self.setFrequencyDeviation(freqDev)
+    ASSERT(state)
+
+    state = self.setRxBandwidth(rxBw)
+    ASSERT(state)
+
+    state = self.setCurrentLimit(currentLimit)
+    ASSERT(state)
+
+    state = self.setDataShaping(dataShaping)
+    ASSERT(state)
+
+    state = self.setPreambleLength(preambleLength)
+    ASSERT(state)
+
+    sync = [0x2D, 0x01]
+    state = self.setSyncWord(sync, 2)
+    ASSERT(state)
+
+    state = self.setWhitening(True, 0x0100)
+    ASSERT(state)
+
+    state = self.variablePacketLengthMode(SX126X_MAX_PACKET_LENGTH)
+    ASSERT(state)
+
+    state = self.setDio2AsRfSwitch(True)
+    ASSERT(state)
+
+    if useRegulatorLDO:
+        state = self.setRegulatorLDO()
+    else:
+        state = self.setRegulatorDCDC()
+
+    return state
+
+
+def setFrequencyDeviation(self, freqDev):
+    if self.getPacketType() != SX126X_PACKET_TYPE_GFSK:
+        return ERR_WRONG_MODEM
+
+    if not (freqDev <= 200.0):
+        return ERR_INVALID_FREQUENCY_DEVIATION
+
+    freqDevRaw = int(((freqDev * 1000.0) * float(1 << 25)) / (SX126X_CRYSTAL_FREQ * 1000000.0))
+
+    self._freqDev = freqDevRaw
+    return self.setModulationParamsFSK(self._br, self._pulseShape, self._rxBw, self._freqDev)
+
+
+def setBitRate(self, br):
+    if self.getPacketType() != SX126X_PACKET_TYPE_GFSK:
+        return ERR_WRONG_MODEM
+
+    if not ((br >= 0.6) and (br <= 300.0)):
+        return ERR_INVALID_BIT_RATE
+
+    brRaw = int((SX126X_CRYSTAL_FREQ * 1000000.0 * 32.0) / (br * 1000.0))
+
+    self._br = brRaw
+
+    return self.setModulationParamsFSK(self._br, self._pulseShape, self._rxBw, self._freqDev)
+
+
+def setRxBandwidth(self, rxBw):
+    if self.getPacketType() != SX126X_PACKET_TYPE_GFSK:
+        return ERR_WRONG_MODEM
+
+    self._rxBwKhz = rxBw
+
+    if abs(rxBw - 4.8) <= 0.001:
+        self._rxBw = SX126X_GFSK_RX_BW_4_8
+    elif abs(rxBw - 5.8) <= 0.001:
+        self._rxBw = SX126X_GFSK_RX_BW_5_8
+    elif abs(rxBw - 7.3) <= 0.001:
+        self._rxBw = SX126X_GFSK_RX_BW_7_3
+    elif abs(rxBw - 9.7) <= 0.001:
+        self._rxBw = SX126X_GFSK_RX_BW_9_7
+    elif abs(rxBw - 11.7) <= 0.001:
+        self._rxBw = SX126X_GFSK_RX_BW_11_7
+    elif abs(rxBw - 14.6) <= 0.001:
+        self._rxBw = SX126X_GFSK_RX_BW_14_6
+    elif abs(rxBw - 19.5) <= 0.001:
+        self._rxBw = SX126X_GFSK_RX_BW_19_5
+    elif abs(rxBw - 23.4) <= 0.001:
+        self._rxBw = SX126X_GFSK_RX_BW_23_4
+    elif abs(rxBw - 29.3) <= 0.001:
+        self._rxBw = SX126X_GFSK_RX_BW_29_3
+    elif abs(rxBw - 39.0) <= 0.001:
+        self._rxBw = SX126X_GFSK_RX_BW_39_0
+    elif abs(rxBw - 46.9) <= 0.001:
+        self._rxBw = SX126X_GFSK_RX_BW_46_9
+    elif abs(rxBw - 58.6) <= 0.001:
+        self._rxBw = SX126X_GFSK_RX_BW_58_6
+    elif abs(rxBw - 78.2) <= 0.001:
+        self._rxBw = SX126X_GFSK_RX_BW_78_2
+    elif abs(rxBw - 93.8) <= 0.001:
+        self._rxBw = SX126X_GFSK_RX_BW_93_8
+    elif abs(rxBw - 117.3) <= 0.001:
+        self._rxBw = SX126X_GFSK_RX_BW_117_3
+    elif abs(rxBw - 156.2) <= 0.001:
+        self._rxBw = SX126X_GFSK_RX_BW_156_2
+    elif abs(rxBw - 187.2) <= 0.001:
+        self._rxBw = SX126X_GFSK_RX_BW_187_2
+    elif abs(rxBw - 234.3) <= 0.001:
+        self._rxBw = SX126X_GFSK_RX_BW_234_3
+    elif abs(rxBw - 312.0) <= 0.001:
+        self._rxBw = SX126X_GFSK_RX_BW_312_0
+    elif abs(rxBw - 373.6) <= 0.001:
+        self._rxBw = SX126X_GFSK_RX_BW_373_6
+    elif abs(rxBw - 467.0) <= 0.001:
+        self._rxBw = SX126X_GFSK_RX_BW_467_0
+    else:
+        return ERR_INVALID_RX_BANDWIDTH
+
+    return self.setModulationParamsFSK(self._br, self._pulseShape, self._rxBw, self._freqDev)
+
+
+def setDataShaping(self, sh):
+    if self.getPacketType() != SX126X_PACKET_TYPE_GFSK:
+        return ERR_WRONG_MODEM
+
+    sh *= 10.0
+    if abs(sh - 0.0) <= 0.001:
+        self._pulseShape = SX126X_GFSK_FILTER_NONE
+    elif abs(sh - 3.0) <= 0.001:
+        self._pulseShape = SX126X_GFSK_FILTER_GAUSS_0_3
+    elif abs(sh - 5.0) <= 0.001:
+        self._pulseShape = SX126X_GFSK_FILTER_GAUSS_0_5
+    elif abs(sh - 7.0) <= 0.001:
+        self._pulseShape = SX126X_GFSK_FILTER_GAUSS_0_7
+    elif abs(sh - 10.0) <= 0.001:
+        self._pulseShape = SX126X_GFSK_FILTER_GAUSS_1
+    else:
+        return ERR_INVALID_DATA_SHAPING
+
+    return self.setModulationParamsFSK(self._br, self._pulseShape, self._rxBw, self._freqDev)
+
+
+def setSyncBits(self, syncWord, bitsLen):
+    if self.getPacketType() != SX126X_PACKET_TYPE_GFSK:
+        return ERR_WRONG_MODEM
+
+    if bitsLen > 0x40:
+        return ERR_INVALID_SYNC_WORD
+
+    bytesLen = int(bitsLen / 8)
+    if (bitsLen % 8) != 0:
+        bytesLen += 1
+
+    state = self.writeRegister(SX126X_REG_SYNC_WORD_0, syncWord, bytesLen)
+    ASSERT(state)
+
+    self._syncWordLength = bitsLen
+    state = self.setPacketParamsFSK(self._preambleLengthFSK, self._crcTypeFSK, self._syncWordLength, self._addrComp, self._whitening, self._packetType, self._packetLength, self._preambleDetectorLength)
+
+    return state
+
+
+def setNodeAddress(self, nodeAddr):
+    if self.getPacketType() != SX126X_PACKET_TYPE_GFSK:
+        return ERR_WRONG_MODEM
+
+    self._addrComp = SX126X_GFSK_ADDRESS_FILT_NODE
+
+    state = self.setPacketParamsFSK(self._preambleLengthFSK, self._crcTypeFSK, self._syncWordLength, self._addrComp, self._whitening, self._packetType, self._packetLength, self._preambleDetectorLength)
+    ASSERT(state)
+
+    state = self.writeRegister(SX126X_REG_NODE_ADDRESS, [nodeAddr], 1)
+
+    return state
+
+
+def setBroadcastAddress(self, broadAddr):
+    if self.getPacketType() != SX126X_PACKET_TYPE_GFSK:
+        return ERR_WRONG_MODEM
+
+    self._addrComp = SX126X_GFSK_ADDRESS_FILT_NODE_BROADCAST
+    state = self.setPacketParamsFSK(self._preambleLengthFSK, self._crcTypeFSK, self._syncWordLength, self._addrComp, self._whitening, self._packetType, self._packetLength, self._preambleDetectorLength)
+    ASSERT(state)
+
+    state = self.writeRegister(SX126X_REG_BROADCAST_ADDRESS, [broadAddr], 1)
+
+    return state
+
+
+def disableAddressFiltering(self):
+    if self.getPacketType() != SX126X_PACKET_TYPE_GFSK:
+        return ERR_WRONG_MODEM
+
+    self._addrComp = SX126X_GFSK_ADDRESS_FILT_OFF
+    return self.setPacketParamsFSK(self._preambleLengthFSK, self._crcTypeFSK, self._syncWordLength, self._addrComp, self._whitening, self._packetType, self._packetLength, self._preambleDetectorLength)
+
+
+def setWhitening(self, enabled, initial=0x0100):
+    if self.getPacketType() != SX126X_PACKET_TYPE_GFSK:
+        return ERR_WRONG_MODEM
+
+    state = ERR_NONE
+    if enabled != True:
+        self._whitening = SX126X_GFSK_WHITENING_OFF
+
+        state = self.setPacketParamsFSK(self._preambleLengthFSK, self._crcTypeFSK, self._syncWordLength, self._addrComp, self._whitening, self._packetType, self._packetLength, self._preambleDetectorLength)
+        ASSERT(state)
+    else:
+        self._whitening = SX126X_GFSK_WHITENING_ON
+        
+        data = bytearray(1)
+        data_mv = memoryview(data)
+        state = self.readRegister(SX126X_REG_WHITENING_INITIAL_MSB, data_mv, 1)
+        ASSERT(state)
+        data2 = [(data[0] & 0xFE) | int((initial >> 8) & 0x01), int(initial & 0xFF)]
+        state = self.writeRegister(SX126X_REG_WHITENING_INITIAL_MSB, data2, 2)
+        ASSERT(state)
+
+        state = self.setPacketParamsFSK(self._preambleLengthFSK, self._crcTypeFSK, self._syncWordLength, self._addrComp, self._whitening, self._packetType, self._packetLength, self._preambleDetectorLength)
+        ASSERT(state)
+    return state
+
+
+def fixedPacketLengthMode(self, len_=SX126X_MAX_PACKET_LENGTH):
+    return self.setPacketMode(SX126X_GFSK_PACKET_FIXED, len_)
+
+
+def variablePacketLengthMode(self, maxLen=SX126X_MAX_PACKET_LENGTH):
+    return self.setPacketMode(SX126X_GFSK_PACKET_VARIABLE, maxLen)
+
+
+def setPacketMode(self, mode, len_):
+    if self.getPacketType() != SX126X_PACKET_TYPE_GFSK:
+        return ERR_WRONG_MODEM
+
+    state = self.setPacketParamsFSK(self._preambleLengthFSK, self._crcTypeFSK, self._syncWordLength, self._addrComp, self._whitening, mode, len_, self._preambleDetectorLength)
+    ASSERT(state)
+
+    self._packetType = mode
+    self._packetLength = len_
+    return state
+
+
+def setModulationParamsFSK(self, br, pulseShape, rxBw, freqDev):
+    data = [int((br >> 16) & 0xFF), int((br >> 8) & 0xFF), int(br & 0xFF),
+            pulseShape, rxBw,
+            int((freqDev >> 16) & 0xFF), int((freqDev >> 8) & 0xFF), int(freqDev & 0xFF)]
+    return self.SPIwriteCommand([SX126X_CMD_SET_MODULATION_PARAMS], 1, data, 8)
+
+
+def setPacketParamsFSK(self, preambleLength, crcType, syncWordLength, addrComp, whitening, packetType=SX126X_GFSK_PACKET_VARIABLE, payloadLength=0xFF, preambleDetectorLength=SX126X_GFSK_PREAMBLE_DETECT_16):
+    data = [int((preambleLength >> 8) & 0xFF), int(preambleLength & 0xFF),
+            preambleDetectorLength, syncWordLength, addrComp,
+            packetType, payloadLength, crcType, whitening]
+    return self.SPIwriteCommand([SX126X_CMD_SET_PACKET_PARAMS], 1, data, 9)
@@ -0,0 +1,115 @@
+from array import array
+
+MTYPE_JOIN_REQUEST = const(0)
+MTYPE_JOIN_ACCEPT = const(1)
+MTYPE_UNCONFIRMED_UP = const(2)
+MTYPE_UNCONFIRMED_DOWN = const(3)
+MTYPE_CONFIRMED_UP = const(4)
+MTYPE_CONFIRMED_DOWN = const(5)
+MTYPE_REJOIN_REQUEST = const(6)
+MTYPE_PROPRIETARY = const(7)
+
+FRAME_FORWARD = const(0)
+FRAME_FOREIGN = const(1)
+FRAME_DOWNLINK = const(2)
+FRAME_MALFORMED = const(3)
+
+#MHDR + FHDR without FOpts + MIC
+_MIN_DATA_LEN = const(12)
+
+#NwkID width for DevAddr types 0..7 (LoRaWAN backend interfaces), the type prefix is type+1 bits
+NWKID_BITS = (6, 6, 9, 11, 12, 13, 15, 17)
+
+def mtype(frame):
+    return frame[0] >> 5
+
+def devaddr(frame):
+    return frame[1] | (frame[2] << 8) | (frame[3] << 16) | (frame[4] << 24)
+
+#DevAddr of an uplink or downlink data frame, -1 for anything else
+def data_devaddr(frame):
+    if len(frame) < 5:
+        return -1
+    t = frame[0] >> 5
+    if t < MTYPE_UNCONFIRMED_UP or t > MTYPE_CONFIRMED_DOWN:
+        return -1
+    return devaddr(frame)
+
+def fcnt(frame):
+    return frame[6] | (frame[7] << 8)
+
+#DevAddr prefix (value, bits) assigned to a NetID
+def netid_prefix(netid):
+    t = (netid >> 21) & 0x07
+    nwkid = netid & ((1 << NWKID_BITS[t]) - 1)
+    bits = t + 1 + NWKID_BITS[t]
+    value = ((0xFF << (8 - t)) & 0xFF) << 24
+    value |= nwkid << (32 - bits)
+    return value & 0xFFFFFFFF, bits
+
+class FrameFilter:
+    """
+    Inspects the MHDR and DevAddr of a received frame in place and tells whether
+    it belongs to one of our networks. NetIDs and DevAddr prefixes are flattened
+    into a sorted array of disjoint DevAddr ranges searched by bisection.
+    Join requests are always forwarded, the join server decides.
+    """
+
+    def __init__(self, net_ids=None, prefixes=None, proprietary=True):
+        ranges = []
+        for netid in net_ids or ():
+            ranges.append(netid_prefix(netid))
+        for value, bits in prefixes or ():
+            ranges.append((value, bits))
+        spans = []
+        for value, bits in ranges:
+            mask = (0xFFFFFFFF << (32 - bits)) & 0xFFFFFFFF
+            start = value & mask
+            spans.append((start, start | (~mask & 0xFFFFFFFF)))
+        spans.sort()
+        merged = []
+        for start, end in spans:
+            if merged and start <= merged[-1][1] + 1:
+                if end > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], end)
+            else:
+                merged.append((start, end))
+        self.enabled = len(merged) > 0
+        self._start = array('L', [s for s, _ in merged])
+        self._end = array('L', [e for _, e in merged])
+        self.proprietary = proprietary
+        self.counts = array('L', [0, 0, 0, 0])
+
+    def match(self, addr):
+        starts = self._start
+        lo = 0
+        hi = len(starts)
+        while lo < hi:
+            mid = (lo + hi) >> 1
+            if starts[mid] <= addr:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo > 0 and addr <= self._end[lo - 1]
+
+    def check(self, frame):
+        n = len(frame)
+        if n == 0:
+            verdict = FRAME_MALFORMED
+        else:
+            t = frame[0] >> 5
+            if t == MTYPE_UNCONFIRMED_UP or t == MTYPE_CONFIRMED_UP:
+                if n < _MIN_DATA_LEN:
+                    verdict = FRAME_MALFORMED
+                elif not self.enabled or self.match(devaddr(frame)):
+                    verdict = FRAME_FORWARD
+                else:
+                    verdict = FRAME_FOREIGN
+            elif t == MTYPE_JOIN_REQUEST or t == MTYPE_REJOIN_REQUEST:
+                verdict = FRAME_FORWARD
+            elif t == MTYPE_PROPRIETARY:
+                verdict = FRAME_FORWARD if self.proprietary else FRAME_FOREIGN
+            else:
+                verdict = FRAME_DOWNLINK
+        self.counts[verdict] += 1
+        return verdict
@@ -1,46 +1,53 @@
 from picogateway import PicoGateway
 import config
 from sx1262 import SX1262
+from gwconfig import GatewayConfig
+from capture import Capture
 import _thread
+import time
 
 def _lora_cb(events, obj):       
     if events & SX1262.RX_DONE:
-        obj.rxnb += 1
-        obj.rxok += 1
-        
-        msg, err = lora.recv()
-        error = SX1262.STATUS[err]
-
-        packet = obj._make_node_packet(msg, obj.rtc.datetime(), lora.getRSSI(), lora.getSNR())
-        obj._push_data(packet)
-        obj._log('sent packet: {}', packet)
-        obj.rxfw += 1
+        obj.rx_done()
     
     if events & SX1262.TX_DONE:
         obj.txnb += 1
+        obj._tx_done()
         obj._log('TX done')
 
 
 if True:
+    #radio settings come from radio.json on flash when present
+    try:
+        radio = GatewayConfig.load('radio.json')
+    except OSError:
+        radio = GatewayConfig()
+
+    #CAPTURE in config.py records to a file on flash, or 'serial' to the USB console
+    capture = getattr(config, 'CAPTURE', None)
+    if capture is not None:
+        capture = Capture(None if capture == 'serial' else capture)
+
     picogw = PicoGateway(
         id = config.GATEWAY_ID,
-        frequency = 868.1,
-        sf = 12,
-        bw = 125,
-        cr = 5,
+        frequency = radio.freq,
+        sf = radio.sf,
+        bw = radio.bw,
+        cr = radio.cr,
         ssid = config.WIFI_SSID,
         password = config.WIFI_PASS,
         server = config.SERVER,
         port = config.PORT,
-        ntp_server = config.NTP
+        ntp_server = config.NTP,
+        servers = getattr(config, 'SERVERS', None),
+        net_ids = getattr(config, 'NET_IDS', None),
+        devaddr_prefixes = getattr(config, 'DEVADDR_PREFIXES', None),
+        radio = radio,
+        capture = capture
         )
     
     lora = SX1262(spi_bus=1, clk=10, mosi=11, miso=12, cs=3, irq=20, rst=15, gpio=2)
-    lora.begin(freq=868.1, bw=125.0, sf=12, cr=5, syncWord=0x34,
-                    power=-5, currentLimit=60.0, preambleLength=8,
-                    implicit=False, implicitLen=0xFF,
-                    crcOn=True, txIq=True, rxIq=False,
-                    tcxoVoltage=1.7, useRegulatorLDO=False, blocking=True)
+    radio.configure(lora)
     lora.setBlockingCallback(False, _lora_cb, picogw)
     
     picogw.start(lora)
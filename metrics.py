@@ -0,0 +1,183 @@
+import time
+from array import array
+
+#latency buckets in microseconds, last bucket is open ended
+LATENCY_US = (250, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000, 250000, 500000, 1000000)
+DEPTH = (0, 1, 2, 4, 8, 16, 32)
+
+class Counter:
+    def __init__(self, name):
+        self.name = name
+        self._v = array('L', [0])
+
+    def inc(self, n=1):
+        self._v[0] += n
+
+    def value(self):
+        return self._v[0]
+
+    def reset(self):
+        self._v[0] = 0
+
+class Gauge:
+    def __init__(self, name, bounds=DEPTH):
+        self.name = name
+        self._v = array('l', [0])
+        self.hist = Histogram(name, bounds)
+        #decrements that took it below 0, a decrement without its increment somewhere
+        self.underflows = 0
+
+    def set(self, value):
+        self._v[0] = value
+        self.hist.record(value)
+
+    def add(self, n):
+        v = self._v[0] + n
+        if v < 0 and n < 0:
+            self.underflows += 1
+        self.set(v)
+
+    def value(self):
+        return self._v[0]
+
+    #the new window starts from what is queued now, not from 0
+    def reset(self):
+        self.hist.reset()
+        self.hist.record(self._v[0])
+
+class Histogram:
+    def __init__(self, name, bounds=LATENCY_US):
+        self.name = name
+        self.bounds = array('l', bounds)
+        self.counts = array('L', [0] * (len(bounds) + 1))
+        #count, min, max. The sum would overflow the port's 32 bit 'l' after a few
+        #hundred second long samples, it's a Python int that grows into a long int
+        self._s = array('l', [0, 0, 0])
+        self._sum = 0
+
+    def record(self, value):
+        bounds = self.bounds
+        i = 0
+        n = len(bounds)
+        while i < n and value > bounds[i]:
+            i += 1
+        self.counts[i] += 1
+        s = self._s
+        if s[0] == 0 or value < s[1]:
+            s[1] = value
+        if s[0] == 0 or value > s[2]:
+            s[2] = value
+        s[0] += 1
+        self._sum += value
+
+    def count(self):
+        return self._s[0]
+
+    def sum(self):
+        return self._sum
+
+    def min(self):
+        return self._s[1]
+
+    def max(self):
+        return self._s[2]
+
+    def mean(self):
+        if self._s[0] == 0:
+            return 0
+        return self._sum // self._s[0]
+
+    def percentile(self, p):
+        #upper bound of the bucket holding the p-th percentile, max for the open bucket
+        total = self._s[0]
+        if total == 0:
+            return 0
+        target = (total * p + 99) // 100
+        acc = 0
+        for i in range(len(self.counts)):
+            acc += self.counts[i]
+            if acc >= target:
+                if i < len(self.bounds):
+                    return min(self.bounds[i], self._s[2])
+                return self._s[2]
+        return self._s[2]
+
+    def reset(self):
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        for i in range(3):
+            self._s[i] = 0
+        self._sum = 0
+
+    def summary(self):
+        return {'n': self._s[0], 'p50': self.percentile(50), 'p95': self.percentile(95), 'max': self._s[2]}
+
+class Metrics:
+    def __init__(self):
+        self.counters = []
+        self.histograms = []
+        self.gauges = []
+        self.since = time.ticks_ms()
+
+    def counter(self, name):
+        c = Counter(name)
+        self.counters.append(c)
+        return c
+
+    def histogram(self, name, bounds=LATENCY_US):
+        h = Histogram(name, bounds)
+        self.histograms.append(h)
+        return h
+
+    def gauge(self, name, bounds=DEPTH):
+        g = Gauge(name, bounds)
+        self.gauges.append(g)
+        return g
+
+    def get(self, name):
+        for m in self.counters + self.histograms + self.gauges:
+            if m.name == name:
+                return m
+        return None
+
+    #compact summary for the stat packet, histograms and gauges restart a new window
+    def summary(self, reset=True):
+        out = {}
+        for c in self.counters:
+            out[c.name] = c.value()
+        for h in self.histograms:
+            if h.count():
+                out[h.name] = h.summary()
+        for g in self.gauges:
+            out[g.name] = {'cur': g.value(), 'max': g.hist.max()}
+            if g.underflows:
+                out[g.name]['under'] = g.underflows
+        if reset:
+            self.reset_window()
+        return out
+
+    def reset_window(self):
+        for h in self.histograms:
+            h.reset()
+        for g in self.gauges:
+            g.reset()
+        self.since = time.ticks_ms()
+
+    def dump(self):
+        """
+        Prints every counter, gauge and histogram bucket, meant for the REPL.
+        """
+
+        print('window {:.3f}s'.format(time.ticks_diff(time.ticks_ms(), self.since) / 1000))
+        for c in self.counters:
+            print('{:<16} {}'.format(c.name, c.value()))
+        for g in self.gauges:
+            print('{:<16} cur {} max {} under {}'.format(g.name, g.value(), g.hist.max(), g.underflows))
+        for h in self.histograms + [g.hist for g in self.gauges]:
+            print('{:<16} n {} mean {} min {} max {}'.format(h.name, h.count(), h.mean(), h.min(), h.max()))
+            for i in range(len(h.counts)):
+                if i < len(h.bounds):
+                    label = '<= {}'.format(h.bounds[i])
+                else:
+                    label = '>  {}'.format(h.bounds[-1])
+                print('    {:<12} {}'.format(label, h.counts[i]))
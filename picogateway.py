@@ -1,19 +1,30 @@
-import _thread
-import sys
-from sx1262 import SX1262
 import network
 import time
 import machine
+import micropython
 from machine import Timer
-import socket
 import usocket
 import struct
 import config
-import uos
 import ubinascii
 import ujson
-import errno
-import machine
+from _sx126x import ERR_NONE, ERR_CRC_MISMATCH, ERR_INVALID_OUTPUT_POWER, CHANNEL_FREE
+from metrics import Metrics
+from forwarder import Forwarder, Upstream
+from keepalive import Keepalive
+from resolver import Resolver
+from lorawan import FrameFilter, FRAME_FORWARD, data_devaddr
+from dedup import DedupCache, DEDUP_WINDOW_MS
+from gwconfig import GatewayConfig, parse_datr
+from downlink import DownlinkQueue
+from slices import SliceScheduler
+from energy import EnergyModel
+from capture import REC_UDP_OUT
+
+#1 compiles in the hot path probes of probes.py, 0 leaves no trace of them
+_PROBES = const(0)
+if _PROBES:
+    from probes import PROBES, P_RX, P_NODE_PACKET, P_PUSH, P_DL_SCHEDULE, P_LOG
 
 PROTOCOL_VERSION = const(2)
 
@@ -23,6 +34,9 @@ PULL_DATA = const(2)
 PULL_ACK = const(4)
 PULL_RESP = const(3)
 TX_ACK = const(5)
+#not Semtech: asks a gateway built with _PROBES for the probe summary, the reply is the
+#gateway's header with the same token followed by the table as text
+PROBE_DUMP = const(0x70)
 
 TX_ERR_NONE = 'NONE'
 TX_ERR_TOO_LATE = 'TOO_LATE'
@@ -34,6 +48,9 @@ TX_ERR_TX_POWER = 'TX_POWER'
 TX_ERR_GPS_UNLOCKED = 'GPS_UNLOCKED'
 
 UDP_THREAD_CYCLE_MS = const(20)
+#SPI commands around one CAD, on top of its on air duration, and the timer tick to the next one
+LBT_SCAN_SETUP_US = const(2000)
+PULL_RETRIES = const(3)
 
 STAT_PK = {
     'stat': {
@@ -75,17 +92,23 @@ TX_ACK_PK = {
 }
 
 class PicoGateway:     
-    def __init__(self, id, frequency, sf, bw, cr, ssid, password, server, port, ntp_server='pool.ntp.org', ntp_period=3600):
+    def __init__(self, id, frequency, sf, bw, cr, ssid, password, server, port, ntp_server='pool.ntp.org', ntp_period=3600,
+                 stat_period=30, keepalive_min=5, keepalive_max=120, servers=None, net_ids=None, devaddr_prefixes=None,
+                 dedup_window_ms=DEDUP_WINDOW_MS, forward_crc_error=False, forward_crc_disabled=False, radio=None,
+                 capture=None):
         self.id = id
         self.server = server
         self.port = port
-        self.frequency = frequency
+        #radio is a GatewayConfig, when given it takes precedence over frequency, sf, bw and cr
+        if radio is None:
+            radio = GatewayConfig(freq=frequency, sf=sf, bw=bw, cr=cr)
+        self.radio = radio
+        self.frequency = radio.freq
         self.ssid = ssid
         self.password = password
         self.ntp_server = ntp_server
         self.ntp_period = ntp_period
-        
-        self.server_ip = None
+        self.stat_period = stat_period
         
         self.rxnb = 0
         self.rxok = 0
@@ -93,9 +116,94 @@ class PicoGateway:
         self.dwnb = 0
         self.txnb = 0
         
-        self.sf = sf
-        self.bw = bw
-        self.cr = cr
+        self.metrics = Metrics()
+        self.h_irq_fwd = self.metrics.histogram('irq_fwd_us')
+        self.h_spi = self.metrics.histogram('spi_rx_us')
+        self.h_push_rtt = self.metrics.histogram('push_rtt_us')
+        self.h_dl_err = self.metrics.histogram('dl_err_us')
+        self.g_dl_pending = self.metrics.gauge('dl_pending')
+        self.h_pull_rtt = self.metrics.histogram('pull_rtt_us')
+        self.c_pull_retx = self.metrics.counter('pull_retx')
+        #from a missed PULL_ACK to the next one, lost packets or a NAT rebind
+        self.h_pull_recover = self.metrics.histogram('pull_recover_ms', (100, 500, 1000, 5000, 10000, 30000, 60000))
+        #downlink channel switch: TX settings applied, RX settings back and re-armed, and the whole RX outage
+        self.h_retune = self.metrics.histogram('retune_us')
+        self.h_rx_restore = self.metrics.histogram('rx_restore_us')
+        self.h_rx_blind = self.metrics.histogram('rx_blind_us', (50000, 100000, 250000, 500000, 1000000, 2000000, 4000000))
+        self._dl_start = None
+        #set from the retune for a downlink until TX_DONE or the TX is given up, RX service,
+        #slice switches, class C pumping and LBT keep off the radio meanwhile
+        self._radio_busy = False
+        self.c_rx_tx_busy = self.metrics.counter('rx_tx_busy')
+        #class C downlinks go out one at a time, paced by their airtime and the duty cycle
+        self.dl_queue = DownlinkQueue(radio.dl_queue, radio.subbands, radio.dl_gap_us)
+        self.h_dlq_wait = self.metrics.histogram('dlq_wait_us', (10000, 50000, 100000, 500000, 1000000, 5000000, 30000000))
+        self.g_dlq_depth = self.metrics.gauge('dlq_depth')
+        self.c_dlq_drop = self.metrics.counter('dlq_drop')
+        self.c_dlq_defer = self.metrics.counter('dlq_rx_defer')
+        self._dl_defer = None
+        self.dl_alarm = None
+        #bound once, scheduling it from the UDP loop allocates nothing
+        self._pump_ref = self._pump_downlinks
+        #CADs that found the channel busy, and timed downlinks given up because of it
+        self.c_lbt_busy = self.metrics.counter('lbt_busy')
+        self.c_lbt_fail = self.metrics.counter('lbt_fail')
+        #TX_ACKs of LBT downlinks, sent by the UDP loop once the TX went out or was given up
+        self._pending_acks = []
+        #the LBT downlink being listened for: data, tmst, profile, airtime, upstream, token,
+        #send time, CAD us, whether the last CAD found the channel free and the sub-band
+        self._lbt = None
+        self.lbt_alarm = None
+        #servers is a list of dicts with host, port and optionally prefixes and downlink, the first one is the primary
+        if servers is None:
+            servers = [{'host': server, 'port': port}]
+        self.resolver = Resolver()
+        self.forwarder = Forwarder(id, [Upstream(**srv) for srv in servers], self.resolver)
+        self.tokens = self.forwarder.primary.tokens
+        #a Capture recording frames and datagrams for bench/replay.py, None when off
+        self.capture = capture
+        self.forwarder.capture = capture
+        self._pull_retries = 0
+        self.keepalive = Keepalive(keepalive_min*1000, keepalive_max*1000)
+        #frames of other networks are dropped before encoding when NetIDs or DevAddr prefixes are given
+        self.frame_filter = None
+        if net_ids or devaddr_prefixes:
+            self.frame_filter = FrameFilter(net_ids, devaddr_prefixes)
+        #repeated receptions of the same frame are dropped locally, 0 disables it
+        self.dedup = None
+        if dedup_window_ms:
+            self.dedup = DedupCache(window_ms=dedup_window_ms)
+        self.c_rx_dup = self.metrics.counter('rx_dup')
+        self.c_rx_crc = self.metrics.counter('rx_crc_err')
+        self.c_rx_err = self.metrics.counter('rx_err')
+        self.c_rx_nocrc = self.metrics.counter('rx_no_crc')
+        self.c_rx_overrun = self.metrics.counter('rx_overrun')
+        self.forward_crc_error = forward_crc_error
+        self.forward_crc_disabled = forward_crc_disabled
+        
+        self.sf = radio.sf
+        self.bw = radio.bw
+        self.cr = radio.cr
+        #the channel never changes, fill the rxpk fields once. In DUAL mode the radio takes turns
+        #listening to LoRa and FSK in slices and the fields follow the modem of each frame
+        self._fsk = radio.modem == 'FSK'
+        self._fill_rxpk(self._fsk)
+        self.slicer = None
+        self.slice_alarm = None
+        if radio.modem == 'DUAL':
+            self.slicer = SliceScheduler((('LORA', radio.lora_slice_ms * 1000, radio.rx_hold_us),
+                                          ('FSK', radio.fsk_slice_ms * 1000, radio.fsk_hold_us)))
+        #radio blind while the next slice's profile goes in and RX is re-armed
+        self.h_slice_switch = self.metrics.histogram('slice_switch_us')
+        #supply current of the radio from the time spent listening, duty cycled or not, and sending
+        self.energy = EnergyModel(radio.ldo, radio.rx_wake_us, radio.rx_sleep_us, radio.tcxo_delay_us)
+        #when the shortest uplink is on air for less than a UDP loop cycle frames are queued at
+        #the interrupt and pushed by the loop, the ring holds two cycles worth of back to back frames
+        self._rx_ring = None
+        if radio.rx_min_air_us < UDP_THREAD_CYCLE_MS * 1000:
+            self._rx_ring = [None] * (2 * (UDP_THREAD_CYCLE_MS * 1000 // radio.rx_min_air_us + 1))
+        self._rx_head = 0
+        self._rx_tail = 0
         
         self.rtc_alarm = None
         self.stat_alarm = None
@@ -104,7 +212,6 @@ class PicoGateway:
         
         self.wlan = None
         self.sock = None
-        self.udp_lock = _thread.allocate_lock()
         
         self.lora = None
         
@@ -125,16 +232,19 @@ class PicoGateway:
         #set periodic alarm to resync the rtc (dunno if needed)
         self.rtc_alarm = Timer(mode=Timer.PERIODIC, period = self.ntp_period*1000, callback=self._set_time)
         
-        #set the socket towards the server
-        self.server_ip = usocket.getaddrinfo(self.server, self.port)[0][-1]
-        self._log('Opening UDP socket to {} ({}) port {}...', self.server, self.server_ip[0], self.server_ip[1])
-        self.udp_sock = usocket.socket(usocket.AF_INET, usocket.SOCK_DGRAM) #SOCK_DGRAM automatically sets to udp 
-        self.udp_sock.setsockopt(usocket.SOL_SOCKET, usocket.SO_REUSEADDR, 1)
-        self.udp_sock.setblocking(False)
+        #one socket per upstream server
+        self.forwarder.open()
+        for u in self.forwarder.upstreams:
+            self._log('Opened UDP socket to {} ({}) port {}', u.host, u.addr[0], u.addr[1])
+        self.resolver.start()
         self.lora = lora_obj
+        if self.capture is not None:
+            self.capture.config(self.radio.settings(), self.settings())
         self._push_data(self._make_stat_packet())
-        self.stat_alarm = Timer(mode=Timer.PERIODIC, period=30000, callback = lambda t: self._push_data(self._make_stat_packet()))
-        self.pull_alarm = Timer(mode=Timer.PERIODIC, period=25000, callback = lambda x : self._pull_data())
+        self.stat_alarm = Timer(mode=Timer.PERIODIC, period=self.stat_period*1000, callback = lambda t: self._push_data(self._make_stat_packet()))
+        self.pull_alarm = Timer(mode=Timer.ONE_SHOT, period=self.keepalive.interval, callback=self._pull_tick)
+        if self.slicer is not None:
+            self.slice_alarm = Timer(mode=Timer.ONE_SHOT, period=self.radio.lora_slice_ms, callback=self._slice_tick)
         self.udp_stop = False
         self.stop_all = False
         
@@ -147,7 +257,12 @@ class PicoGateway:
             self.stat_alarm.deinit()
         if self.pull_alarm:
             self.pull_alarm.deinit()
-        self.udp_sock.close()
+        if self.slice_alarm:
+            self.slice_alarm.deinit()
+        self.resolver.stop()
+        self.forwarder.close()
+        if self.capture is not None:
+            self.capture.close()
         while self.udp_stop and (not self.stop_all):
             time.sleep_ms(50)
         self.stop_all = True
@@ -171,18 +286,20 @@ class PicoGateway:
     def _set_time(self, t):
         NTP_QUERY = bytearray(48)
         NTP_QUERY[0] = 0x1B
-        addr = usocket.getaddrinfo(self.ntp_server, 123)[0][-1]
         synced = False
         while not synced:
             s = usocket.socket(usocket.AF_INET, usocket.SOCK_DGRAM)
             s.setsockopt(usocket.SOL_SOCKET, usocket.SO_REUSEADDR, 1)
             try:
+                #DNS down at boot is retried like a lost NTP reply
+                addr = self.resolver.resolve(self.ntp_server, 123)
                 s.settimeout(10)
                 res = s.sendto(NTP_QUERY, addr)
                 msg = s.recv(48)
                 synced = True
             except OSError as e:
                 self._log('Failed to sync, querying again')
+                self.resolver.invalidate(self.ntp_server, 123)
                 synced = False
                 time.sleep_ms(1000)
             finally:
@@ -196,41 +313,69 @@ class PicoGateway:
         self.rtc.datetime((tm[0], tm[1], tm[2], 0, tm[3], tm[4], tm[5], 0)) #weekday doesn't seem to work, doesn't really matters though
         self._log('Current time is: {}', self.rtc.datetime())
     
-    #pushes generic data
-    def _push_data(self, data):
+    #pushes generic data, t_irq is the ticks_us of the rx interrupt that produced it
+    #and addr the DevAddr used by the per server filters
+    def _push_data(self, data, t_irq=None, addr=-1):
+        if _PROBES:
+            PROBES.enter(P_PUSH)
         self._log('push data')
-        token = uos.urandom(2)
-        packet = bytes([PROTOCOL_VERSION]) + token + bytes([PUSH_DATA]) + ubinascii.unhexlify(self.id) + data
-        with self.udp_lock:
-            self.led.on()
-            try:
-                self.udp_sock.sendto(packet, self.server_ip)
-            except Exception as ex:
-                self._log('Failed to push uplink packet to server: {}', ex)
-                if ex.args[0] == 113:
-                    self.led.on()
-                    self._connect_to_wifi()
-                    self._set_time(None)
-            finally:
-                    self.led.off()
+        self.led.on()
+        try:
+            err = self.forwarder.push(data, addr)
+            if t_irq is not None:
+                self.h_irq_fwd.record(time.ticks_diff(time.ticks_us(), t_irq))
+        finally:
+            self.led.off()
+        if _PROBES:
+            PROBES.exit(P_PUSH)
+        if err:
+            self._log('Failed to push uplink packet to server: {}', err)
+            self._check_wifi(err)
         
     def _pull_data(self):
         self._log('pull data')
-        token = uos.urandom(2)
-        packet = bytes([PROTOCOL_VERSION]) + token + bytes([PULL_DATA]) + ubinascii.unhexlify(self.id)
+        self.led.on()
+        try:
+            err = self.forwarder.pull()
+        finally:
+            self.led.off()
+        if err:
+            self._log('Failed to pull downlink packets from server: {}', err)
+            self._check_wifi(err)
 
-        with self.udp_lock:
+    def _check_wifi(self, err):
+        if err == 113 and not self.wlan.isconnected():
             self.led.on()
-            try:
-                self.udp_sock.sendto(packet, self.server_ip)
-            except Exception as ex:
-                self._log('Failed to pull downlink packets from server: {}', ex)
-                if ex.args[0] == 113:
-                    self._connect_to_wifi()
-                    self._set_time(None)
-            finally:
-                self.led.off()
+            self._connect_to_wifi()
+            self._set_time(None)
+            self.led.off()
+
+    #keepalive timer, re-armed every time with the current adaptive interval
+    def _pull_tick(self, t):
+        self._pull_data()
+        self._arm_pull()
+        
+    def _arm_pull(self):
+        if self.pull_alarm:
+            self.pull_alarm.init(mode=Timer.ONE_SHOT, period=self.keepalive.interval, callback=self._pull_tick)
 
+    #expires unanswered tokens and retransmits the keepalive when a PULL_ACK went missing.
+    #The token tables are tracked into from the DIO1 and Timer callbacks on this thread,
+    #interrupts are held off for the expiry like everywhere else they are touched
+    def _check_tokens(self):
+        for u in self.forwarder.upstreams:
+            state = machine.disable_irq()
+            kinds = u.tokens.expire()
+            machine.enable_irq(state)
+            if u is self.forwarder.primary:
+                expired = kinds
+        if expired & (1 << PULL_DATA):
+            self.keepalive.on_miss()
+        if expired & (1 << PULL_DATA) and self._pull_retries < PULL_RETRIES:
+            self._pull_retries += 1
+            self.c_pull_retx.inc()
+            self._log('PULL_ACK missing, retransmitting keepalive ({}/{})', self._pull_retries, PULL_RETRIES)
+            self._pull_data()
  
     def _make_stat_packet(self):
         now = self.rtc.datetime()
@@ -240,59 +385,202 @@ class PicoGateway:
         STAT_PK["stat"]["rxfw"] = self.rxfw
         STAT_PK["stat"]["dwnb"] = self.dwnb
         STAT_PK["stat"]["txnb"] = self.txnb
+        STAT_PK["stat"]["ackr"] = self.tokens.ratio(PUSH_DATA)
+        perf = self.metrics.summary()
+        perf['srtt_ms'] = self.tokens.srtt // 1000
+        perf['rto_ms'] = self.tokens.rto
+        perf['pull_ackr'] = self.tokens.ratio(PULL_DATA)
+        perf['ka_ms'] = self.keepalive.interval
+        perf['idle_ok_ms'] = self.keepalive.idle_ok_ms
+        perf['dc_ms'] = [b // 1000 for b in self.dl_queue.budget]
+        if self.lora is not None:
+            perf['hdr_err'] = self.lora.getHeaderErrors()
+        if self.frame_filter:
+            perf['filt'] = list(self.frame_filter.counts)
+        if len(self.forwarder.upstreams) > 1:
+            perf['srv'] = [u.state() for u in self.forwarder.upstreams]
+        now = time.ticks_us()
+        energy = self.energy
+        mah = energy.charge_mah(now)
+        perf['e_mah'] = round(mah, 3)
+        perf['i_ma'] = round(energy.average_ma(now), 3)
+        residency = energy.residency(now)
+        total = sum(residency) or 1
+        perf['res_pct'] = [100 * us // total for us in residency]
+        if self.radio.rx_duty:
+            perf['e_save_pct'] = round(100 * (1 - mah / (energy.continuous_mah(now) or 1)), 1)
+        if self.slicer is not None:
+            perf['slice_pct'] = [int(100 * share) for share in self.slicer.shares(time.ticks_us())]
+            perf['slice_holds'] = [self.slicer.holds, self.slicer.stale_holds]
+        STAT_PK["stat"]["perf"] = perf
         return ujson.dumps(STAT_PK)
     
-    def _make_node_packet(self, rx_data, rx_time, rssi, snr):
-        RX_PK["rxpk"][0]["time"] = "%d-%02d-%02dT%02d:%02d:%02d.%dZ" % (rx_time[0], rx_time[1], rx_time[2], rx_time[4], rx_time[5], rx_time[6], rx_time[7])
-        RX_PK["rxpk"][0]["tmst"] = time.ticks_cpu()
-        RX_PK["rxpk"][0]["freq"] = 868.1
-        RX_PK["rxpk"][0]["datr"] = 'SF12BW125'
-        RX_PK["rxpk"][0]["rssi"] = int(rssi)
-        RX_PK["rxpk"][0]["lsnr"] = int(snr)
-        RX_PK["rxpk"][0]["data"] = ubinascii.b2a_base64(rx_data)[:-1]
-        RX_PK["rxpk"][0]["size"] = len(rx_data)
-        return ujson.dumps(RX_PK)
+    #maps the driver status to the Semtech stat field (1 ok, -1 bad CRC, 0 no CRC), None drops the frame
+    def _rx_status(self, err):
+        if err == ERR_NONE:
+            if not self.radio.crc:
+                self.c_rx_nocrc.inc()
+                return 0 if self.forward_crc_disabled else None
+            self.rxok += 1
+            return 1
+        if err == ERR_CRC_MISMATCH:
+            self.c_rx_crc.inc()
+            return -1 if self.forward_crc_error else None
+        self.c_rx_err.inc()
+        return None
+
+    def _accept_frame(self, frame):
+        if self.frame_filter is not None and self.frame_filter.check(frame) != FRAME_FORWARD:
+            return False
+        if self.dedup is not None and self.dedup.seen(frame):
+            self.c_rx_dup.inc()
+            return False
+        return True
     
+    #rxpk fields of the modem a frame came in with, FSK has a numeric datr, no codr and no SNR
+    def _fill_rxpk(self, fsk):
+        radio = self.radio
+        rxpk = RX_PK["rxpk"][0]
+        if fsk:
+            rxpk["freq"] = radio.fsk_freq
+            rxpk["modu"] = 'FSK'
+            rxpk["datr"] = radio.fsk_datr
+            rxpk.pop("codr", None)
+            rxpk.pop("lsnr", None)
+        else:
+            rxpk["freq"] = radio.freq
+            rxpk["modu"] = 'LORA'
+            rxpk["datr"] = radio.datr
+            rxpk["codr"] = radio.codr
+        self._rxpk_fsk = fsk
+
+    #snr is None for FSK frames, tmst the ticks_cpu of the reception, now when not given
+    def _make_node_packet(self, rx_data, rx_time, rssi, snr, stat=1, tmst=None):
+        if _PROBES:
+            PROBES.enter(P_NODE_PACKET)
+        rxpk = RX_PK["rxpk"][0]
+        rxpk["time"] = "%d-%02d-%02dT%02d:%02d:%02d.%dZ" % (rx_time[0], rx_time[1], rx_time[2], rx_time[4], rx_time[5], rx_time[6], rx_time[7])
+        rxpk["tmst"] = time.ticks_cpu() if tmst is None else tmst
+        rxpk["stat"] = stat
+        rxpk["rssi"] = int(rssi)
+        if snr is not None:
+            rxpk["lsnr"] = round(snr, 1)
+        rxpk["data"] = ubinascii.b2a_base64(rx_data)[:-1]
+        rxpk["size"] = len(rx_data)
+        packet = ujson.dumps(RX_PK)
+        if _PROBES:
+            PROBES.exit(P_NODE_PACKET)
+        return packet
+
+    #RX_DONE handler: reads the frame, its status and the timestamps at the interrupt, then
+    #forwards it right away or queues it for the UDP loop when frames come faster than it cycles
+    def rx_done(self):
+        t_irq = time.ticks_us()
+        tmst = time.ticks_cpu()
+        if _PROBES:
+            PROBES.enter(P_RX)
+        self.rxnb += 1
+        lora = self.lora
+        if self._radio_busy:
+            #an RX_DONE served after a downlink took the radio, reading it would re-arm RX
+            self.c_rx_tx_busy.inc()
+            if _PROBES:
+                PROBES.exit(P_RX)
+            return
+        msg, err = lora.recv()
+        spi_us = time.ticks_diff(time.ticks_us(), t_irq)
+        if self.radio.rx_duty:
+            #the radio stayed in RX for the frame
+            self.energy.frame(self.radio.uplink_air_us(len(msg)))
+        stat = self._rx_status(err)
+
+        #frames with a bad CRC skip the filters, their header can't be trusted
+        accept = stat is not None and (stat != 1 or self._accept_frame(msg))
+        if not accept and self.capture is None:
+            self._log('dropped frame, status {}', lora.STATUS[err])
+            if _PROBES:
+                PROBES.exit(P_RX)
+            return
+        t_status = time.ticks_us()
+        rssi = lora.getRSSI()
+        snr = None if self._fsk else lora.getSNR()
+        self.h_spi.record(spi_us + time.ticks_diff(time.ticks_us(), t_status))
+        if self.capture is not None:
+            #dropped frames are recorded too
+            self.capture.rx(tmst, err, rssi, snr, msg)
+            if not accept:
+                self._log('dropped frame, status {}', lora.STATUS[err])
+                if _PROBES:
+                    PROBES.exit(P_RX)
+                return
+        rx = (msg, self.rtc.datetime(), rssi, snr, stat, tmst, t_irq)
+
+        ring = self._rx_ring
+        if ring is None:
+            self._forward(rx)
+        elif self._rx_head - self._rx_tail < len(ring):
+            ring[self._rx_head % len(ring)] = rx
+            self._rx_head += 1
+        else:
+            self.c_rx_overrun.inc()
+        #the frame a slice was held for is in, the next slice starts now
+        if self.slicer is not None and self.slicer.holding():
+            self._slice_tick(None)
+        if _PROBES:
+            PROBES.exit(P_RX)
+
+    def _forward(self, rx):
+        msg, rx_time, rssi, snr, stat, tmst, t_irq = rx
+        if (snr is None) != self._rxpk_fsk:
+            self._fill_rxpk(snr is None)
+        packet = self._make_node_packet(msg, rx_time, rssi, snr, stat, tmst)
+        self._push_data(packet, t_irq, data_devaddr(msg))
+        self._log('sent packet: {}', packet)
+        self.rxfw += 1
+
+    #pushes the frames queued by rx_done, oldest first
+    def _drain_rx(self):
+        ring = self._rx_ring
+        while self._rx_tail != self._rx_head:
+            i = self._rx_tail % len(ring)
+            rx = ring[i]
+            ring[i] = None
+            self._rx_tail += 1
+            self._forward(rx)
+
+    #one pass of the UDP loop: a datagram from the servers, queued uplinks, token expiry,
+    #class C downlinks, TX_ACKs, server address changes and the capture
+    def udp_cycle(self):
+        try:
+            u, data = self.forwarder.recv(1024)
+            if data is not None:
+                self._handle_datagram(u, data)
+        except Exception as ex:
+            print('UDP recv Exception: ', ex)
+        if self._rx_ring is not None:
+            self._drain_rx()
+        self._check_tokens()
+        #the pump's SPI sequences run in scheduler context like DIO1 and the timers, so
+        #none of them comes in halfway through another
+        try:
+            micropython.schedule(self._pump_ref, None)
+        except RuntimeError:
+            #schedule queue full, the next cycle pumps
+            pass
+        self._flush_acks()
+        #the resolver thread did the lookup, only the new address is picked up here
+        if self.resolver.changed:
+            self.resolver.changed = False
+            self._log('Server address changed, updating upstreams')
+            self.forwarder.readdress()
+        if self.capture is not None:
+            self.capture.flush()
+
     def udp_thread(self):
         #reads from server
         try:
             while not self.udp_stop:
-                try:
-                    data = self.udp_sock.recv(1024)
-                    _token = data[1:3]
-                    _type = data[3]
-                    if _type == PUSH_ACK:
-                        self._log('Push ack')
-                    elif _type == PULL_ACK:
-                        self._log('Pull ack')
-                    elif _type == PULL_RESP:
-                        self._log('Pull resp')
-                        self.dwnb += 1
-                        ack_error = TX_ERR_NONE
-                        tx_pk = ujson.loads(data[4:])
-                        self._log('--tx_pk-- {}', tx_pk)
-                        if "tmst" in tx_pk['txpk']:
-                            tmst = tx_pk["txpk"]["tmst"]
-                            ticks_cpu = time.ticks_cpu()
-                            t_us = tmst - ticks_cpu - 28000
-                            if t_us < 0:
-                                t_us += 0xFFFFFFFF
-                            if t_us < 20000000:
-                                self.uplink_alarm = Timer(mode=Timer.ONE_SHOT, period= int(t_us/1000), callback = lambda x: self._send_down_link(ubinascii.a2b_base64(tx_pk["txpk"]["data"]), tx_pk["txpk"]["tmst"] - 50, tx_pk["txpk"]["datr"], int(tx_pk["txpk"]["freq"] * 1000) * 1000))
-                            else:
-                                ack_error = TX_ERR_TOO_LATE
-                                self._log('Downlink timestamp error!, t_us: {}, tmst: {}, ticks_cpu{}', t_us, tx_pk["txpk"]["tmst"], ticks_cpu)
-                        else:
-                            self._send_down_link_c(ubinascii.a2b_base64(tx_pk["txpk"]["data"]))
-                        self._ack_pull_rsp(_token, ack_error)
-                        self._log('Pull resp')
-                except OSError as ex:
-                    if ex.args[0] == errno.ETIMEDOUT:
-                        pass
-                    if ex.args[0] != errno.EAGAIN:
-                        print('UDP recv OSError Exception: ', ex)
-                except Exception as ex:
-                    print('UDP recv Exception: ', ex)
+                self.udp_cycle()
                 time.sleep_ms(UDP_THREAD_CYCLE_MS)
         except KeyboardInterrupt as ki:
             self._log('Thread keyboard interrupt {} ', ki) 
@@ -303,24 +591,293 @@ class PicoGateway:
 
 
     
-    def _send_down_link(self, data, tmst, datr, freq):
+    def _handle_datagram(self, u, data):
+        primary = u is self.forwarder.primary
+        _token = data[1:3]
+        _type = data[3]
+        if _type == PUSH_ACK:
+            state = machine.disable_irq()
+            rtt = u.tokens.ack(_token, PUSH_DATA)
+            machine.enable_irq(state)
+            if rtt >= 0 and primary:
+                self.h_push_rtt.record(rtt)
+            self._log('Push ack')
+        elif _type == PULL_ACK:
+            state = machine.disable_irq()
+            rtt = u.tokens.ack(_token, PULL_DATA)
+            machine.enable_irq(state)
+            if rtt >= 0 and primary:
+                self.h_pull_rtt.record(rtt)
+                self._pull_retries = 0
+                recovered = self.keepalive.on_ack()
+                if recovered >= 0:
+                    self.h_pull_recover.record(recovered)
+                    self._log('Downlink path recovered after {} ms', recovered)
+            self._log('Pull ack')
+        elif _type == PULL_RESP:
+            if _PROBES:
+                PROBES.enter(P_DL_SCHEDULE)
+            self._log('Pull resp')
+            self.dwnb += 1
+            self.keepalive.on_downlink(time.ticks_diff(time.ticks_ms(), u.sent_at) if primary else 0)
+            self._arm_pull()
+            ack_error = TX_ERR_NONE
+            tx_pk = ujson.loads(data[4:])
+            self._log('--tx_pk-- {}', tx_pk)
+            txpk = tx_pk['txpk']
+            #everything but the radio switch is done now, the timer callback only retunes and sends
+            ack_error, profile = self._tx_profile(txpk)
+            band = self.dl_queue.band(txpk.get('freq', self.radio.freq))
+            if ack_error != TX_ERR_NONE:
+                self._log('Downlink rejected: {}', ack_error)
+            elif "tmst" in txpk and not txpk.get('imme', False):
+                tmst = txpk["tmst"]
+                payload = ubinascii.a2b_base64(txpk["data"])
+                airtime = self.lora.profileTimeOnAir(profile, len(payload))
+                ticks_cpu = time.ticks_cpu()
+                lead = self.radio.tx_lead_us
+                if self.radio.lbt:
+                    lead += self.radio.lbt_attempts * (self.lora.cadTime(profile) + LBT_SCAN_SETUP_US)
+                t_us = tmst - ticks_cpu - lead
+                if t_us < 0:
+                    t_us += 0xFFFFFFFF
+                if t_us < 20000000:
+                    self.g_dl_pending.add(1)
+                    if self.radio.lbt:
+                        #acked once the channel was found free or busy
+                        ack_error = None
+                        self.uplink_alarm = Timer(mode=Timer.ONE_SHOT, period= int(t_us/1000), callback = lambda x: self._send_down_link_lbt(payload, tmst, profile, airtime, u, _token, band))
+                    else:
+                        self.uplink_alarm = Timer(mode=Timer.ONE_SHOT, period= int(t_us/1000), callback = lambda x: self._send_down_link(payload, tmst - 50, profile, airtime, band))
+                else:
+                    ack_error = TX_ERR_TOO_LATE
+                    self._log('Downlink timestamp error!, t_us: {}, tmst: {}, ticks_cpu{}', t_us, tmst, ticks_cpu)
+            else:
+                ack_error = self._queue_down_link_c(ubinascii.a2b_base64(txpk["data"]), profile, band)
+            if _PROBES:
+                PROBES.exit(P_DL_SCHEDULE)
+            if ack_error is not None:
+                self._ack_pull_rsp(u, _token, ack_error)
+            self._log('Pull resp')
+        elif _type == PROBE_DUMP:
+            if _PROBES:
+                try:
+                    u.sock.sendto(self.forwarder.header(PROBE_DUMP, _token) + PROBES.table().encode(), u.addr)
+                except Exception as ex:
+                    self._log('Probe dump exception: {}', ex)
+
+    #checks a txpk against the channel plan, returns (error, radio profile)
+    def _tx_profile(self, txpk):
+        radio = self.radio
+        freq = txpk.get('freq', radio.freq)
+        power = txpk.get('powe', radio.power)
+        if not radio.f_min <= freq <= radio.f_max:
+            return TX_ERR_TX_FREQ, None
+        if power > radio.max_eirp:
+            return TX_ERR_TX_POWER, None
+        #the radio sends with a modem it listens with, FSK only at its own bit rate
+        if txpk.get('modu', 'FSK' if self._fsk else 'LORA') == 'FSK':
+            if radio.modem == 'LORA' or txpk.get('datr', radio.fsk_datr) != radio.fsk_datr:
+                return TX_ERR_TX_FREQ, None
+            err, profile = self.lora.fskTxProfile(freq, power)
+        elif radio.modem == 'FSK':
+            return TX_ERR_TX_FREQ, None
+        else:
+            try:
+                sf, bw = parse_datr(txpk.get('datr', radio.datr))
+            except ValueError:
+                return TX_ERR_TX_FREQ, None
+            #downlinks went out inverted before ipol was honoured, a server leaving it out keeps that
+            err, profile = self.lora.txProfile(freq, sf, bw, power, txpk.get('ipol', True))
+        if err == ERR_INVALID_OUTPUT_POWER:
+            return TX_ERR_TX_POWER, None
+        if err != ERR_NONE:
+            return TX_ERR_TX_FREQ, None
+        return TX_ERR_NONE, profile
+
+    def _retune(self, profile):
+        t = time.ticks_us()
+        self.lora.retune(profile)
+        self.h_retune.record(time.ticks_diff(time.ticks_us(), t))
+        self._radio_busy = True
+        if self._dl_start is None:
+            self._dl_start = t
+
+    #end of a listen slice in DUAL mode: held while a frame is coming in, else the next
+    #profile goes in and RX is re-armed. Runs from its timer and from rx_done, both in
+    #scheduler context. A downlink keeps the radio until TX_DONE restores its RX profile
+    def _slice_tick(self, t):
+        slicer = self.slicer
+        now = time.ticks_us()
+        left = slicer.left(now)
+        if left == 0 and self._radio_busy:
+            left = UDP_THREAD_CYCLE_MS * 1000
+        elif left == 0:
+            if self.lora.rxBusy():
+                left = slicer.hold(now)
+                if left == 0:
+                    #no RX_DONE within the longest uplink, the detection was a false one
+                    self.lora.clearRxBusy()
+            if left == 0:
+                name = slicer.next(now)
+                self.lora.loadProfile(name)
+                self.lora.startReceive()
+                self._fsk = name == 'FSK'
+                self.h_slice_switch.record(time.ticks_diff(time.ticks_us(), now))
+                left = slicer.left(now)
+        if self.slice_alarm:
+            self.slice_alarm.init(mode=Timer.ONE_SHOT, period=left // 1000 + 1, callback=self._slice_tick)
+
+    #band is the duty cycle sub-band of dl_queue the airtime is charged to
+    def _send_down_link(self, data, tmst, profile, airtime, band=0):
+        #tmst is on the ticks_cpu clock and may sit on the other side of a wrap
+        self.h_dl_err.record(abs(time.ticks_diff(time.ticks_cpu(), tmst)))
+        self.g_dl_pending.add(-1)
+        self.dl_queue.start(airtime, time.ticks_us(), band)
+        self._retune(profile)
         self.lora.send(data)
-        self._log('Sent downlink packet scheduled on {:.3f} with data {} at {} on freq {}', tmst/1000000, data, datr, freq)
-        
-    def _send_down_link_c(self, data):
+        self.energy.transmit(profile[4], time.ticks_us())
+        self._log('Sent downlink packet scheduled on {:.3f} with data {} on frf {}', tmst/1000000, data, profile[0])
+
+    #CADs on the TX channel until one CAD duration before the send time, the last one
+    #has to find the channel free or the downlink is dropped with COLLISION_PACKET.
+    #One CAD per step, each from a one shot timer, so the UDP loop and the other
+    #callbacks run between them
+    def _send_down_link_lbt(self, data, tmst, profile, airtime, u, token, band=0):
+        if self._radio_busy:
+            #another downlink has the radio
+            self.c_lbt_fail.inc()
+            self.g_dl_pending.add(-1)
+            self._pending_acks.append((u, token, TX_ERR_COLLISION_PACKET))
+            self._log('Radio busy, downlink for {} dropped', tmst)
+            return
+        self._retune(profile)
+        self._lbt = [data, tmst, profile, airtime, u, token, tmst - self.radio.tx_lead_us,
+                     self.lora.cadTime(profile), False, band]
+        self._lbt_step(None)
+
+    def _lbt_step(self, t):
+        lbt = self._lbt
+        cad_us = lbt[7]
+        step_us = cad_us + LBT_SCAN_SETUP_US
+        left = time.ticks_diff(lbt[6], time.ticks_cpu())
+        if left >= cad_us:
+            #the last CAD is held back so it ends at the send time, to the ms a timer allows
+            if left < 2 * step_us and left - step_us >= 1000:
+                self.lbt_alarm = Timer(mode=Timer.ONE_SHOT, period=(left - step_us) // 1000, callback=self._lbt_step)
+                return
+            lbt[8] = self.lora.lbtScan() == CHANNEL_FREE
+            if not lbt[8]:
+                self.c_lbt_busy.inc()
+            left = time.ticks_diff(lbt[6], time.ticks_cpu())
+            if left >= step_us:
+                self.lbt_alarm = Timer(mode=Timer.ONE_SHOT, period=1, callback=self._lbt_step)
+                return
+        data, tmst, profile, airtime, u, token, send_at, cad_us, free, band = lbt
+        if not free:
+            self._lbt = None
+            self.c_lbt_fail.inc()
+            self.g_dl_pending.add(-1)
+            self._give_up_tx()
+            self._pending_acks.append((u, token, TX_ERR_COLLISION_PACKET))
+            self._log('Channel busy, downlink for {} dropped', tmst)
+            return
+        if left >= 1000:
+            self.lbt_alarm = Timer(mode=Timer.ONE_SHOT, period=left // 1000, callback=self._lbt_step)
+            return
+        self._lbt = None
+        self._pending_acks.append((u, token, TX_ERR_NONE))
+        self._send_down_link(data, tmst - 50, profile, airtime, band)
+
+    def _give_up_tx(self):
+        self.lora.restoreRx()
+        self._radio_busy = False
+        self._dl_start = None
+
+    def _flush_acks(self):
+        while self._pending_acks:
+            u, token, error = self._pending_acks.pop(0)
+            self._ack_pull_rsp(u, token, error)
+
+    def _queue_down_link_c(self, data, profile, band=0):
+        airtime = self.lora.profileTimeOnAir(profile, len(data))
+        if not self.dl_queue.put(data, profile, airtime, time.ticks_us(), band):
+            self.c_dlq_drop.inc()
+            return TX_ERR_COLLISION_PACKET
+        self.g_dlq_depth.add(1)
+        return TX_ERR_NONE
+
+    #sends the next class C downlink when the queue allows it and no uplink is coming in.
+    #Scheduled by the UDP loop and run from a timer after TX_DONE, both in scheduler context
+    def _pump_downlinks(self, t):
+        if self.lora is None or self._radio_busy:
+            return
+        now = time.ticks_us()
+        entry = self.dl_queue.next(now)
+        if entry is None:
+            return
+        if self.lora.rxBusy():
+            if self._dl_defer is None:
+                self._dl_defer = now
+                self.c_dlq_defer.inc()
+            if time.ticks_diff(now, self._dl_defer) < self.radio.rx_hold_us:
+                return
+            #no RX_DONE within the longest uplink, the detection was a false one
+            self.lora.clearRxBusy()
+        self._dl_defer = None
+        data, profile, airtime, t_enq, band = entry
+        if self.radio.lbt:
+            self._retune(profile)
+            if self.lora.lbtScan() != CHANNEL_FREE:
+                #stays queued, the next pump listens again
+                self.c_lbt_busy.inc()
+                self._give_up_tx()
+                return
+        self.dl_queue.pop()
+        self.g_dlq_depth.add(-1)
+        self.h_dlq_wait.record(time.ticks_diff(now, t_enq))
+        self.dl_queue.start(airtime, now, band)
+        self._send_down_link_c(data, profile)
+
+    def _send_down_link_c(self, data, profile):
+        self._retune(profile)
         self.lora.send(data)
+        self.energy.transmit(profile[4], time.ticks_us())
         self._log('Sent class c downlink packet: {}', data)
+
+    #called on TX_DONE once the driver has the RX settings back
+    def _tx_done(self):
+        self.energy.listen(time.ticks_us())
+        self.h_rx_restore.record(self.lora.getRestoreTime())
+        self._radio_busy = False
+        if self._dl_start is not None:
+            self.h_rx_blind.record(time.ticks_diff(time.ticks_us(), self._dl_start))
+            self._dl_start = None
+        self.dl_queue.done(time.ticks_us())
+        #the next class C downlink goes once the listen gap is over, not on the next UDP cycle
+        if len(self.dl_queue):
+            self.dl_alarm = Timer(mode=Timer.ONE_SHOT, period=self.radio.dl_gap_us // 1000 + 1, callback=self._pump_downlinks)
       
-    def _ack_pull_rsp(self, token, error):
+    def _ack_pull_rsp(self, upstream, token, error):
         TX_ACK_PK["txpk_ack"]["error"] = error
         resp = ujson.dumps(TX_ACK_PK)
-        packet = bytes([PROTOCOL_VERSION]) + token + bytes([TX_ACK]) + ubinascii.unhexlify(self.id) + resp
-        with self.udp_lock:
-            try:
-                self.udp_sock.sendto(packet, self.server_ip)
-            except Exception as ex:
-                self._log('PULL RSP ACK exception: {}', ex)
+        try:
+            #the header buffer is shared with the sends of the loop and the timers
+            state = machine.disable_irq()
+            packet = self.forwarder.header(TX_ACK, token) + resp
+            machine.enable_irq(state)
+            upstream.sock.sendto(packet, upstream.addr)
+            upstream.sent_at = time.ticks_ms()
+            if self.capture is not None:
+                self.capture.udp(REC_UDP_OUT, self.forwarder.upstreams.index(upstream), packet)
+        except Exception as ex:
+            self._log('PULL RSP ACK exception: {}', ex)
     
+    #constructor arguments that change what gets forwarded, a capture records them
+    def settings(self):
+        return {'forward_crc_error': self.forward_crc_error, 'forward_crc_disabled': self.forward_crc_disabled,
+                'dedup_window_ms': self.dedup.window_ms if self.dedup else 0}
+
     def get_stop_all(self):
         return self.stop_all
 
@@ -329,7 +886,11 @@ class PicoGateway:
         Outputs a log message to stdout.
         """
 
+        if _PROBES:
+            PROBES.enter(P_LOG)
         print('[{:>10.3f}] {}'.format(
             time.ticks_ms() / 1000,
             str(message).format(*args)
-            ))
\ No newline at end of file
+            ))
+        if _PROBES:
+            PROBES.exit(P_LOG)
\ No newline at end of file
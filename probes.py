@@ -0,0 +1,134 @@
+import time
+from array import array
+from metrics import Histogram
+
+#probe points of the hot path, in the order of the summary table
+P_RX = const(0)
+P_READ = const(1)
+P_SPI = const(2)
+P_STATUS = const(3)
+P_NODE_PACKET = const(4)
+P_PUSH = const(5)
+P_FRAME = const(6)
+P_SENDTO = const(7)
+P_DL_SCHEDULE = const(8)
+P_LOG = const(9)
+NAMES = ('rx_done', '_readData', 'SPItransfer', 'getRSSI/getSNR', '_make_node_packet', '_push_data',
+         'frame_build', 'sendto', 'dl_schedule', '_log')
+
+#buckets in microseconds, last one open ended
+PROBE_US = (10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000)
+#nesting kept track of, deeper probes are counted by their enclosing one only
+_DEPTH = const(8)
+_BAR = const(20)
+
+class Probes:
+    """
+    Time spent in named stages of the hot path. A probe is entered and
+    exited around its stage, the ticks_us delta goes into the stage's
+    histogram and onto the edge from the probe it is nested in, so the
+    summary can show where each stage's time goes. Everything is allocated
+    here, recording allocates nothing. A probe left without its exit, by an
+    exception or an early return, is dropped by the exit of the one around it.
+    A scheduled callback running within a stage counts toward that stage.
+
+    The probes are compiled in per module: picogateway.py, forwarder.py,
+    lib/sx126x.py and lib/sx126x_chip.py each have _PROBES = const(0) and
+    MicroPython drops their probe code and the import of this module at
+    compile time. Set it to 1 in the modules to profile. The summary is
+    PROBES.dump() from the REPL or the reply to a PROBE_DUMP datagram.
+    """
+
+    def __init__(self, names=NAMES, bounds=PROBE_US):
+        self.names = names
+        n = len(names)
+        self.hist = [Histogram(name, bounds) for name in names]
+        #us and calls per (enclosing probe, probe), row n is the top level
+        self._us = array('L', [0] * ((n + 1) * n))
+        self._calls = array('L', [0] * ((n + 1) * n))
+        self._stack = array('b', [0] * _DEPTH)
+        self._t = array('L', [0] * _DEPTH)
+        self._depth = 0
+
+    def enter(self, p):
+        d = self._depth
+        if d < _DEPTH:
+            self._stack[d] = p
+            self._t[d] = time.ticks_us()
+        self._depth = d + 1
+
+    def exit(self, p):
+        now = time.ticks_us()
+        d = self._depth - 1
+        if d >= _DEPTH:
+            self._depth = d
+            return
+        while d >= 0 and self._stack[d] != p:
+            d -= 1
+        #not entered, the probes went in while it ran
+        if d < 0:
+            return
+        self._depth = d
+        dt = time.ticks_diff(now, self._t[d])
+        n = len(self.names)
+        k = (self._stack[d - 1] if d else n) * n + p
+        self._us[k] += dt
+        self._calls[k] += 1
+        self.hist[p].record(dt)
+
+    def reset(self):
+        for h in self.hist:
+            h.reset()
+        for k in range(len(self._us)):
+            self._us[k] = 0
+            self._calls[k] = 0
+        self._depth = 0
+
+    #flame style table: every stage under the stages it ran in, with its calls, total and
+    #self time there. A stage entered from several places has its children split between
+    #them by time
+    def table(self):
+        n = len(self.names)
+        top = 0
+        for p in range(n):
+            top += self._us[n * n + p]
+        lines = ['{:26s} {:>7s} {:>9s} {:>9s} {:>7s} {:>7s} {:>7s}  share'.format(
+            'stage', 'calls', 'total_ms', 'self_ms', 'mean_us', 'p50_us', 'p99_us')]
+        self._rows(lines, n, 1.0, 0, max(1, top), ())
+        return '\n'.join(lines)
+
+    def _rows(self, lines, parent, scale, depth, top, path):
+        n = len(self.names)
+        for p in range(n):
+            k = parent * n + p
+            if not self._calls[k] or p in path:
+                continue
+            h = self.hist[p]
+            total = self._us[k] * scale
+            #share of the stage's time spent here, its children are scaled by it
+            share = total / max(1, h.sum())
+            children = 0
+            for c in range(n):
+                children += self._us[p * n + c]
+            lines.append('{:26s} {:7d} {:9.2f} {:9.2f} {:7d} {:7d} {:7d}  {}'.format(
+                '  ' * depth + self.names[p], int(self._calls[k] * scale), total / 1000,
+                (total - children * share) / 1000, h.mean(), h.percentile(50), h.percentile(99),
+                '#' * int(_BAR * total / top)))
+            self._rows(lines, p, share, depth + 1, top, path + (p,))
+
+    def dump(self, reset=False):
+        print(self.table())
+        if reset:
+            self.reset()
+
+PROBES = Probes()
+
+#host benchmarks switch the probes of imported modules on at run time, the const is a
+#plain global there. On a board set _PROBES = const(1) in the modules instead
+def enable(*modules):
+    g = globals()
+    for m in modules:
+        m._PROBES = 1
+        for name in g:
+            if name == 'PROBES' or name.startswith('P_'):
+                setattr(m, name, g[name])
@@ -0,0 +1,96 @@
+import time
+import _thread
+import usocket
+
+DNS_TTL_S = const(3600)
+DNS_RETRY_S = const(60)
+#how often the background thread looks for expired entries
+DNS_POLL_MS = const(1000)
+
+class Resolver:
+    """
+    getaddrinfo cache. Lookups are answered from the cache, expired entries are
+    refreshed one at a time by refresh(). start() runs it on a thread of its own
+    so a slow DNS server never blocks the UDP loop, which only checks changed.
+    If DNS fails the last known address keeps being served and the lookup is
+    retried every retry seconds.
+    """
+
+    def __init__(self, ttl=DNS_TTL_S, retry=DNS_RETRY_S):
+        self.ttl = ttl
+        self.retry = retry
+        #(host, port) -> [addr, ttl, refresh at ticks_ms]
+        self._cache = {}
+        self.lookups = 0
+        self.failures = 0
+        self.changes = 0
+        #set by a refresh that changed an address, cleared by the reader
+        self.changed = False
+        #guards the cache dict, never held across a lookup
+        self._lock = _thread.allocate_lock()
+        self._running = False
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            _thread.start_new_thread(self._run, ())
+
+    def stop(self):
+        self._running = False
+
+    def _run(self):
+        while self._running:
+            if self.refresh():
+                self.changed = True
+            time.sleep_ms(DNS_POLL_MS)
+
+    #only the first lookup of a host blocks, it raises OSError if DNS is down
+    def resolve(self, host, port, ttl=None):
+        key = (host, port)
+        entry = self._cache.get(key)
+        if entry is not None:
+            return entry[0]
+        if ttl is None:
+            ttl = self.ttl
+        addr = self._lookup(host, port)
+        with self._lock:
+            self._cache[key] = [addr, ttl, time.ticks_add(time.ticks_ms(), ttl * 1000)]
+        return addr
+
+    def cached(self, host, port):
+        entry = self._cache.get((host, port))
+        if entry is None:
+            return None
+        return entry[0]
+
+    def invalidate(self, host, port):
+        entry = self._cache.get((host, port))
+        if entry is not None:
+            entry[2] = time.ticks_ms()
+
+    #refreshes at most one expired entry, returns True if an address changed
+    def refresh(self, now=None):
+        if now is None:
+            now = time.ticks_ms()
+        with self._lock:
+            items = list(self._cache.items())
+        for key, entry in items:
+            if time.ticks_diff(now, entry[2]) < 0:
+                continue
+            try:
+                addr = self._lookup(key[0], key[1])
+            except OSError:
+                self.failures += 1
+                entry[2] = time.ticks_add(now, self.retry * 1000)
+                return False
+            entry[2] = time.ticks_add(now, entry[1] * 1000)
+            if addr != entry[0]:
+                entry[0] = addr
+                self.changes += 1
+                return True
+            return False
+        return False
+
+    def _lookup(self, host, port):
+        self.lookups += 1
+        return usocket.getaddrinfo(host, port)[0][-1]
@@ -0,0 +1,64 @@
+import time
+
+class SliceScheduler:
+    """
+    Time slices of one radio between listen profiles. Every profile gets its
+    slice of the period in turn. When a slice is over while a frame is coming
+    in (preamble detected, RX_DONE not yet) the slice is held for up to the
+    airtime of the longest uplink of that modem, after that the detection is
+    taken as a false one. Residency per profile, switches and holds are
+    counted here, the radio is switched by the caller.
+    """
+
+    def __init__(self, slices, now=None):
+        #(name, slice_us, hold_us) per profile, listened to in this order
+        self.slices = slices
+        self.index = 0
+        self._start = time.ticks_us() if now is None else now
+        self._held = None
+        self.residency = [0] * len(slices)
+        self.switches = 0
+        self.holds = 0
+        self.stale_holds = 0
+
+    def current(self):
+        return self.slices[self.index][0]
+
+    #us left of the current slice, 0 once it is over
+    def left(self, now):
+        left = self.slices[self.index][1] - time.ticks_diff(now, self._start)
+        return left if left > 0 else 0
+
+    #the slice is over and a frame is coming in, us to keep listening for it, 0 when the
+    #hold is used up and the detection was a stale one
+    def hold(self, now):
+        if self._held is None:
+            self._held = now
+            self.holds += 1
+        left = self.slices[self.index][2] - time.ticks_diff(now, self._held)
+        if left > 0:
+            return left
+        self.stale_holds += 1
+        return 0
+
+    #True while a slice is held past its end for a frame
+    def holding(self):
+        return self._held is not None
+
+    #moves on to the next profile at now, returns its name
+    def next(self, now):
+        self.residency[self.index] += time.ticks_diff(now, self._start)
+        self.index = (self.index + 1) % len(self.slices)
+        self._start = now
+        self._held = None
+        self.switches += 1
+        return self.slices[self.index][0]
+
+    #share of the time spent on each profile so far, holds included
+    def shares(self, now):
+        total = sum(self.residency) + time.ticks_diff(now, self._start)
+        if total <= 0:
+            return [0.0] * len(self.slices)
+        shares = [r / total for r in self.residency]
+        shares[self.index] += time.ticks_diff(now, self._start) / total
+        return shares
@@ -0,0 +1,154 @@
+import time
+from array import array
+
+_EMPTY = const(-1)
+
+#floor of the ack timeout, a late ACK counted as a miss retransmits the keepalive.
+#1 s like the Semtech packet forwarder waits for its ACKs
+RTO_MIN_MS = const(1000)
+RTO_MAX_MS = const(5000)
+
+class TokenTable:
+    """
+    Fixed size open addressed map of in flight PUSH_DATA/PULL_DATA tokens.
+    Tokens are random so the low bits are used directly as hash, collisions are
+    resolved with linear probing and entries are removed with backward shifting.
+    """
+
+    def __init__(self, size=16):
+        n = 1
+        while n < size:
+            n <<= 1
+        self.size = n
+        self._mask = n - 1
+        self._keys = array('l', [_EMPTY] * n)
+        self._kind = bytearray(n)
+        self._sent = array('L', [0] * n)
+        self.used = 0
+
+        self.srtt = 0
+        self.rttvar = 0
+        self.rto = RTO_MAX_MS
+
+        self.tracked = array('L', [0] * 8)
+        self.acked = array('L', [0] * 8)
+        self.expired = array('L', [0] * 8)
+
+    @staticmethod
+    def key(token):
+        return (token[0] << 8) | token[1]
+
+    def track(self, token, kind, now=None):
+        if now is None:
+            now = time.ticks_us()
+        key = self.key(token)
+        if self.used == self.size:
+            #table full, the oldest entry is considered lost
+            self._remove(self._oldest(), True)
+        i = key & self._mask
+        while self._keys[i] != _EMPTY and self._keys[i] != key:
+            i = (i + 1) & self._mask
+        if self._keys[i] == _EMPTY:
+            self.used += 1
+        self._keys[i] = key
+        self._kind[i] = kind
+        self._sent[i] = now
+        self.tracked[kind] += 1
+
+    #returns the round trip time in us, -1 for unknown or already expired tokens
+    def ack(self, token, kind, now=None):
+        if now is None:
+            now = time.ticks_us()
+        i = self._find(self.key(token))
+        if i < 0 or self._kind[i] != kind:
+            return -1
+        rtt = time.ticks_diff(now, self._sent[i])
+        self._remove(i, False)
+        self.acked[kind] += 1
+        self._update_rtt(rtt)
+        return rtt
+
+    #drops entries older than the current retransmission timeout, returns a bitmask of the expired kinds
+    def expire(self, now=None):
+        if now is None:
+            now = time.ticks_us()
+        limit = self.rto * 1000
+        kinds = 0
+        i = 0
+        while i < self.size:
+            if self._keys[i] != _EMPTY and time.ticks_diff(now, self._sent[i]) > limit:
+                kinds |= 1 << self._kind[i]
+                self._remove(i, True)
+                #backward shift may have moved another entry into slot i
+                continue
+            i += 1
+        return kinds
+
+    def pending(self, kind):
+        n = 0
+        for i in range(self.size):
+            if self._keys[i] != _EMPTY and self._kind[i] == kind:
+                n += 1
+        return n
+
+    def ratio(self, kind):
+        done = self.acked[kind] + self.expired[kind]
+        if done == 0:
+            return 100.0
+        return round(100.0 * self.acked[kind] / done, 1)
+
+    def _find(self, key):
+        i = key & self._mask
+        for _ in range(self.size):
+            k = self._keys[i]
+            if k == key:
+                return i
+            if k == _EMPTY:
+                return -1
+            i = (i + 1) & self._mask
+        return -1
+
+    def _oldest(self):
+        now = time.ticks_us()
+        best = 0
+        age = -1
+        for i in range(self.size):
+            if self._keys[i] != _EMPTY:
+                a = time.ticks_diff(now, self._sent[i])
+                if a > age:
+                    age = a
+                    best = i
+        return best
+
+    def _remove(self, i, lost):
+        if lost:
+            self.expired[self._kind[i]] += 1
+        mask = self._mask
+        keys = self._keys
+        keys[i] = _EMPTY
+        self.used -= 1
+        j = i
+        while True:
+            j = (j + 1) & mask
+            k = keys[j]
+            if k == _EMPTY:
+                return
+            home = k & mask
+            #move the entry back if its home slot is not in (i, j]
+            if (j > i and (home <= i or home > j)) or (j < i and (home <= i and home > j)):
+                keys[i] = k
+                self._kind[i] = self._kind[j]
+                self._sent[i] = self._sent[j]
+                keys[j] = _EMPTY
+                i = j
+
+    def _update_rtt(self, rtt):
+        #RFC 6298 estimator with integer gains of 1/8 and 1/4
+        if self.srtt == 0:
+            self.srtt = rtt
+            self.rttvar = rtt // 2
+        else:
+            self.rttvar += (abs(self.srtt - rtt) - self.rttvar) // 4
+            self.srtt += (rtt - self.srtt) // 8
+        rto = (self.srtt + 4 * self.rttvar) // 1000
+        self.rto = min(max(rto, RTO_MIN_MS), RTO_MAX_MS)